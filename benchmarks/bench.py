@@ -0,0 +1,295 @@
+import argparse
+import io
+import json
+import logging
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any
+
+from synthetic import TreeSpec, generate
+
+from ddt import config, models, tokenizer
+
+"""
+Stage-by-stage benchmarks of a scan over a synthetic tree
+"""
+
+# bump when the layout of the results file changes, so old baselines aren't compared.
+RESULTS_VERSION = 1
+# a stage this much slower than the baseline counts as a regression.
+DEFAULT_THRESHOLD = 0.1
+# stages faster than this in the baseline are too noisy to compare.
+MIN_COMPARED_SECONDS = 0.005
+
+
+def make_config(root: Path, cache_dir: Path | None = None) -> config.Config:
+    """
+    Builds the configuration of a default scan, with images included.
+    Building it compiles the root's .gitignore matcher, which `_parse_gitignore` does.
+    """
+    return config.Config(
+        root, False, False, False, False, True, False,
+        tokenizer.Model("gpt-4o"), io.StringIO(), "txt", [], [],
+        cache_dir=cache_dir,
+    )  # fmt: skip
+
+
+def time_stages(root: Path, cache_dir: Path) -> tuple[dict[str, float], dict[str, int]]:
+    """
+    Runs each stage of a scan over `root` once.
+
+    The stages are:
+        - gitignore: building the configuration, which compiles the .gitignore matcher.
+        - walk: building a TokenCounter and walking the tree; the walk is lazy, so it runs here.
+        - filter: `filter_file` on every file walked.
+        - tokenize: `parse_files` with no token cache, which walks and filters again.
+        - tokenize_cached: `parse_files` again, with every count already cached.
+        - output_text, output_html, output_json: rendering the results.
+
+    Returns:
+        tuple[dict[str, float], dict[str, int]]: the seconds each stage took, and the number
+            of files walked, files counted and tokens counted.
+    """
+    seconds: dict[str, float] = {}
+
+    def timed(stage: str, run: Callable[[], Any]) -> Any:
+        start = time.perf_counter()
+        result = run()
+        seconds[stage] = time.perf_counter() - start
+        return result
+
+    cfg: config.Config = timed("gitignore", lambda: make_config(root))
+
+    def walk() -> models.TokenCounter:
+        counter = models.TokenCounter(cfg)
+        for _ in counter.walk():
+            pass
+        return counter
+
+    walked: models.TokenCounter = timed("walk", walk)
+    _ = timed("filter", lambda: [walked.filter_file(file) for file in walked.all_files])
+
+    counter = models.TokenCounter(cfg)
+    timed("tokenize", counter.parse_files)
+
+    warm = models.TokenCounter(make_config(root, cache_dir))
+    warm.parse_files()
+    cached = models.TokenCounter(make_config(root, cache_dir))
+    timed("tokenize_cached", cached.parse_files)
+
+    _ = timed("output_text", counter.to_text)
+    _ = timed("output_html", counter.to_html)
+    _ = timed(
+        "output_json",
+        lambda: json.dumps(counter, cls=models.TokenCounterEncoder, indent=2),
+    )
+    sizes = {
+        "files": len(walked.all_files),
+        "counted": sum(category.count for category in counter.scanned_files.values()),
+        "tokens": counter.total,
+    }
+    return seconds, sizes
+
+
+def run(spec: TreeSpec, repeat: int, tree: Path | None = None) -> dict[str, Any]:
+    """
+    Generates the tree for a spec, unless `tree` already holds it, and times every stage
+    `repeat` times. Each stage reports its fastest run, which is the least disturbed by noise.
+
+    Returns:
+        dict[str, Any]: the results, as written to the results file.
+    """
+    with tempfile.TemporaryDirectory(prefix="ddt-bench-") as scratch:
+        root = tree if tree is not None else Path(scratch) / "tree"
+        if not root.exists():
+            _ = generate(root, spec)
+        # load the encoding up front, so the first run doesn't pay for it.
+        _ = tokenizer.TokenizerEngine(tokenizer.Model("gpt-4o")).encoding
+
+        runs: dict[str, list[float]] = {}
+        sizes: dict[str, int] = {}
+        for index in range(repeat):
+            cache_dir = Path(scratch) / f"cache{index}"
+            seconds, sizes = time_stages(root, cache_dir)
+            for stage, elapsed in seconds.items():
+                runs.setdefault(stage, []).append(elapsed)
+
+    return {
+        "version": RESULTS_VERSION,
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "spec": asdict(spec),
+        "repeat": repeat,
+        "sizes": sizes,
+        "stages": {
+            stage: {"seconds": min(elapsed), "runs": elapsed}
+            for stage, elapsed in runs.items()
+        },
+    }
+
+
+def compare(
+    results: dict[str, Any], baseline: dict[str, Any], threshold: float
+) -> list[str]:
+    """
+    Compares each stage's fastest run against a baseline's.
+
+    Returns:
+        list[str]: a line per stage, marked REGRESSION where it is more than `threshold` slower.
+
+    Raises:
+        ValueError: If the baseline was measured on a different tree or results layout.
+    """
+    if baseline.get("version") != results["version"]:
+        raise ValueError(f"baseline results are version {baseline.get('version')}")
+    if baseline["spec"] != results["spec"]:
+        raise ValueError("baseline was measured on a different tree spec")
+
+    lines: list[str] = []
+    for stage, result in results["stages"].items():
+        before = baseline["stages"].get(stage)
+        if before is None:
+            lines.append(f"{stage}: {result['seconds']:.4f}s (new)")
+            continue
+        ratio = result["seconds"] / before["seconds"] if before["seconds"] else 1.0
+        line = f"{stage}: {before['seconds']:.4f}s -> {result['seconds']:.4f}s ({ratio - 1:+.1%})"
+        if ratio > 1 + threshold and before["seconds"] >= MIN_COMPARED_SECONDS:
+            line += " REGRESSION"
+        lines.append(line)
+    return lines
+
+
+def setup_argparse() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="bench",
+        description="Times each stage of a ddt scan over a deterministic synthetic tree",
+    )
+    defaults = TreeSpec()
+    _ = parser.add_argument(
+        "--files", type=int, default=defaults.files, help="number of files to generate"
+    )
+    _ = parser.add_argument(
+        "--depth", type=int, default=defaults.depth, help="deepest directory nesting"
+    )
+    _ = parser.add_argument(
+        "--fanout",
+        type=int,
+        default=defaults.fanout,
+        help="subdirectories per directory",
+    )
+    _ = parser.add_argument(
+        "--median-bytes",
+        type=int,
+        default=defaults.median_bytes,
+        help="median text file size",
+    )
+    _ = parser.add_argument(
+        "--max-bytes",
+        type=int,
+        default=defaults.max_bytes,
+        help="largest text file size",
+    )
+    _ = parser.add_argument(
+        "--binary-ratio",
+        type=float,
+        default=defaults.binary_ratio,
+        help="share of binary files",
+    )
+    _ = parser.add_argument(
+        "--image-ratio",
+        type=float,
+        default=defaults.image_ratio,
+        help="share of images",
+    )
+    _ = parser.add_argument(
+        "--gitignore-ratio",
+        type=float,
+        default=defaults.gitignore_ratio,
+        help="share of directories with a .gitignore",
+    )
+    _ = parser.add_argument(
+        "--symlink-ratio",
+        type=float,
+        default=defaults.symlink_ratio,
+        help="share of symlinks",
+    )
+    _ = parser.add_argument(
+        "--seed", type=int, default=defaults.seed, help="seed for the generated tree"
+    )
+    _ = parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="runs of each stage; the fastest is reported",
+    )
+    _ = parser.add_argument(
+        "--tree",
+        type=Path,
+        help="generate the tree here, or reuse it if it exists, instead of a temporary directory",
+    )
+    _ = parser.add_argument(
+        "-o", "--output", type=Path, help="write the results to this JSON file"
+    )
+    _ = parser.add_argument(
+        "--compare",
+        type=Path,
+        help="compare against a results file from an earlier run, failing on regressions",
+    )
+    _ = parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help=f"slowdown that counts as a regression, default {DEFAULT_THRESHOLD}")  # fmt: skip
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = setup_argparse().parse_args(argv)
+    logging.basicConfig(format="%(message)s", level=logging.WARNING)
+    spec = TreeSpec(
+        files=args.files,
+        depth=args.depth,
+        fanout=args.fanout,
+        median_bytes=args.median_bytes,
+        max_bytes=args.max_bytes,
+        binary_ratio=args.binary_ratio,
+        image_ratio=args.image_ratio,
+        gitignore_ratio=args.gitignore_ratio,
+        symlink_ratio=args.symlink_ratio,
+        seed=args.seed,
+    )
+    results = run(spec, args.repeat, args.tree)
+    if args.output is not None:
+        _ = args.output.write_text(json.dumps(results, indent=2) + "\n")
+
+    sizes = results["sizes"]
+    print(
+        f"{sizes['files']:,} files walked, {sizes['counted']:,} counted, {sizes['tokens']:,} tokens"
+    )
+    if args.compare is None:
+        for stage, result in results["stages"].items():
+            print(f"{stage}: {result['seconds']:.4f}s")
+        return 0
+    lines = compare(results, json.loads(args.compare.read_text()), args.threshold)
+    print("\n".join(lines))
+    return 1 if any(line.endswith("REGRESSION") for line in lines) else 0
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+import math
+import os
+import random
+import struct
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+
+"""
+Deterministic synthetic source trees for benchmarks
+"""
+
+# the default share of text files of each extension.
+EXTENSIONS: dict[str, float] = {
+    ".py": 0.3,
+    ".md": 0.15,
+    ".ts": 0.15,
+    ".json": 0.1,
+    ".go": 0.1,
+    ".txt": 0.1,
+    ".yaml": 0.05,
+    ".html": 0.05,
+}
+# patterns written to the generated .gitignore files, and the names that match them.
+IGNORED_NAMES: dict[str, str] = {
+    "*.log": "debug.log",
+    "build/": "build/out.txt",
+    "tmp_*": "tmp_scratch.py",
+    "*.cache.json": "deps.cache.json",
+}
+
+_WORDS = [
+    "def",
+    "class",
+    "return",
+    "import",
+    "from",
+    "self",
+    "value",
+    "index",
+    "items",
+    "result",
+    "data",
+    "config",
+    "path",
+    "file",
+    "token",
+    "count",
+    "total",
+    "parse",
+    "walk",
+    "filter",
+    "output",
+    "model",
+    "cache",
+    "error",
+    "none",
+    "true",
+    "false",
+    "for",
+    "while",
+    "if",
+    "else",
+    "elif",
+    "try",
+    "except",
+    "with",
+    "as",
+    "in",
+    "not",
+    "and",
+    "or",
+    "lambda",
+    "yield",
+    "async",
+    "await",
+    "the",
+    "of",
+    "to",
+    "a",
+    "is",
+    "that",
+    "it",
+    "this",
+    "be",
+    "on",
+    "by",
+    "are",
+    "was",
+]
+_PUNCTUATION = ("(", ")", ":", ",", ".", "=", "[", "]", "{", "}", "+", '"', "_")
+
+
+@dataclass(frozen=True)
+class TreeSpec:
+    """
+    The shape of a synthetic source tree. The same spec always generates the same tree.
+
+    Properties:
+        files (int): The number of files, not counting .gitignore files and the ignored files they match.
+        depth (int): The deepest directory nesting below the root.
+        fanout (int): The subdirectories of each directory above the deepest level.
+        median_bytes (int): The median text file size; sizes follow a log-normal distribution.
+        size_sigma (float): The spread of that distribution, as the sigma of the log size.
+        max_bytes (int): The largest text file size.
+        extensions (dict[str, float]): The relative share of text files of each extension.
+        binary_ratio (float): The share of files that are binary, half with known binary extensions.
+        image_ratio (float): The share of files that are PNG images.
+        gitignore_ratio (float): The share of directories holding a .gitignore, with matching files next to it.
+        symlink_ratio (float): The share of files that are symlinks to another generated file.
+        dotfile_ratio (float): The share of files named with a leading dot.
+        seed (int): The seed for every random choice.
+    """
+
+    files: int = 2_000
+    depth: int = 4
+    fanout: int = 4
+    median_bytes: int = 2_000
+    size_sigma: float = 1.2
+    max_bytes: int = 512 * 1024
+    extensions: dict[str, float] = field(default_factory=lambda: dict(EXTENSIONS))
+    binary_ratio: float = 0.05
+    image_ratio: float = 0.03
+    gitignore_ratio: float = 0.2
+    symlink_ratio: float = 0.02
+    dotfile_ratio: float = 0.02
+    seed: int = 0
+
+
+def generate(root: Path, spec: TreeSpec) -> list[Path]:
+    """
+    Writes a synthetic tree under `root`, which must not exist yet.
+
+    Returns:
+        list[Path]: every file written, symlinks and .gitignore files included, in creation order.
+    """
+    rng = random.Random(spec.seed)
+    root.mkdir(parents=True)
+    directories = _directories(root, spec)
+    written: list[Path] = []
+
+    for directory in directories:
+        if directory != root and rng.random() < spec.gitignore_ratio:
+            written.extend(_write_gitignore(directory, rng))
+
+    extensions = list(spec.extensions)
+    weights = list(spec.extensions.values())
+    targets: list[Path] = []
+    for index in range(spec.files):
+        directory = rng.choice(directories)
+        roll = rng.random()
+        if roll < spec.symlink_ratio and targets:
+            path = directory / f"link_{index}{rng.choice(targets).suffix}"
+            os.symlink(os.path.relpath(rng.choice(targets), directory), path)
+        elif roll < spec.symlink_ratio + spec.binary_ratio:
+            # half are skipped by extension, half only once they are sniffed.
+            suffix = ".so" if rng.random() < 0.5 else ".dat"
+            path = directory / f"blob_{index}{suffix}"
+            _ = path.write_bytes(rng.randbytes(_size(rng, spec)) + b"\0")
+        elif roll < spec.symlink_ratio + spec.binary_ratio + spec.image_ratio:
+            path = directory / f"image_{index}.png"
+            _ = path.write_bytes(_png(rng.randint(16, 4096), rng.randint(16, 4096)))
+        else:
+            extension = rng.choices(extensions, weights)[0]
+            dot = "." if rng.random() < spec.dotfile_ratio else ""
+            path = directory / f"{dot}file_{index}{extension}"
+            _ = path.write_text(_text(rng, _size(rng, spec)))
+            targets.append(path)
+        written.append(path)
+    return written
+
+
+def _directories(root: Path, spec: TreeSpec) -> list[Path]:
+    directories = [root]
+    level = [root]
+    for depth in range(spec.depth):
+        level = [
+            parent / f"dir{depth}_{index}"
+            for parent in level
+            for index in range(spec.fanout)
+        ]
+        directories.extend(level)
+    for directory in directories:
+        directory.mkdir(exist_ok=True)
+    return directories
+
+
+def _write_gitignore(directory: Path, rng: random.Random) -> list[Path]:
+    patterns = rng.sample(sorted(IGNORED_NAMES), rng.randint(1, len(IGNORED_NAMES)))
+    gitignore = directory / ".gitignore"
+    _ = gitignore.write_text("".join(f"{pattern}\n" for pattern in patterns))
+    written = [gitignore]
+    for pattern in patterns:
+        path = directory / IGNORED_NAMES[pattern]
+        path.parent.mkdir(exist_ok=True)
+        _ = path.write_text(_text(rng, 200))
+        written.append(path)
+    return written
+
+
+def _size(rng: random.Random, spec: TreeSpec) -> int:
+    size = rng.lognormvariate(math.log(spec.median_bytes), spec.size_sigma)
+    return max(1, min(int(size), spec.max_bytes))
+
+
+def _text(rng: random.Random, size: int) -> str:
+    # code-like lines of words and punctuation, so token counts resemble real sources.
+    lines: list[str] = []
+    length = 0
+    while length < size:
+        indent = "    " * rng.randint(0, 3)
+        parts = [
+            rng.choice(_WORDS) if rng.random() < 0.7 else rng.choice(_PUNCTUATION)
+            for _ in range(rng.randint(2, 12))
+        ]
+        line = indent + " ".join(parts) + "\n"
+        lines.append(line)
+        length += len(line)
+    return "".join(lines)[:size]
+
+
+def _png(width: int, height: int) -> bytes:
+    # a valid header is all a scan reads, so the pixel data is left truncated.
+    header = struct.pack(">IIBBBBB", width, height, 1, 0, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _png_chunk(b"IHDR", header)
+        + _png_chunk(b"IDAT", zlib.compress(b"\0"))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    checksum = zlib.crc32(kind + data)
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", checksum)
@@ -1,5 +1,8 @@
 import logging
-from . import cli, config, models
+import sys
+from argparse import Namespace
+
+from . import cache, cli, config, models, profiling, tokenizer, watch
 
 """
 Main function
@@ -14,6 +17,8 @@ def main() -> None:
     #         file=sys.stdout,
     #     )
     #     sys.exit(0)
+    if cli.is_cache_command(sys.argv[1:]):
+        sys.exit(cache_command(cli.setup_cache_argparse().parse_args(sys.argv[2:])))
     p = cli.setup_argparse()
     args = p.parse_args()
     # target: Path = args.root
@@ -26,18 +31,53 @@ def main() -> None:
     #     print(tokenizer.calculate_text_tokens(file, model))
     #
     cfg = config.generate_config(vars(args))
+    vocab_dir = cfg.vocab_dir
+    if vocab_dir is not None:
+        tokenizer.use_vocab_dir(vocab_dir)
 
     token_counter = models.TokenCounter(cfg)
     token_counter.add_exclusions(cfg.exclude)
     token_counter.add_inclusions(cfg.include)
+    token_counter.add_path_exclusions(cfg.exclude_paths)
+
+    if cfg.watch:
+        logging.debug("Watching files...")
+        watch.run(token_counter)
+        return
 
     logging.debug("Parsing files...")
 
-    token_counter.parse_files()
+    try:
+        with token_counter.profiled():
+            with profiling.cprofile(cfg.profile_stats):
+                token_counter.parse_files()
+
+            logging.debug("Parsing complete!")
+
+            token_counter.output()
+    except tokenizer.VocabularyError as e:
+        logging.info(f"{e}, exiting.")
+        sys.exit(1)
+    token_counter.write_profile()
+
 
-    logging.debug("Parsing complete!")
+def cache_command(args: Namespace) -> int:
+    """
+    Runs `ddt cache warm`, downloading the vocabularies of the chosen models, or of every model.
 
-    token_counter.output()
+    Returns:
+        int: the exit status.
+    """
+    vocab_dir = args.vocab_dir or cache.default_vocab_dir()
+    tokenizer.use_vocab_dir(vocab_dir)
+    chosen = getattr(args, "models", None) or sorted(tokenizer.model_choices())
+    try:
+        names = tokenizer.warm(chosen)
+    except tokenizer.VocabularyError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"{len(names)} encodings ready in {vocab_dir}: {', '.join(names)}")
+    return 0
 
 
 if __name__ == "__main__":
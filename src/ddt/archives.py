@@ -0,0 +1,144 @@
+import logging
+import lzma
+import stat
+import sys
+import tarfile
+import zipfile
+import zlib
+from collections.abc import Iterator
+from pathlib import Path, PurePosixPath
+from typing import IO, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .models import TokenCounter
+
+"""
+Tar and zip archive reading
+"""
+
+# suffixes of the archives that can be scanned in place of a directory.
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+ZIP_SUFFIXES = (".zip",)
+# what reading a truncated or malformed archive, or a member of one, can raise.
+ARCHIVE_ERRORS = (
+    OSError,
+    EOFError,
+    tarfile.TarError,
+    zipfile.BadZipFile,
+    zlib.error,
+    lzma.LZMAError,
+)
+
+
+def is_archive(file: Path) -> bool:
+    """
+    Checks whether a path names a tar or zip archive that can be scanned, by its suffix.
+    """
+    return file.is_file() and file.name.lower().endswith(TAR_SUFFIXES + ZIP_SUFFIXES)
+
+
+def members(archive: Path) -> Iterator[tuple[str, int, IO[bytes]]]:
+    """
+    Yields the regular files in an archive, in archive order, without extracting them.
+
+    Tar archives are read as a single forward stream, compressed or not, so each member's
+    stream is only readable until the next member is asked for. Directories, links and
+    other special members are left out.
+
+    Yields:
+        tuple[str, int, IO[bytes]]: the member's path inside the archive, using `/` separators,
+            its size in bytes, and a stream of its content.
+
+    Raises:
+        OSError: If the archive can't be read, or one of the other ARCHIVE_ERRORS if it is
+            truncated or malformed, here or while a member stream is read.
+    """
+    if archive.name.lower().endswith(ZIP_SUFFIXES):
+        yield from _zip_members(archive)
+    else:
+        yield from _tar_members(archive)
+
+
+def count_archive(counter: "TokenCounter") -> None:
+    """
+    Counts the files inside the tar or zip archive at the counter's root without extracting it.
+    Members stream through the same filters, binary checks and batched tokenizing as files on
+    disk, and are named by their path inside the archive, e.g. `release.tar.gz/src/main.py`.
+
+    Text is only held until its batch is counted, so memory use is bounded by the largest
+    member, and large members are counted a chunk at a time as they stream past.
+    """
+    sizes: dict[Path, int] = {}
+    try:
+        for file, file_extension, token_counts in counter.parse_members(
+            _unfiltered_members(counter, sizes)
+        ):
+            counter.record(file, file_extension, token_counts)
+            counter.learn(file_extension, token_counts, sizes.pop(file, 0))
+    except ARCHIVE_ERRORS as e:
+        logging.info(f"could not read {counter.config.root}: {e}, exiting.")
+        sys.exit(1)
+    cache = counter.cache
+    if cache is not None:
+        cache.close()
+    counter.ratios.save()
+
+
+def _unfiltered_members(
+    counter: "TokenCounter", sizes: dict[Path, int]
+) -> Iterator[tuple[Path, int, IO[bytes]]]:
+    """
+    Yields the members of the counter's archive that pass its filters, recording their sizes in `sizes`.
+    """
+    archive = counter.config.root
+    # like the walk, members of directories it would prune are skipped without a trace.
+    skipped: dict[Path, bool] = {archive: False}
+
+    def is_skipped(directory: Path) -> bool:
+        if directory not in skipped:
+            skipped[directory] = is_skipped(directory.parent) or counter.skip_dir(
+                directory
+            )
+        return skipped[directory]
+
+    for name, size, stream in members(archive):
+        file = archive / name
+        if is_skipped(file.parent):
+            continue
+        if not counter.streaming:
+            counter.all_files.append(file)
+        # members are never symlinks, and never outside the archive.
+        if counter.filter_file(file, is_symlink=False):
+            continue
+        sizes[file] = size
+        yield file, size, stream
+
+
+def _tar_members(archive: Path) -> Iterator[tuple[str, int, IO[bytes]]]:
+    with tarfile.open(archive, "r|*") as tar:
+        for member in tar:
+            if not member.isreg():
+                continue
+            stream = tar.extractfile(member)
+            if stream is not None:
+                yield _member_path(member.name), member.size, stream
+
+
+def _zip_members(archive: Path) -> Iterator[tuple[str, int, IO[bytes]]]:
+    with zipfile.ZipFile(archive) as zip_file:
+        for info in zip_file.infolist():
+            if info.is_dir() or stat.S_ISLNK(info.external_attr >> 16):
+                continue
+            try:
+                stream = zip_file.open(info)
+            except (NotImplementedError, RuntimeError) as e:
+                # unsupported compression methods and encrypted members.
+                logging.debug(f"could not read {info.filename}: {e}")
+                continue
+            with stream:
+                yield _member_path(info.filename), info.file_size, stream
+
+
+def _member_path(name: str) -> str:
+    # archives may hold absolute paths or `./` prefixes; members are only ever named, never written.
+    return PurePosixPath(name.lstrip("/")).as_posix()
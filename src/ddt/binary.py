@@ -0,0 +1,65 @@
+import codecs
+import io
+from pathlib import Path
+
+"""
+Binary file detection
+"""
+
+# how much of a file is inspected before deciding it isn't text.
+SNIFF_BYTES = 8192
+# share of a prefix that may fail to decode as UTF-8 before the file counts as binary.
+INVALID_UTF8_RATIO = 0.1
+
+# extensions that are never text, so their files are skipped without being opened.
+BINARY_EXTENSIONS: frozenset[str] = frozenset(
+    {
+        ".7z", ".a", ".avi", ".bin", ".bz2", ".class", ".db", ".dll", ".dylib",
+        ".eot", ".exe", ".flac", ".gz", ".jar", ".lib", ".lz4", ".mkv", ".mov",
+        ".mp3", ".mp4", ".npy", ".npz", ".o", ".obj", ".ogg", ".otf", ".parquet",
+        ".pdf", ".pickle", ".pkl", ".pyc", ".pyd", ".pyo", ".rar", ".rlib",
+        ".so", ".sqlite", ".sqlite3", ".tar", ".tgz", ".ttf", ".wasm", ".wav",
+        ".whl", ".woff", ".woff2", ".xz", ".zip", ".zst",
+    }
+)  # fmt: skip
+
+
+def is_binary_extension(extension: str) -> bool:
+    """
+    Checks an extension, e.g. ".so" or ".tar.gz", against the known binary formats.
+    Only the last suffix matters, so ".tar.gz" is binary because ".gz" is.
+    """
+    dot = extension.rfind(".")
+    return dot >= 0 and extension[dot:].lower() in BINARY_EXTENSIONS
+
+
+def looks_binary(prefix: bytes) -> bool:
+    """
+    Guesses from the start of a file whether it is binary: it holds a NUL byte, or more than
+    INVALID_UTF8_RATIO of it isn't valid UTF-8.
+    """
+    if not prefix:
+        return False
+    if b"\0" in prefix:
+        return True
+    # a character cut off by the end of the prefix is held back rather than counted as invalid.
+    decoded = codecs.getincrementaldecoder("utf-8")("replace").decode(prefix)
+    return decoded.count("\ufffd") > INVALID_UTF8_RATIO * len(prefix)
+
+
+def read_unless_binary(file: Path) -> bytes | None:
+    """
+    Reads a file whole, unless its first SNIFF_BYTES show it is binary, in which case returns None.
+    """
+    with file.open("rb") as f:
+        prefix = f.read(SNIFF_BYTES)
+        if looks_binary(prefix):
+            return None
+        return prefix + f.read()
+
+
+def decode(data: bytes) -> str:
+    """
+    Decodes a file's bytes the way `Path.read_text` does, newline translation included.
+    """
+    return io.TextIOWrapper(io.BytesIO(data)).read()
@@ -0,0 +1,259 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+"""
+Persistent token cache
+"""
+
+# the most files the cache will remember before evicting the least recently used.
+MAX_ENTRIES = 1_000_000
+# how long a process waits on another process holding the database lock, in seconds.
+LOCK_TIMEOUT = 30.0
+# write buffered entries to disk once this many are pending.
+FLUSH_EVERY = 1_000
+
+# the encoding name used for image entries, whose counts don't depend on the model.
+IMAGE_ENCODING = "image"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT NOT NULL,
+    encoding TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    used INTEGER NOT NULL,
+    PRIMARY KEY (path, encoding)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS files_digest ON files (digest, encoding);
+CREATE INDEX IF NOT EXISTS files_used ON files (used);
+"""
+
+
+def default_cache_dir() -> Path:
+    """
+    Returns the per-user cache directory, honouring XDG_CACHE_HOME.
+    """
+    base = os.environ.get("XDG_CACHE_HOME")
+    return (Path(base) if base else Path.home() / ".cache") / "ddt"
+
+
+def default_vocab_dir() -> Path:
+    """
+    Returns the directory tokenizer vocabularies are kept in: $TIKTOKEN_CACHE_DIR when it is
+    set, so an existing tiktoken cache keeps being used, otherwise `vocab` in the cache directory.
+    """
+    vocab_dir = os.environ.get("TIKTOKEN_CACHE_DIR")
+    return Path(vocab_dir) if vocab_dir else default_cache_dir() / "vocab"
+
+
+def warmed_vocab_dir() -> Path | None:
+    """
+    Returns the vocabulary directory `ddt cache warm` fills by default, once it exists, so scans
+    load what it downloaded. None leaves the vocabularies to tiktoken's own cache.
+    """
+    vocab_dir = default_vocab_dir()
+    return vocab_dir if vocab_dir.is_dir() else None
+
+
+def content_digest(data: bytes) -> str:
+    """
+    Returns a fast content hash of the given bytes.
+    """
+    hasher = digest_hasher()
+    hasher.update(data)
+    return hasher.hexdigest()
+
+
+def digest_hasher() -> "hashlib.blake2b":
+    """
+    Returns an empty hasher for `content_digest`, for content read a piece at a time.
+    """
+    return hashlib.blake2b(digest_size=16)
+
+
+@dataclass(frozen=True)
+class CacheKey:
+    """
+    Identifies one file's token count for one encoding.
+
+    Properties:
+        path (str): The absolute path of the file.
+        encoding (str): The name of the encoding the count was made with.
+        size (int): The file size in bytes when it was counted.
+        mtime_ns (int): The file modification time in nanoseconds when it was counted.
+    """
+
+    path: str
+    encoding: str
+    size: int
+    mtime_ns: int
+
+
+class TokenCache:
+    """
+    A SQLite-backed cache of token counts shared by every ddt process on the machine.
+
+    Entries are looked up by absolute path and stat data first. When the stat data no longer
+    matches, e.g. after a fresh checkout, a content digest can still recover the count.
+    The database runs in WAL mode, so parallel jobs can read while another writes, and writes
+    are buffered and committed in batches. Any database error disables the cache for the rest
+    of the run rather than failing the scan.
+
+    Args:
+        directory (Path): The directory holding the cache database.
+        max_entries (int): The number of entries kept after eviction.
+    """
+
+    def __init__(self, directory: Path, max_entries: int = MAX_ENTRIES) -> None:
+        self.directory: Path = directory
+        self.max_entries: int = max_entries
+        self._pending: list[tuple[str, str, int, int, str, int, int]] = []
+        self._used: list[tuple[int, str, str]] = []
+        self._db: sqlite3.Connection | None = None
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(
+                directory / "tokens.sqlite3", timeout=LOCK_TIMEOUT
+            )
+            _ = self._db.execute("PRAGMA journal_mode=WAL")
+            _ = self._db.execute("PRAGMA synchronous=NORMAL")
+            _ = self._db.executescript(_SCHEMA)
+        except (OSError, sqlite3.Error) as e:
+            self._disable(e)
+
+    @property
+    def enabled(self) -> bool:
+        return self._db is not None
+
+    def key(
+        self, file: Path, encoding: str, stat: os.stat_result | None = None
+    ) -> CacheKey | None:
+        """
+        Builds the cache key for a file, or None if it can't be stat'd.
+        `stat` is the file's stat data when the caller already has it, e.g. from the walk.
+        """
+        if stat is None:
+            try:
+                stat = file.stat()
+            except OSError:
+                return None
+        # paths come from walking the resolved root, so realpath's lookups would add nothing.
+        return CacheKey(os.path.abspath(file), encoding, stat.st_size, stat.st_mtime_ns)
+
+    def get(self, key: CacheKey) -> int | None:
+        """
+        Returns the cached count for an unchanged file, or None on a miss.
+        """
+        row = self._fetch(
+            "SELECT tokens FROM files WHERE path = ? AND encoding = ? AND size = ? AND mtime_ns = ?",
+            (key.path, key.encoding, key.size, key.mtime_ns),
+        )
+        if row is None:
+            return None
+        self._used.append((int(time.time()), key.path, key.encoding))
+        return row
+
+    def get_by_digest(self, key: CacheKey, digest: str) -> int | None:
+        """
+        Returns the count of any cached file with the same content, re-keying it under `key`.
+        """
+        row = self._fetch(
+            "SELECT tokens FROM files WHERE digest = ? AND encoding = ? LIMIT 1",
+            (digest, key.encoding),
+        )
+        if row is not None:
+            self.put(key, row, digest)
+        return row
+
+    def put(self, key: CacheKey, tokens: int, digest: str = "") -> None:
+        """
+        Buffers a count to be written on the next flush.
+        """
+        if not self.enabled:
+            return
+        self._pending.append(
+            (
+                key.path,
+                key.encoding,
+                key.size,
+                key.mtime_ns,
+                digest,
+                tokens,
+                int(time.time()),
+            )
+        )
+        if len(self._pending) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes buffered entries and access times to disk in a single transaction.
+        """
+        if self._db is None or not (self._pending or self._used):
+            return
+        try:
+            with self._db:
+                _ = self._db.executemany(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    self._pending,
+                )
+                _ = self._db.executemany(
+                    "UPDATE files SET used = ? WHERE path = ? AND encoding = ?",
+                    self._used,
+                )
+        except sqlite3.Error as e:
+            self._disable(e)
+        self._pending = []
+        self._used = []
+
+    def evict(self) -> None:
+        """
+        Drops the least recently used entries once the cache holds more than `max_entries`.
+        """
+        if self._db is None:
+            return
+        try:
+            with self._db:
+                (count,) = self._db.execute("SELECT COUNT(*) FROM files").fetchone()
+                excess = count - self.max_entries
+                if excess > 0:
+                    logging.debug(f"evicting {excess} token cache entries")
+                    _ = self._db.execute(
+                        "DELETE FROM files WHERE (path, encoding) IN (SELECT path, encoding FROM files ORDER BY used LIMIT ?)",
+                        (excess,),
+                    )
+        except sqlite3.Error as e:
+            self._disable(e)
+
+    def close(self) -> None:
+        """
+        Flushes, evicts, and closes the database.
+        """
+        self.flush()
+        self.evict()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _fetch(self, query: str, params: tuple[str | int, ...]) -> int | None:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(query, params).fetchone()
+        except sqlite3.Error as e:
+            self._disable(e)
+            return None
+        return None if row is None else int(row[0])
+
+    def _disable(self, error: Exception) -> None:
+        logging.debug(f"token cache disabled: {error}")
+        if self._db is not None:
+            self._db.close()
+        self._db = None
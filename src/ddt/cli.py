@@ -1,6 +1,8 @@
-from pathlib import Path
 import argparse
 import sys
+from pathlib import Path
+from typing import Any, override
+
 from . import tokenizer
 
 
@@ -17,6 +19,61 @@ def read_file(path: Path):
         return f.read()
 
 
+def non_negative_int(value: str) -> int:
+    """
+    Argparse type for counts that may be zero but never negative.
+    """
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"{value} must be 0 or greater")
+    return number
+
+
+def fraction(value: str) -> float:
+    """
+    Argparse type for a share of something, greater than 0 and at most 1.
+    """
+    number = float(value)
+    if not 0 < number <= 1:
+        raise argparse.ArgumentTypeError(
+            f"{value} must be greater than 0 and at most 1"
+        )
+    return number
+
+
+def positive_float(value: str) -> float:
+    """
+    Argparse type for amounts that must be greater than zero.
+    """
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"{value} must be greater than 0")
+    return number
+
+
+class ModelsAction(argparse.Action):
+    """
+    Collects every model given to `--model`, repeated or separated by commas, into `models`,
+    keeping the first one in `model`.
+    """
+
+    @override
+    def __call__(
+        self,
+        parser: argparse.ArgumentParser,
+        namespace: argparse.Namespace,
+        values: Any,
+        option_string: str | None = None,
+    ) -> None:
+        models = [tokenizer.Model(name.strip()) for name in str(values).split(",")]
+        for model in models:
+            if model not in tokenizer.model_choices():
+                raise argparse.ArgumentError(self, f"invalid choice: {model!r}")
+        earlier: list[tokenizer.Model] = getattr(namespace, "models", None) or []
+        namespace.models = list(dict.fromkeys([*earlier, *models]))
+        namespace.model = namespace.models[0]
+
+
 def setup_argparse() -> argparse.ArgumentParser:
     """
     Configures the CLI flags.
@@ -29,7 +86,7 @@ def setup_argparse() -> argparse.ArgumentParser:
 
     _ = parser.add_argument(
         "root",
-        help="the relative or absolute path to the directory or file you wish to scan",
+        help="the relative or absolute path to the directory, or the .tar, .tar.gz, .tgz, .tar.bz2, .tar.xz or .zip archive, you wish to scan",
         type=Path,
     )
 
@@ -46,6 +103,11 @@ def setup_argparse() -> argparse.ArgumentParser:
         action="store_true",
         help="include files and directories found in the .gitignore file",
     )
+    _ = parser.add_argument(
+        "--git",
+        action="store_true",
+        help="count only the files tracked by git, read straight from the git index instead of walking the directory. token counts are cached by blob id, so identical content in other clones and worktrees is only tokenized once",
+    )
     _ = parser.add_argument(
         "-d",
         "--include-dotfiles",
@@ -75,13 +137,94 @@ def setup_argparse() -> argparse.ArgumentParser:
     _ = parser.add_argument(
         "-m",
         "--model",
-        action="store",
-        help="specify a model to use for token approximation. default is 'gpt-4o'",
-        choices=tokenizer.MODEL_CHOICES,
+        action=ModelsAction,
+        help="specify a model to use for token approximation. default is 'gpt-4o'. several models, repeated or comma-separated, are counted side by side in one pass",
         default=tokenizer.GPT_4O,
         type=tokenizer.Model,
     )
 
+    _ = parser.add_argument(
+        "--duplicates",
+        action="store_true",
+        help="report files whose content is identical to another scanned file, and how many tokens the copies account for",
+    )
+
+    _ = parser.add_argument(
+        "-j",
+        "--jobs",
+        action="store",
+        help="number of worker processes used for tokenization. 0 uses every available core. default is 1",
+        type=non_negative_int,
+        default=1,
+    )
+
+    _ = parser.add_argument(
+        "--read-ahead",
+        action="store",
+        help="number of threads reading files ahead of the tokenizer, for slow or network filesystems. at most 64MiB is read ahead at once. default is 0, which reads each file when it is needed",
+        metavar="THREADS",
+        type=non_negative_int,
+        default=0,
+    )
+
+    _ = parser.add_argument(
+        "--no-progress",
+        action="store_true",
+        help="don't show the live progress line on stderr. it is only shown when stderr is a terminal",
+    )
+    _ = parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="after the scan, report the wall and CPU time of each stage, bytes read, files and tokens per second, peak memory and the slowest files to stderr",
+    )
+    _ = parser.add_argument(
+        "--profile-json",
+        action="store",
+        help="write the --profile report to this file as JSON instead of to stderr",
+        metavar="FILE",
+        type=Path,
+    )
+    _ = parser.add_argument(
+        "--profile-stats",
+        action="store",
+        help="also run the scan under cProfile and dump the statistics to this file, for pstats or snakeviz",
+        metavar="FILE",
+        type=Path,
+    )
+
+    scan_mode_group = parser.add_mutually_exclusive_group()
+    _ = scan_mode_group.add_argument(
+        "--estimate",
+        action="store_true",
+        help="estimate text tokens from file sizes alone, without reading any files. ratios are learned from earlier exact scans when the cache is enabled",
+    )
+    _ = scan_mode_group.add_argument(
+        "--sample",
+        action="store",
+        help="tokenize only this fraction of each filetype's files, picked by size, and extrapolate the totals with a 95%% margin of error",
+        metavar="FRACTION",
+        type=fraction,
+    )
+    _ = scan_mode_group.add_argument(
+        "--sample-time",
+        action="store",
+        help="like --sample, but keep tokenizing sampled files until this many seconds have passed",
+        metavar="SECONDS",
+        type=positive_float,
+    )
+    _ = scan_mode_group.add_argument(
+        "--since",
+        action="store",
+        help="count only the files that changed since a git revision, both at that revision and now, and report the difference",
+        metavar="REV",
+        type=str,
+    )
+    _ = scan_mode_group.add_argument(
+        "--watch",
+        action="store_true",
+        help="after the scan, keep watching the directory and write a refreshed summary whenever files change. only the changed files are recounted",
+    )
+
     _ = parser.add_argument(
         "-o",
         "--output",
@@ -91,6 +234,25 @@ def setup_argparse() -> argparse.ArgumentParser:
         default=sys.stdout,
     )
 
+    cache_group = parser.add_mutually_exclusive_group()
+    _ = cache_group.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="don't read or write the persistent token cache",
+    )
+    _ = cache_group.add_argument(
+        "--cache-dir",
+        action="store",
+        help="the directory of the persistent token cache. default is $XDG_CACHE_HOME/ddt",
+        type=Path,
+    )
+    _ = parser.add_argument(
+        "--vocab-dir",
+        action="store",
+        help="load tokenizer vocabularies from this directory, downloading only those missing from it. fill it ahead of offline runs with `ddt cache warm`. default is the directory `ddt cache warm` fills, once it exists, otherwise tiktoken's own cache",
+        type=Path,
+    )
+
     output_type_group = parser.add_mutually_exclusive_group()
     _ = output_type_group.add_argument(
         "--json",
@@ -104,6 +266,11 @@ def setup_argparse() -> argparse.ArgumentParser:
         help="save the results of the scan to a HTML file",
         deprecated=True,
     )
+    _ = output_type_group.add_argument(
+        "--ndjson",
+        action="store_true",
+        help="stream one JSON record per file as it is counted, followed by per-filetype and grand total records",
+    )
 
     input_filter_group = parser.add_mutually_exclusive_group()
     _ = input_filter_group.add_argument(
@@ -118,4 +285,46 @@ def setup_argparse() -> argparse.ArgumentParser:
         help="specify file formats to include when counting. this flag may be set multiple times for multiple entries. cannot be set if excluding files",
         type=str,
     )
+    _ = parser.add_argument(
+        "--exclude-path",
+        action="append",
+        help="specify gitignore-style path globs, relative to the root, to ignore from counting, e.g. 'vendor/**'. matching directories are never descended. this flag may be set multiple times for multiple entries",
+        type=str,
+    )
+    return parser
+
+
+def setup_cache_argparse() -> argparse.ArgumentParser:
+    """
+    Configures the flags of `ddt cache`, which manages what ddt keeps on disk between runs.
+    """
+    parser = argparse.ArgumentParser(
+        prog="Tokenizer cache",
+        description="Manages the files ddt keeps between runs",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    warm = commands.add_parser(
+        "warm",
+        help="download the tokenizer vocabularies into the vocabulary directory, so later scans need no network",
+    )
+    _ = warm.add_argument(
+        "-m",
+        "--model",
+        action=ModelsAction,
+        help="the models whose vocabularies to download, repeated or comma-separated. default is every model",
+        type=tokenizer.Model,
+    )
+    _ = warm.add_argument(
+        "--vocab-dir",
+        action="store",
+        help="the directory to download into. default is $TIKTOKEN_CACHE_DIR, or $XDG_CACHE_HOME/ddt/vocab",
+        type=Path,
+    )
     return parser
+
+
+def is_cache_command(argv: list[str]) -> bool:
+    """
+    Checks whether the arguments run a `ddt cache` command rather than scan a directory named `cache`.
+    """
+    return len(argv) > 1 and argv[0] == "cache" and argv[1] in ("warm", "-h", "--help")
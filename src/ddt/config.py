@@ -1,8 +1,11 @@
 import logging
+import sys
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any, TextIO
-from dataclasses import dataclass, field
-from . import tokenizer
+
+from . import archives, cache, gitdiff, gitindex, tokenizer
+from .gitignore import GitIgnore
 
 """
 Config model
@@ -23,11 +26,29 @@ class Config:
         include_images (bool): Flag - True counts image tokens.
         resolve_paths (bool): Flag - True displays file names by their absolute path.
         model (Model): The specified model for the encoding algorithms.
+        models (list[Model]): Every model to count for, side by side - `model` always comes first.
+        duplicates (bool): Flag - True reports the files whose content is identical to another file's.
+        read_ahead (int): The number of threads reading files ahead of the tokenizer - 0 reads them as they are needed.
+        profile (bool): Flag - True reports where the scan spent its time, stage by stage, once it finishes.
+        profile_json (Path | None): The file the profile is written to as JSON - None writes it to stderr as a table.
+        profile_stats (Path | None): The file a cProfile dump of the tokenizing is written to, in pstats format.
+        progress (bool): Flag - True draws a live progress line on stderr while files are counted.
         output (TextIO): The output stream for results.
         output_format (str): The output encoding format.
         exclude (list[str]): The list of user-specified filetypes to exclude
         include (list[str]): The list of user-specified filetypes to include - all other types are ignored.
-        gitignore (set[Path]): The files found within the gitignore.
+        exclude_paths (list[str]): The list of user-specified gitignore-style path globs to exclude.
+        jobs (int): The number of worker processes used for tokenization - 0 uses every available core.
+        cache_dir (Path | None): The directory of the persistent token cache - None disables caching.
+        vocab_dir (Path | None): The directory tokenizer vocabularies are loaded from, and downloaded to when missing - None leaves it to tiktoken.
+        estimate (bool): Flag - True estimates text tokens from file sizes instead of reading the files.
+        sample (float | None): The fraction of each filetype's text files to tokenize - None counts them all.
+        sample_time (float | None): The seconds to spend tokenizing sampled text files - None counts them all.
+        git (bool): Flag - True lists the files tracked in the git index instead of walking the root.
+        since (str | None): A git revision - only files changed since it are counted, before and after.
+        watch (bool): Flag - True keeps the totals live after the scan, recounting files as they change.
+        archive (bool): Flag - True when the root is a tar or zip archive, whose members are counted without extracting it.
+        gitignore (GitIgnore | None): The matcher for gitignored files - None when they are included.
     """
 
     root: Path
@@ -42,76 +63,122 @@ class Config:
     output_format: str
     exclude: list[str]
     include: list[str]
-    gitignore: set[Path] = field(init=False)
+    exclude_paths: list[str] = field(default_factory=list)
+    jobs: int = 1
+    cache_dir: Path | None = None
+    vocab_dir: Path | None = None
+    estimate: bool = False
+    sample: float | None = None
+    sample_time: float | None = None
+    git: bool = False
+    since: str | None = None
+    watch: bool = False
+    models: list[tokenizer.Model] = field(default_factory=list)
+    duplicates: bool = False
+    read_ahead: int = 0
+    profile: bool = False
+    profile_json: Path | None = None
+    profile_stats: Path | None = None
+    progress: bool = False
+    archive: bool = field(init=False)
+    gitignore: GitIgnore | None = field(init=False)
 
     def __post_init__(self):
         self._setup_logging()
+        self.archive = archives.is_archive(self.root)
+        self._check_archive()
         self.gitignore = self._parse_gitignore()
-
-    # AI rewrote this function for me, need to replace.
-    def _parse_gitignore(self) -> set[Path]:
-        # TODO: ensure that this matches the gitignore spec: https://git-scm.com/docs/gitignore
+        self._check_revision()
+        self.models = list(dict.fromkeys([self.model, *self.models]))
+        self._check_models()
+        self.profile = (
+            self.profile
+            or self.profile_json is not None
+            or self.profile_stats is not None
+        )
+        self._check_profile()
+
+    def __getstate__(self) -> dict[str, Any]:
+        # the output stream can't cross a process boundary, and workers never write to it.
+        state = self.__dict__.copy()
+        state["output"] = None
+        return state
+
+    def _parse_gitignore(self) -> GitIgnore | None:
         """
-        Reads the .gitignore file in the given root directory, interprets its patterns,
-        and returns a set of Paths representing all files and directories within root that match
-        those patterns. Lines that are empty or start with '#' (comments) are ignored.
-
-        For pattern matching:
-          - Patterns that start with '/' are treated as relative to the root.
-          - Patterns that contain a slash (but do not start with '/') are also treated as relative.
-          - Patterns without any slash are searched recursively using rglob.
-          - If a pattern ends with '/', it is interpreted as a directory (the trailing slash is removed
-            before matching).
-
-        Args:
-            root (Path): The root directory containing the .gitignore file.
+        Compiles the .gitignore files under the root directory into a matcher.
+        Patterns are compiled once, and nested .gitignore files are read lazily
+        as the walk reaches them, so nothing here walks the tree.
 
         Returns:
-            Set[Path]: A set of Paths that match the patterns specified in the .gitignore file.
+            GitIgnore | None: The matcher, or None when gitignored files are included,
+                only tracked files are listed, or the root is an archive.
         """
 
+        if self.archive:
+            return None
         if not self.root.is_dir():
             logging.info(f"{self.root} is not a directory, exiting.")
             exit(1)
 
-        ignored: set[Path] = set()
-        gitignore_file: Path = self.root / ".gitignore"
-
-        try:
-            with gitignore_file.open("r") as f:
-                patterns: list[str] = []
-                for line in f:
-                    stripped = line.strip()
-                    # Skip empty lines or comments.
-                    if not stripped or stripped.startswith("#"):
-                        continue
-                    patterns.append(stripped)
-        except FileNotFoundError:
-            return ignored  # No .gitignore file found.
-
-        for pattern in patterns:
-            # Check if the pattern is meant for directories (ends with a slash)
-            if pattern.endswith("/"):
-                # Remove trailing slash for glob matching.
-                pattern = pattern.rstrip("/")
-
-            # If the pattern starts with '/', it is anchored to the root.
-            if pattern.startswith("/"):
-                # Remove the leading slash.
-                pattern = pattern[1:]
-                # Use glob relative to the root (non-recursive).
-                matches = self.root.glob(pattern)
-            # If the pattern contains a slash somewhere, treat it as relative to the root.
-            elif "/" in pattern:
-                matches = self.root.glob(pattern)
-            else:
-                # Pattern without a slash: search recursively.
-                matches = self.root.rglob(pattern)
-
-            for match in matches:
-                ignored.add(Path(match))
-
-        return ignored
+        if self.git:
+            if gitindex.find_work_tree(self.root.absolute()) is None:
+                logging.info(f"{self.root} is not inside a git work tree, exiting.")
+                sys.exit(1)
+            return None
+        if self.include_gitignore:
+            return None
+        return GitIgnore(self.root)
+
+    def _check_archive(self) -> None:
+        """
+        Makes sure an archive root is only scanned by reading its members, once.
+        """
+        if not self.archive:
+            return
+        if self.git or self.since is not None or self.watch:
+            logging.info(
+                f"{self.root} is an archive, which --git, --since and --watch can't scan, exiting."
+            )
+            sys.exit(1)
+        if self.estimate or self.sample is not None or self.sample_time is not None:
+            logging.info(
+                f"{self.root} is an archive, which is always counted exactly, exiting."
+            )
+            sys.exit(1)
+
+    def _check_revision(self) -> None:
+        """
+        Makes sure the `since` revision names a commit in the repository holding the root.
+        """
+        if self.since is None:
+            return
+        if gitdiff.resolve_revision(self.root, self.since) is None:
+            logging.info(
+                f"{self.since} is not a revision of the git repository at {self.root}, exiting."
+            )
+            sys.exit(1)
+
+    def _check_models(self) -> None:
+        """
+        Makes sure several models are only asked for in scans that count every file exactly.
+        """
+        if len(self.models) == 1:
+            return
+        if self.estimate or self.sample is not None or self.sample_time is not None:
+            logging.info("estimated and sampled scans count a single model, exiting.")
+            sys.exit(1)
+        if self.since is not None:
+            logging.info("--since counts a single model, exiting.")
+            sys.exit(1)
+
+    def _check_profile(self) -> None:
+        """
+        Makes sure profiling is only asked for in scans that finish.
+        """
+        if self.profile and self.watch:
+            logging.info("--watch never finishes a scan to profile, exiting.")
+            sys.exit(1)
 
     def _setup_logging(self) -> None:
         level = logging.DEBUG if self.is_verbose else logging.INFO
@@ -132,6 +199,8 @@ def generate_config(args: dict[str, Any]) -> Config:
         output_format = "json"
     elif args["html"]:
         output_format = "html"
+    elif args.get("ndjson"):
+        output_format = "ndjson"
     else:
         output_format = "txt"
 
@@ -148,5 +217,27 @@ def generate_config(args: dict[str, Any]) -> Config:
         output_format=output_format,
         exclude=args["exclude"],
         include=args["include"],
+        exclude_paths=args.get("exclude_path") or [],
+        jobs=args.get("jobs", 1),
+        cache_dir=None
+        if args.get("no_cache")
+        else args.get("cache_dir") or cache.default_cache_dir(),
+        vocab_dir=args.get("vocab_dir") or cache.warmed_vocab_dir(),
+        estimate=args.get("estimate", False),
+        sample=args.get("sample"),
+        sample_time=args.get("sample_time"),
+        git=args.get("git", False),
+        since=args.get("since"),
+        watch=args.get("watch", False),
+        models=args.get("models") or [],
+        duplicates=args.get("duplicates", False),
+        read_ahead=args.get("read_ahead", 0),
+        profile=args.get("profile", False),
+        profile_json=args.get("profile_json"),
+        profile_stats=args.get("profile_stats"),
+        # the line is redrawn in place, which only works on a terminal, and debug logs would break it up.
+        progress=not args.get("no_progress", False)
+        and not args["verbose"]
+        and sys.stderr.isatty(),
     )
     return cfg
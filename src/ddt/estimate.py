@@ -0,0 +1,279 @@
+import json
+import logging
+import math
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from . import binary
+
+if TYPE_CHECKING:
+    from .models import TokenCounter
+
+"""
+Token estimates from file sizes
+"""
+
+# the file in the cache directory the learned ratios are kept in.
+RATIOS_FILE = "ratios.json"
+# rough bytes per token for common extensions, used until a scan has learned better.
+DEFAULT_BYTES_PER_TOKEN: dict[str, float] = {
+    ".c": 3.4,
+    ".cpp": 3.4,
+    ".css": 3.1,
+    ".csv": 2.6,
+    ".go": 3.6,
+    ".h": 3.5,
+    ".html": 3.2,
+    ".java": 4.0,
+    ".js": 3.5,
+    ".json": 3.0,
+    ".jsx": 3.4,
+    ".md": 4.3,
+    ".py": 3.7,
+    ".rb": 3.7,
+    ".rs": 3.5,
+    ".rst": 4.2,
+    ".sh": 3.5,
+    ".svg": 2.6,
+    ".toml": 3.4,
+    ".ts": 3.5,
+    ".tsx": 3.4,
+    ".txt": 4.4,
+    ".xml": 3.0,
+    ".yaml": 3.4,
+    ".yml": 3.4,
+}
+DEFAULT_RATIO = 4.0
+# assumed relative spread of a built-in ratio, both per file and for the extension as a whole.
+DEFAULT_RELATIVE_ERROR = 0.25
+# learned ratios are only trusted once this many files have been counted exactly.
+MIN_LEARNED_FILES = 5
+# older observations are scaled down past this many files, so the table follows the code base.
+MAX_LEARNED_FILES = 100_000
+# multiplier turning a standard deviation into a 95% margin.
+Z_95 = 1.96
+# the same for a variance estimated from 2 to 31 draws, i.e. Student's t with 1 to 30 degrees of freedom.
+T_95 = (
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+)  # fmt: skip
+
+
+@dataclass
+class RatioStats:
+    """
+    Running statistics of the exactly counted files of one extension.
+
+    Properties:
+        files (float): The number of files seen.
+        bytes (float): Their total size.
+        tokens (float): Their total token count.
+        rate_sum (float): The sum of each file's tokens per byte.
+        rate_sq_sum (float): The sum of the squares of each file's tokens per byte.
+    """
+
+    files: float = 0
+    bytes: float = 0
+    tokens: float = 0
+    rate_sum: float = 0.0
+    rate_sq_sum: float = 0.0
+
+    def add(self, size: int, tokens: int) -> None:
+        rate = tokens / size
+        self.files += 1
+        self.bytes += size
+        self.tokens += tokens
+        self.rate_sum += rate
+        self.rate_sq_sum += rate * rate
+
+    def merge(self, other: "RatioStats") -> None:
+        self.files += other.files
+        self.bytes += other.bytes
+        self.tokens += other.tokens
+        self.rate_sum += other.rate_sum
+        self.rate_sq_sum += other.rate_sq_sum
+
+    def scale(self, factor: float) -> None:
+        self.files *= factor
+        self.bytes *= factor
+        self.tokens *= factor
+        self.rate_sum *= factor
+        self.rate_sq_sum *= factor
+
+    @property
+    def rate_deviation(self) -> float:
+        """
+        The sample standard deviation of tokens per byte across files.
+        """
+        if self.files < 2:
+            return 0.0
+        mean = self.rate_sum / self.files
+        variance = (self.rate_sq_sum - self.files * mean * mean) / (self.files - 1)
+        return math.sqrt(max(variance, 0.0))
+
+
+class RatioTable:
+    """
+    Bytes-per-token ratios for one encoding, learned from exact scans and stored as JSON.
+
+    Exact scans feed every counted text file to `learn`, and `save` folds them into the file.
+    Estimates use the learned ratio of an extension once it has enough files behind it, and
+    the built-in default otherwise. Read and write errors are logged and ignored, so a broken
+    table only costs accuracy.
+
+    Args:
+        path (Path | None): The JSON file holding the table, or None to use only the defaults.
+        encoding (str): The name of the encoding the ratios belong to.
+    """
+
+    def __init__(self, path: Path | None, encoding: str) -> None:
+        self.path: Path | None = path
+        self.encoding: str = encoding
+        self.stats: dict[str, RatioStats] = self._load().get(encoding, {})
+        self._learned: dict[str, RatioStats] = {}
+
+    def learn(self, extension: str, size: int, tokens: int) -> None:
+        """
+        Records an exactly counted file. Empty files teach nothing and are skipped.
+        """
+        if size <= 0 or tokens <= 0:
+            return
+        self._learned.setdefault(extension, RatioStats()).add(size, tokens)
+
+    def tokens_per_byte(self, extension: str) -> tuple[float, float, float]:
+        """
+        Returns the tokens per byte for an extension, with the spread of single files around it
+        and the uncertainty of the ratio itself, both in tokens per byte.
+        """
+        stats = self.stats.get(extension)
+        if stats is not None and stats.files >= MIN_LEARNED_FILES and stats.bytes > 0:
+            rate = stats.tokens / stats.bytes
+            spread = stats.rate_deviation
+            return rate, spread, spread / math.sqrt(stats.files)
+        rate = 1 / DEFAULT_BYTES_PER_TOKEN.get(extension, DEFAULT_RATIO)
+        return rate, rate * DEFAULT_RELATIVE_ERROR, rate * DEFAULT_RELATIVE_ERROR
+
+    def estimate(self, extension: str, size: int) -> int:
+        """
+        Estimates the token count of a file from its size.
+        """
+        return round(size * self.tokens_per_byte(extension)[0])
+
+    def variance(self, extension: str, total_bytes: int, sum_sq_bytes: int) -> float:
+        """
+        Returns the variance of an estimated extension total.
+
+        Args:
+            extension (str): The extension.
+            total_bytes (int): The combined size of the estimated files.
+            sum_sq_bytes (int): The sum of the squares of their sizes.
+
+        Returns:
+            float: the per-file scatter plus the shared error of the ratio, in tokens squared.
+        """
+        _, spread, error = self.tokens_per_byte(extension)
+        return sum_sq_bytes * spread * spread + (total_bytes * error) ** 2
+
+    def save(self) -> None:
+        """
+        Folds the files learned in this run into the stored table.
+        """
+        if self.path is None or not self._learned:
+            return
+        table = self._load()
+        stats = table.setdefault(self.encoding, {})
+        for extension, learned in self._learned.items():
+            stats.setdefault(extension, RatioStats()).merge(learned)
+            if stats[extension].files > MAX_LEARNED_FILES:
+                stats[extension].scale(MAX_LEARNED_FILES / stats[extension].files)
+        data = {
+            "version": 1,
+            "encodings": {
+                encoding: {ext: asdict(stat) for ext, stat in by_ext.items()}
+                for encoding, by_ext in table.items()
+            },
+        }
+        temporary = self.path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            _ = temporary.write_text(json.dumps(data))
+            _ = temporary.replace(self.path)
+        except OSError as e:
+            logging.debug(f"could not save token ratios: {e}")
+            return
+        self.stats = stats
+        self._learned = {}
+
+    def _load(self) -> dict[str, dict[str, RatioStats]]:
+        if self.path is None:
+            return {}
+        try:
+            data = json.loads(self.path.read_text())
+            return {
+                encoding: {ext: RatioStats(**stat) for ext, stat in by_ext.items()}
+                for encoding, by_ext in data["encodings"].items()
+            }
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            logging.debug(f"could not read token ratios: {e}")
+            return {}
+
+
+def margin(variance: float, draws: int | None = None) -> float:
+    """
+    Returns the half-width of a 95% interval for a total with the given variance.
+
+    Args:
+        variance (float): The variance of the total.
+        draws (int | None): The sample size the variance was estimated from, if any.
+            Small samples widen the interval to Student's t.
+    """
+    if draws is not None and 1 < draws <= len(T_95):
+        return T_95[draws - 2] * math.sqrt(variance)
+    return Z_95 * math.sqrt(variance)
+
+
+def estimate_files(counter: "TokenCounter") -> None:
+    """
+    Estimates each text file's tokens from its size alone, using the bytes-per-token ratio
+    of its extension, then sets the 95% margins of each extension total and the grand total.
+    Images are still counted exactly from their headers when they are included.
+    """
+    sizes: dict[str, tuple[int, int]] = {}
+    for entry in counter.walk():
+        if counter.filter_file(entry.path, entry.is_symlink):
+            continue
+        file_extension = counter.grab_suffix(entry.path)
+        if counter.file_category(file_extension) != "text":
+            file_extension, token_counts = counter.parse_file(entry.path)
+            counter.record(entry.path, file_extension, token_counts)
+            continue
+        if binary.is_binary_extension(file_extension):
+            counter.add_to_ignored(entry.path)
+            continue
+
+        size = entry.size
+        counter.record(
+            entry.path, file_extension, counter.ratios.estimate(file_extension, size)
+        )
+        total_bytes, sum_sq_bytes = sizes.get(file_extension, (0, 0))
+        sizes[file_extension] = (total_bytes + size, sum_sq_bytes + size * size)
+    cache = counter.cache
+    if cache is not None:
+        cache.close()
+
+    total_variance = 0.0
+    for file_extension, category in counter.scanned_files.items():
+        variance = 0.0
+        if file_extension in sizes:
+            total_bytes, sum_sq_bytes = sizes[file_extension]
+            variance = counter.ratios.variance(
+                file_extension, total_bytes, sum_sq_bytes
+            )
+        category.margin = margin(variance)
+        total_variance += variance
+    counter.margin = margin(total_variance)
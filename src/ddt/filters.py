@@ -0,0 +1,96 @@
+from pathlib import Path
+
+from .gitignore import IgnoreFile, parse_lines
+
+"""
+Include and exclude rules
+"""
+
+
+class FileFilter:
+    """
+    The user's include and exclude rules, compiled into checks the walk runs once per entry.
+
+    Extensions are matched against the end of the file name, the same way `*.ext` would be.
+    Path globs use gitignore syntax relative to the root, so `vendor/**` excludes everything
+    under `vendor/` and `node_modules` excludes any directory with that name.
+
+    Args:
+        root (Path): The root of the scan, which path globs are relative to.
+
+    Attributes:
+        included_extensions (set[str]): Extensions to count, without the leading dot. Empty means all.
+        excluded_extensions (set[str]): Extensions to skip, without the leading dot.
+        excluded_paths (list[str]): Path globs to skip.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root: Path = root
+        self._absolute_root: Path = root.absolute()
+        self.included_extensions: set[str] = set()
+        self.excluded_extensions: set[str] = set()
+        self.excluded_paths: list[str] = []
+        self._included_suffixes: tuple[str, ...] = ()
+        self._excluded_suffixes: tuple[str, ...] = ()
+        self._paths: IgnoreFile | None = None
+        self._prune_inside: bool = False
+
+    def include_extensions(self, extensions: list[str]) -> None:
+        """
+        Only counts files ending with one of the given extensions, e.g. "py" or ".py".
+        """
+        self.included_extensions.update(ext.lstrip(".") for ext in extensions)
+        self._included_suffixes = tuple(f".{ext}" for ext in self.included_extensions)
+
+    def exclude_extensions(self, extensions: list[str]) -> None:
+        """
+        Skips files ending with one of the given extensions, e.g. "py" or ".py".
+        """
+        self.excluded_extensions.update(ext.lstrip(".") for ext in extensions)
+        self._excluded_suffixes = tuple(f".{ext}" for ext in self.excluded_extensions)
+
+    def exclude_paths(self, globs: list[str]) -> None:
+        """
+        Skips files and directories matching the given gitignore-style globs.
+        """
+        self.excluded_paths.extend(globs)
+        patterns = parse_lines(self.excluded_paths)
+        self._paths = IgnoreFile(patterns) if patterns else None
+        # without negations, a glob ending in `/**` excludes the whole directory.
+        self._prune_inside = not any(pattern.negated for pattern in patterns)
+
+    def excludes(self, file: Path) -> bool:
+        """
+        Checks whether a file fails the rules.
+        """
+        name = file.name
+        if self._included_suffixes and not name.endswith(self._included_suffixes):
+            return True
+        if self._excluded_suffixes and name.endswith(self._excluded_suffixes):
+            return True
+        if self._paths is None:
+            return False
+        relative = self._relative(file)
+        return relative is not None and self._paths.match(relative, False) is True
+
+    def prunes(self, directory: Path) -> bool:
+        """
+        Checks whether a directory can be skipped without being opened.
+        """
+        if self._paths is None:
+            return False
+        relative = self._relative(directory)
+        if relative is None:
+            return False
+        if self._paths.match(relative, True) is True:
+            return True
+        return self._prune_inside and self._paths.match(f"{relative}/", False) is True
+
+    def _relative(self, file: Path) -> str | None:
+        try:
+            return file.relative_to(self.root).as_posix()
+        except ValueError:
+            try:
+                return file.absolute().relative_to(self._absolute_root).as_posix()
+            except ValueError:
+                return None
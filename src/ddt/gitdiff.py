@@ -0,0 +1,187 @@
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from . import binary, cache, gitindex, images, tokenizer
+
+if TYPE_CHECKING:
+    from .models import TokenCounter
+
+"""
+Changed files against a git revision
+"""
+
+
+def _git(root: Path, *args: str, stdin: bytes | None = None) -> bytes:
+    # subprocess is only imported once `--since` asks for git.
+    import subprocess
+
+    return subprocess.run(
+        ["git", *args],
+        cwd=root,
+        input=stdin,
+        capture_output=True,
+        check=True,
+    ).stdout
+
+
+def resolve_revision(root: Path, revision: str) -> str | None:
+    """
+    Returns the commit id a revision names in the repository holding `root`, or None if it names no commit.
+    """
+    import subprocess
+
+    try:
+        output = _git(
+            root, "rev-parse", "--verify", "--quiet", f"{revision}^{{commit}}"
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        logging.debug(f"could not resolve {revision}: {e}")
+        return None
+    return output.decode().strip() or None
+
+
+def changed_paths(root: Path, revision: str) -> list[str]:
+    """
+    Lists the files under `root` that differ between a revision and the working tree,
+    including untracked files that aren't ignored. Renames count as a deletion and an addition.
+
+    Returns:
+        list[str]: the paths relative to `root`, using `/` separators, sorted.
+    """
+    diff = _git(
+        root, "diff", "--name-only", "--no-renames", "--relative", "-z", revision, "--"
+    )
+    untracked = _git(root, "ls-files", "--others", "--exclude-standard", "-z")
+    paths = {
+        path.decode(errors="surrogateescape")
+        for path in (diff + untracked).split(b"\0")
+        if path
+    }
+    return sorted(paths)
+
+
+def read_blobs(
+    root: Path, revision: str, paths: list[str]
+) -> dict[str, tuple[str, bytes]]:
+    """
+    Reads files as they were at a revision with a single `git cat-file --batch`.
+
+    Args:
+        root (Path): The directory the paths are relative to.
+        revision (str): The revision to read them at.
+        paths (list[str]): The paths, relative to `root`.
+
+    Returns:
+        dict[str, tuple[str, bytes]]: the blob id and content of each path that existed at the revision.
+    """
+    if not paths:
+        return {}
+    # `rev:./path` is resolved relative to the working directory.
+    request = b"".join(
+        f"{revision}:./{path}\n".encode(errors="surrogateescape") for path in paths
+    )
+    output = _git(root, "cat-file", "--batch", stdin=request)
+
+    blobs: dict[str, tuple[str, bytes]] = {}
+    offset = 0
+    for path in paths:
+        end = output.index(b"\n", offset)
+        header = output[offset:end]
+        offset = end + 1
+        # "<object> missing": the file didn't exist at the revision.
+        if header.endswith((b" missing", b" ambiguous")):
+            continue
+        blob, kind, size = header.decode().split()
+        content = output[offset : offset + int(size)]
+        offset += int(size) + 1
+        if kind == "blob":
+            blobs[path] = (blob, content)
+    return blobs
+
+
+def count_since(counter: "TokenCounter", revision: str) -> None:
+    """
+    Counts only the files that differ between a git revision and the working tree, both
+    as they were at the revision and as they are now, so every file, extension and the
+    grand total show how far the change moved them. The work grows with the diff, not the tree.
+    """
+    root = counter.config.root
+    counter.before = 0
+    paths: list[str] = []
+    for path in changed_paths(root, revision):
+        if counter.filter_file(root / path):
+            continue
+        paths.append(path)
+    before = _count_blobs(counter, read_blobs(root, revision, paths))
+
+    files = [root / path for path in paths]
+    if not counter.streaming:
+        counter.all_files.extend(files)
+    now = {
+        file: (file_extension, token_counts)
+        for file, file_extension, token_counts in counter.parse_many(
+            file for file in files if file.is_file()
+        )
+    }
+    for path, file in zip(paths, files):
+        file_extension, token_counts = now.get(file, ("", -1))
+        if token_counts < 0:
+            # deleted now, or skipped now but counted before.
+            if path not in before:
+                continue
+            file_extension, token_counts = counter.grab_suffix(file), 0
+        counter.record(file, file_extension, token_counts, before.get(path, 0))
+    token_cache = counter.cache
+    if token_cache is not None:
+        token_cache.close()
+
+
+def _count_blobs(
+    counter: "TokenCounter", blobs: dict[str, tuple[str, bytes]]
+) -> dict[str, int]:
+    """
+    Counts file contents read from git, by path. Binary files and images that aren't
+    included are left out, and counts are cached under the blob id.
+    """
+    token_cache = counter.cache
+    counts: dict[str, int] = {}
+    pending: list[tuple[str, str, cache.CacheKey]] = []
+    for path, (blob, data) in blobs.items():
+        file = counter.config.root / path
+        file_extension = counter.grab_suffix(file)
+        if counter.file_category(file_extension) == "image":
+            if counter.config.include_images:
+                size = images.probe_bytes(data, file.name)
+                if size is None:
+                    counts[path] = 0
+                else:
+                    width, height = size
+                    counts[path] = tokenizer.calculate_image_tokens(width, height)
+            continue
+        if binary.is_binary_extension(file_extension) or binary.looks_binary(
+            data[: binary.SNIFF_BYTES]
+        ):
+            continue
+
+        digest = f"{gitindex.DIGEST_PREFIX}{blob}"
+        # blobs have no path or mtime of their own, so they are keyed by their digest.
+        key = cache.CacheKey(digest, counter.engine.encoding_name, len(data), 0)
+        tokens = (
+            token_cache.get_by_digest(key, digest) if token_cache is not None else None
+        )
+        if tokens is not None:
+            if tokens >= 0:
+                counts[path] = tokens
+            continue
+        try:
+            pending.append((path, binary.decode(data), key))
+        except UnicodeDecodeError:
+            counts[path] = 0
+
+    token_counts = counter.engine.count_batch([text for _, text, _ in pending])
+    for (path, _, key), tokens in zip(pending, token_counts):
+        counts[path] = tokens
+        if token_cache is not None:
+            token_cache.put(key, tokens, key.path)
+    return counts
@@ -0,0 +1,273 @@
+import logging
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+"""
+Gitignore matching, following https://git-scm.com/docs/gitignore
+"""
+
+
+@dataclass(frozen=True)
+class Pattern:
+    """
+    A single compiled line of a .gitignore file.
+
+    Properties:
+        regex (re.Pattern[str]): Matches paths relative to the directory holding the .gitignore.
+        negated (bool): True for `!` patterns, which re-include a path.
+        dir_only (bool): True for patterns ending in `/`, which only match directories.
+    """
+
+    regex: re.Pattern[str]
+    negated: bool
+    dir_only: bool
+
+
+class IgnoreFile:
+    """
+    The compiled patterns of one .gitignore file.
+
+    Every pattern is also folded into one combined regex, so the common case of a path
+    matching nothing costs a single search instead of one per pattern.
+
+    Args:
+        patterns (list[Pattern]): The patterns, in file order.
+    """
+
+    def __init__(self, patterns: list[Pattern]) -> None:
+        self.patterns: list[Pattern] = patterns
+        self.combined: re.Pattern[str] = re.compile(
+            "|".join(f"(?:{pattern.regex.pattern})" for pattern in patterns)
+        )
+
+    def match(self, path: str, is_dir: bool) -> bool | None:
+        """
+        Checks a path against the file's patterns. The last matching pattern wins.
+
+        Args:
+            path (str): The path relative to the .gitignore's directory, using `/` separators.
+            is_dir (bool): Whether the path is a directory.
+
+        Returns:
+            bool | None: True if ignored, False if re-included, None if no pattern matched.
+        """
+        if self.combined.fullmatch(path) is None:
+            return None
+        for pattern in reversed(self.patterns):
+            if pattern.dir_only and not is_dir:
+                continue
+            if pattern.regex.fullmatch(path):
+                return not pattern.negated
+        return None
+
+
+def parse_lines(lines: list[str]) -> list[Pattern]:
+    """
+    Compiles the lines of a .gitignore file, skipping blanks and comments.
+    """
+    patterns: list[Pattern] = []
+    for line in lines:
+        pattern = compile_pattern(line)
+        if pattern is not None:
+            patterns.append(pattern)
+    return patterns
+
+
+def compile_pattern(line: str) -> Pattern | None:
+    """
+    Compiles one .gitignore line into a Pattern, or None for blank lines and comments.
+    """
+    line = line.rstrip("\n").rstrip("\r")
+    # trailing spaces are ignored unless escaped with a backslash.
+    while line.endswith(" ") and not line.endswith("\\ "):
+        line = line[:-1]
+    if not line or line.startswith("#"):
+        return None
+
+    negated = line.startswith("!")
+    if negated:
+        line = line[1:]
+
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+
+    # a slash anywhere but the end anchors the pattern to the .gitignore's directory.
+    anchored = "/" in line
+    line = line.lstrip("/")
+    body = translate(line)
+    if not anchored:
+        body = f"(?:.*/)?{body}"
+    return Pattern(re.compile(body), negated, dir_only)
+
+
+def translate(pattern: str) -> str:
+    """
+    Translates a gitignore glob into a regex body.
+
+    `*` and `?` never match `/`. A `**` segment matches any number of directories:
+    a leading `**/` matches in every directory, `/**/` matches zero or more directories,
+    and a trailing `/**` matches everything inside. Any other `**` acts like `*`.
+    """
+    result: list[str] = []
+    i, n = 0, len(pattern)
+    while i < n:
+        char = pattern[i]
+        if char == "*":
+            j = i
+            while j < n and pattern[j] == "*":
+                j += 1
+            whole_segment = (
+                j - i == 2
+                and (i == 0 or pattern[i - 1] == "/")
+                and (j == n or pattern[j] == "/")
+            )
+            if whole_segment and j == n:
+                result.append(".*")
+            elif whole_segment:
+                result.append("(?:.*/)?")
+                j += 1
+            else:
+                result.append("[^/]*")
+            i = j
+        elif char == "?":
+            result.append("[^/]")
+            i += 1
+        elif char == "[":
+            j = i + 1
+            if j < n and pattern[j] in "!^":
+                j += 1
+            if j < n and pattern[j] == "]":
+                j += 1
+            while j < n and pattern[j] != "]":
+                j += 1
+            if j >= n:
+                result.append(re.escape(char))
+                i += 1
+                continue
+            body = pattern[i + 1 : j].replace("\\", "\\\\")
+            if body[0] in "!^":
+                body = "^" + body[1:]
+            result.append(f"[{body}]")
+            i = j + 1
+        elif char == "\\" and i + 1 < n:
+            result.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            result.append(re.escape(char))
+            i += 1
+    return "".join(result)
+
+
+class GitIgnore:
+    """
+    A lazy matcher for every .gitignore file under a root directory.
+
+    Nested .gitignore files are read the first time a path beneath them is checked, and
+    directory results are memoised, so a walk that prunes ignored directories only pays
+    for the directories and files it actually visits.
+
+    Args:
+        root (Path): The directory holding the top-level .gitignore.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root: Path = root
+        self._absolute_root: Path = root.absolute()
+        self._files: dict[str, IgnoreFile | None] = {}
+        self._dirs: dict[str, bool] = {}
+
+    def matches(self, file: Path, is_dir: bool = False) -> bool:
+        """
+        Checks whether a path under the root is ignored.
+
+        Args:
+            file (Path): The path, either relative to the working directory or absolute.
+            is_dir (bool): Whether the path is a directory.
+
+        Returns:
+            bool: True if git would ignore the path. Paths outside the root are never ignored.
+        """
+        relative = self.relative(file)
+        if relative is None:
+            return False
+        return self.is_ignored(relative, is_dir)
+
+    def reload(self, directory: Path) -> None:
+        """
+        Forgets the .gitignore of a directory under the root, and every result memoised below
+        it, so they are worked out afresh the next time a path beneath it is checked.
+        """
+        relative = self.relative(directory)
+        if relative is None:
+            return
+        relative = "" if relative == "." else relative
+        _ = self._files.pop(relative, None)
+        prefix = f"{relative}/" if relative else ""
+        self._dirs = {
+            path: ignored
+            for path, ignored in self._dirs.items()
+            if not path.startswith(prefix)
+        }
+
+    def relative(self, file: Path) -> str | None:
+        """
+        Returns the path relative to the root with `/` separators, or None if it is outside the root.
+        """
+        try:
+            relative = file.relative_to(self.root)
+        except ValueError:
+            try:
+                relative = file.absolute().relative_to(self._absolute_root)
+            except ValueError:
+                return None
+        return relative.as_posix()
+
+    def is_ignored(self, path: str, is_dir: bool) -> bool:
+        """
+        Checks a root-relative path. A path inside an ignored directory is always ignored.
+        """
+        if not path or path == ".":
+            return False
+        parent = path.rpartition("/")[0]
+        if parent and self._dir_ignored(parent):
+            return True
+        if is_dir:
+            return self._dir_ignored(path)
+        return self._match(path.split("/"), is_dir)
+
+    def _dir_ignored(self, path: str) -> bool:
+        if path not in self._dirs:
+            parent = path.rpartition("/")[0]
+            self._dirs[path] = (
+                parent != "" and self._dir_ignored(parent)
+            ) or self._match(path.split("/"), True)
+        return self._dirs[path]
+
+    def _match(self, parts: list[str], is_dir: bool) -> bool:
+        # shallower .gitignore files are checked first so deeper ones take precedence.
+        ignored = False
+        for depth in range(len(parts)):
+            rules = self._load("/".join(parts[:depth]))
+            if rules is None:
+                continue
+            result = rules.match("/".join(parts[depth:]), is_dir)
+            if result is not None:
+                ignored = result
+        return ignored
+
+    def _load(self, directory: str) -> IgnoreFile | None:
+        if directory not in self._files:
+            gitignore_file = self.root / directory / ".gitignore"
+            try:
+                with gitignore_file.open("r") as f:
+                    patterns = parse_lines(f.readlines())
+            except (FileNotFoundError, NotADirectoryError):
+                patterns = []
+            except OSError as e:
+                logging.debug(f"could not read {gitignore_file}: {e}")
+                patterns = []
+            self._files[directory] = IgnoreFile(patterns) if patterns else None
+        return self._files[directory]
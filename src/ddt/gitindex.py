@@ -0,0 +1,206 @@
+import logging
+import os
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+
+"""
+Git index reading, following https://git-scm.com/docs/index-format
+"""
+
+# the token cache digest prefix for counts keyed by git blob id rather than content hash.
+DIGEST_PREFIX = "git:"
+
+_HEADER = struct.Struct(">4sII")
+# ctime, mtime, dev, ino, mode, uid, gid and size, all 32-bit.
+_STAT = struct.Struct(">IIIIIIIIII")
+_EXTENDED = 0x4000
+_NAME_MASK = 0x0FFF
+_TYPE_MASK = 0o170000
+_REGULAR = 0o100000
+_SYMLINK = 0o120000
+
+
+@dataclass(frozen=True)
+class IndexEntry:
+    """
+    One tracked file in a git index.
+
+    Properties:
+        path (str): The path relative to the top of the work tree, using `/` separators.
+        blob (str): The hex id of the staged content, or "" while the file has merge conflicts.
+        mode (int): The file mode git recorded.
+        size (int): The file size when it was staged, truncated to 32 bits.
+        mtime_ns (int): The modification time when it was staged, in nanoseconds.
+    """
+
+    path: str
+    blob: str
+    mode: int
+    size: int
+    mtime_ns: int
+
+    @property
+    def is_symlink(self) -> bool:
+        return self.mode & _TYPE_MASK == _SYMLINK
+
+    def matches(self, size: int, mtime_ns: int) -> bool:
+        """
+        Checks whether the file on disk, given its current size and modification time,
+        is still the staged content, the way `git status` does.
+        """
+        return (
+            self.blob != ""
+            and size & 0xFFFFFFFF == self.size
+            and mtime_ns == self.mtime_ns
+        )
+
+    @property
+    def digest(self) -> str:
+        """
+        The token cache digest for the staged content.
+        """
+        return f"{DIGEST_PREFIX}{self.blob}"
+
+
+def find_work_tree(directory: Path) -> tuple[Path, Path] | None:
+    """
+    Finds the work tree holding a directory, and its git directory.
+    Linked worktrees and submodules, whose `.git` is a file pointing elsewhere, are followed.
+
+    Returns:
+        tuple[Path, Path] | None: the top of the work tree and the git directory, or None outside a repository.
+    """
+    for top in (directory, *directory.parents):
+        dot_git = top / ".git"
+        if dot_git.is_dir():
+            return top, dot_git
+        if dot_git.is_file():
+            try:
+                line = dot_git.read_text().strip()
+            except OSError:
+                return None
+            if not line.startswith("gitdir:"):
+                return None
+            git_dir = Path(line.removeprefix("gitdir:").strip())
+            return top, git_dir if git_dir.is_absolute() else top / git_dir
+    return None
+
+
+def read_index(git_dir: Path) -> list[IndexEntry]:
+    """
+    Reads the tracked files from a git directory's index, in index order.
+
+    Index versions 2 to 4 are supported, with SHA-1 or SHA-256 object ids. Submodules and
+    the directory entries of a sparse index are left out, and a file with merge conflicts
+    appears once, with no blob id.
+
+    Raises:
+        OSError: If the index can't be read.
+        ValueError: If the index is malformed or of an unknown version.
+    """
+    data = (git_dir / "index").read_bytes()
+    signature, version, count = _HEADER.unpack_from(data)
+    if signature != b"DIRC" or version not in (2, 3, 4):
+        raise ValueError(f"unsupported git index (version {version})")
+    hash_size = 32 if _object_format(git_dir) == "sha256" else 20
+
+    entries: list[IndexEntry] = []
+    offset = _HEADER.size
+    previous = b""
+    for _ in range(count):
+        start = offset
+        fields = _STAT.unpack_from(data, offset)
+        offset += _STAT.size
+        blob = data[offset : offset + hash_size].hex()
+        offset += hash_size
+        (flags,) = struct.unpack_from(">H", data, offset)
+        offset += 2
+        if version >= 3 and flags & _EXTENDED:
+            offset += 2
+
+        if version == 4:
+            strip, offset = _varint(data, offset)
+            end = data.index(b"\0", offset)
+            name = previous[: len(previous) - strip] + data[offset:end]
+            offset = end + 1
+        else:
+            length = flags & _NAME_MASK
+            end = offset + length if length < _NAME_MASK else data.index(b"\0", offset)
+            name = data[offset:end]
+            # entries are padded with 1 to 8 NULs to a multiple of 8 bytes.
+            offset = start + ((end - start + 8) & ~7)
+        previous = name
+
+        mode = fields[6]
+        if mode & _TYPE_MASK not in (_REGULAR, _SYMLINK):
+            continue
+        path = os.fsdecode(name)
+        if entries and entries[-1].path == path:
+            continue
+        stage = (flags >> 12) & 0x3
+        entries.append(
+            IndexEntry(
+                path,
+                blob if stage == 0 else "",
+                mode,
+                fields[9],
+                fields[2] * 1_000_000_000 + fields[3],
+            )
+        )
+    return entries
+
+
+def tracked_files(root: Path) -> dict[Path, IndexEntry] | None:
+    """
+    Lists the tracked files under a directory, keyed by their path below it.
+
+    Returns:
+        dict[Path, IndexEntry] | None: the files in index order, or None if the directory
+            isn't inside a git work tree or its index can't be read.
+    """
+    found = find_work_tree(root.absolute())
+    if found is None:
+        return None
+    top, git_dir = found
+    try:
+        entries = read_index(git_dir)
+    except (OSError, ValueError, struct.error) as e:
+        logging.debug(f"could not read the git index in {git_dir}: {e}")
+        return None
+
+    prefix = root.absolute().relative_to(top).as_posix()
+    prefix = "" if prefix == "." else f"{prefix}/"
+    return {
+        root / entry.path.removeprefix(prefix): entry
+        for entry in entries
+        if entry.path.startswith(prefix)
+    }
+
+
+def _object_format(git_dir: Path) -> str:
+    config = git_dir / "config"
+    # linked worktrees keep the repository config in the common directory.
+    common = git_dir / "commondir"
+    try:
+        if common.is_file():
+            config = (git_dir / common.read_text().strip()) / "config"
+        for line in config.read_text().splitlines():
+            key, _, value = line.partition("=")
+            if key.strip().lower() == "objectformat":
+                return value.strip().lower()
+    except OSError:
+        pass
+    return "sha1"
+
+
+def _varint(data: bytes, offset: int) -> tuple[int, int]:
+    # git's offset encoding: each continuation byte also adds one.
+    byte = data[offset]
+    offset += 1
+    value = byte & 0x7F
+    while byte & 0x80:
+        byte = data[offset]
+        offset += 1
+        value = ((value + 1) << 7) | (byte & 0x7F)
+    return value, offset
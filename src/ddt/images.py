@@ -0,0 +1,124 @@
+import io
+import logging
+import struct
+from pathlib import Path
+from typing import BinaryIO
+
+"""
+Image dimension probing
+"""
+
+# enough of the file to hold the PNG, GIF and WebP size fields.
+HEADER_BYTES = 32
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_GIF_SIGNATURES = (b"GIF87a", b"GIF89a")
+# start-of-frame markers carry the dimensions; C4, C8 and CC share the range but don't.
+_JPEG_SOF = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# markers with no length field after them.
+_JPEG_STANDALONE = frozenset({0x01, *range(0xD0, 0xD9)})
+
+
+def probe(file: Path) -> tuple[int, int] | None:
+    """
+    Returns the width and height of an image, or None if it can't be read.
+
+    PNG, GIF and WebP sizes come from the first HEADER_BYTES of the file, and JPEG sizes
+    from its first start-of-frame segment, skipping earlier segments without reading them.
+    Any other format is opened with Pillow, which is closed again straight away.
+    """
+    try:
+        with file.open("rb") as f:
+            size = _probe_stream(f)
+    except OSError as e:
+        logging.debug(f"could not read {file.name}: {e}")
+        return None
+    return size if size is not None else _pillow_size(file, file.name)
+
+
+def probe_bytes(data: bytes, name: str) -> tuple[int, int] | None:
+    """
+    Like `probe`, for an image already in memory, e.g. one read from git.
+    """
+    size = _probe_stream(io.BytesIO(data))
+    return size if size is not None else _pillow_size(io.BytesIO(data), name)
+
+
+def _probe_stream(f: BinaryIO) -> tuple[int, int] | None:
+    header = f.read(HEADER_BYTES)
+    size = _header_size(header)
+    if size is None and header.startswith(b"\xff\xd8"):
+        _ = f.seek(2)
+        size = _jpeg_size(f)
+    if size is not None and size[0] > 0 and size[1] > 0:
+        return size
+    return None
+
+
+def _pillow_size(source: Path | BinaryIO, name: str) -> tuple[int, int] | None:
+    # Pillow is only imported for formats the header probes can't read.
+    from PIL import Image
+
+    try:
+        with Image.open(source) as image:
+            return image.size
+    except Exception as e:
+        logging.debug(f"file {name} hit error {e}, ignoring")
+        return None
+
+
+def _header_size(header: bytes) -> tuple[int, int] | None:
+    # a truncated header leaves the size to Pillow, which rejects the file.
+    if (
+        header.startswith(_PNG_SIGNATURE)
+        and header[12:16] == b"IHDR"
+        and len(header) >= 24
+    ):
+        width, height = struct.unpack(">II", header[16:24])
+        return width, height
+    if header[:6] in _GIF_SIGNATURES and len(header) >= 10:
+        width, height = struct.unpack("<HH", header[6:10])
+        return width, height
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP" and len(header) >= 30:
+        chunk = header[12:16]
+        if chunk == b"VP8 " and header[23:26] == b"\x9d\x01\x2a":
+            width, height = struct.unpack("<HH", header[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L" and header[20] == 0x2F:
+            bits = int.from_bytes(header[21:25], "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            width = int.from_bytes(header[24:27], "little") + 1
+            height = int.from_bytes(header[27:30], "little") + 1
+            return width, height
+    return None
+
+
+def _jpeg_size(f: BinaryIO) -> tuple[int, int] | None:
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        code = marker[1]
+        # any number of 0xFF fill bytes may pad a marker.
+        while code == 0xFF:
+            fill = f.read(1)
+            if not fill:
+                return None
+            code = fill[0]
+        if code in _JPEG_STANDALONE:
+            continue
+        # the image data starts, or the file ends, before any frame header.
+        if code in (0xD9, 0xDA):
+            return None
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        (length,) = struct.unpack(">H", length_bytes)
+        if code in _JPEG_SOF:
+            frame = f.read(5)
+            if len(frame) < 5:
+                return None
+            _, height, width = struct.unpack(">BHH", frame)
+            return width, height
+        _ = f.seek(length - 2, 1)
@@ -1,18 +1,52 @@
-import mimetypes
+import codecs
+import io
+import itertools
+import json
 import logging
+import mimetypes
+import os
+import sys
+import time
+from collections import deque
+from collections.abc import Callable, Collection, Iterable, Iterator
+from contextlib import AbstractContextManager, nullcontext
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import Any
+from typing import IO, Any, TextIO
 from typing import override as orr
-from . import tokenizer
+
+from . import (
+    archives,
+    binary,
+    cache,
+    estimate,
+    gitdiff,
+    gitindex,
+    images,
+    parallel,
+    profiling,
+    progress,
+    readahead,
+    sampling,
+    tokenizer,
+    walker,
+)
 from .config import Config
-from PIL import Image
-from jinja2 import Environment, PackageLoader, select_autoescape
-import json
+from .filters import FileFilter
 
 """
 Data models
 """
 
+# flush read-ahead text to the tokenizer once this many characters or files are pending.
+PENDING_TEXT_CHARS = 1_000_000
+PENDING_FILES = 256
+# text files larger than this are read and tokenized a chunk at a time.
+LARGE_FILE_BYTES = 8 * 1024 * 1024
+CHUNK_BYTES = 1024 * 1024
+# number of template fragments Jinja joins into each HTML write.
+HTML_BUFFER_SIZE = 64
+
 
 class TokenCounter:
     """
@@ -20,122 +54,324 @@ class TokenCounter:
 
     Attributes:
         root(Path): The root path of the directory.
-        all_files(list[Path]): All file paths in the directory.
+        all_files(list[Path]): All file paths reached by the walk, filled in as the files are parsed.
         ignored_files(dict[str, list[Path]]): All files ignored by the scan, grouped by extension.
         scanned_files(dict[str, FileCategory]): All files scanned, grouped by extension.
-        excluded_files(set[Path]): All files to be excluded from the search.
-        included_files(set[Path]): All files to be included in the search.
+        filters(FileFilter): The compiled include and exclude rules.
+        streaming(bool): True when results are written to the output as they are counted rather than kept in memory.
         total(int): The total number of tokens present within the directory.
+        margin(float | None): The 95% margin of error on the total, or None when every count is exact.
+        before(int | None): The total at the `config.since` revision, or None outside of delta scans.
+        models(dict[str, int] | None): The total for each of `config.models`, or None when only one is counted.
+        ratios(RatioTable): The bytes-per-token ratios used by estimates and learned from exact scans.
+        watched(dict[Path, tuple[str, dict[str, Any]]]): With `config.watch` set, the extension and record of every counted file, to update in place.
         config(Config): the configuration file for the TokenCounter being run.
+
+    Args:
+        cfg (Config): the configuration for the run.
+        files (list[Path] | None): an explicit list of files to count. When omitted, the root is walked lazily.
     """
 
-    def __init__(self, cfg: Config) -> None:
+    def __init__(self, cfg: Config, files: list[Path] | None = None) -> None:
         mimetypes.init()
         self.config: Config = cfg
-        self.all_files: list[Path] = (
-            [file.resolve() for file in self.config.root.glob("**/*.*")]
-            if self.config.resolve_paths
-            else [file for file in self.config.root.glob("**/*.*")]
-        )
+        self.all_files: list[Path] = files if files is not None else []
+        self._explicit_files: bool = files is not None
         self.ignored_files: dict[str, list[Path]] = {}
         self.scanned_files: dict[str, FileCategory] = {}
-        self.excluded_files: set[Path] = set()
-        self.included_files: set[Path] = set()
+        self.filters: FileFilter = FileFilter(cfg.root)
+        self.streaming: bool = cfg.output_format == "ndjson"
         self.total: int = 0
+        engines, positions = tokenizer.engines_for(cfg.models)
+        # one engine per distinct encoding, the first one for `config.model`.
+        self.engines: list[tokenizer.TokenizerEngine] = engines
+        self.engine: tokenizer.TokenizerEngine = engines[0]
+        self._engine_of: dict[str, int] = positions
+        self.models: dict[str, int] | None = (
+            dict.fromkeys(cfg.models, 0) if len(cfg.models) > 1 else None
+        )
+        # counts from the other engines for files parsed but not yet recorded.
+        self._others: dict[Path, list[int]] = {}
+        # the first file of each size, until a second one turns up and it is hashed.
+        self._first_of_size: dict[int, _PendingText | None] = {}
+        # the first file read with each content digest.
+        self._contents: dict[str, _PendingText] = {}
+        # files whose count was taken from an identical file, with that file and the count.
+        self._copies: dict[Path, tuple[Path, int]] = {}
+        # the reader threads, while `parse_many` reads ahead.
+        self._reader: readahead.ReadAhead | None = None
+        cache_dir = cfg.cache_dir
+        self.cache: cache.TokenCache | None = (
+            cache.TokenCache(cache_dir) if cache_dir is not None else None
+        )
+        self.margin: float | None = None
+        self.before: int | None = None
+        self.ratios: estimate.RatioTable = estimate.RatioTable(
+            cache_dir / estimate.RATIOS_FILE if cache_dir is not None else None,
+            self.engine.encoding_name,
+        )
+        self._tracked: dict[Path, gitindex.IndexEntry] | None = None
+        self.watched: dict[Path, tuple[str, dict[str, Any]]] = {}
+        self.profiler: profiling.Profiler | None = (
+            profiling.Profiler() if cfg.profile else None
+        )
+        # the progress line, while `config.progress` is set and files are being counted.
+        self.progress: progress.Progress | None = None
+
+    def walk(self) -> Iterator[walker.WalkEntry]:
+        """
+        Yields the candidate files lazily, adding each one to `all_files` as it is reached.
+        Dot-directories and gitignored directories are pruned without being opened.
+        When the counter was given an explicit file list, that list is walked instead,
+        and with `config.git` set, the files tracked in the git index are.
+        """
+        if self._explicit_files:
+            for file in list(self.all_files):
+                if not file.is_dir():
+                    yield walker.WalkEntry(file)
+            return
+
+        entries = (
+            self._walk_tracked()
+            if self.config.git
+            else walker.walk(self.config.root, self.skip_dir)
+        )
+        if self.profiler is not None:
+            entries = self.profiler.timed("walk", entries)
+        for entry in entries:
+            if self.config.resolve_paths:
+                entry.path = entry.path.resolve()
+            if not self.streaming:
+                self.all_files.append(entry.path)
+            yield entry
+
+    def _walk_tracked(self) -> Iterator[walker.WalkEntry]:
+        """
+        Yields the tracked files that still exist, in index order, skipping those in
+        directories the filesystem walk would have pruned.
+        """
+        skipped: dict[Path, bool] = {self.config.root: False}
+
+        def is_skipped(directory: Path) -> bool:
+            if directory not in skipped:
+                skipped[directory] = is_skipped(directory.parent) or self.skip_dir(
+                    directory
+                )
+            return skipped[directory]
+
+        for file, tracked in self.tracked_files().items():
+            if is_skipped(file.parent):
+                continue
+            entry = walker.WalkEntry(file, symlink=tracked.is_symlink)
+            if entry.stat() is None:
+                logging.debug(f"{file!s} is tracked but missing, skipping")
+                continue
+            yield entry
+
+    def tracked_files(self) -> dict[Path, gitindex.IndexEntry]:
+        if self._tracked is None:
+            self._tracked = gitindex.tracked_files(self.config.root) or {}
+        return self._tracked
+
+    def _git_digest(self, file: Path, key: cache.CacheKey | None) -> str:
+        """
+        Returns the cache digest of a tracked file's blob, or "" unless the file is unchanged since it was staged.
+        """
+        if not self.config.git or key is None:
+            return ""
+        tracked = self.tracked_files().get(file)
+        if tracked is None or not tracked.matches(key.size, key.mtime_ns):
+            return ""
+        return tracked.digest
+
+    def skip_dir(self, directory: Path) -> bool:
+        if not self.config.include_dotfiles and directory.name.startswith("."):
+            return True
+        if self.filters.prunes(directory):
+            return True
+        return self._gitignored(directory, is_dir=True)
+
+    def _gitignored(self, path: Path, is_dir: bool = False) -> bool:
+        if self.config.gitignore is None:
+            return False
+        # nested .gitignore files are read as the first path below them is checked.
+        with self.stage("gitignore"):
+            return self.config.gitignore.matches(path, is_dir)
+
+    def stage(self, name: str) -> AbstractContextManager[None]:
+        """
+        Attributes the time spent inside the block to a stage of `profiler`, when profiling.
+        """
+        return profiling.stage(self.profiler, name)
 
     def to_dict(self) -> dict[str, Any]:
         """
         Converts TokenCounter to a dictionary type for JSON encoding.
         """
+        return (
+            {
+                "root": str(self.config.root),
+                "all_files": [path.name for path in self.all_files],
+                "ignored_files": {
+                    key: [path.name for path in paths]
+                    for key, paths in self.ignored_files.items()
+                },
+                "scanned_files": {
+                    ext: category.to_dict()
+                    for ext, category in self.scanned_files.items()
+                },
+                "total": self.total,
+            }
+            | _margin_record(self.margin)
+            | _delta_record(self.total, self.before)
+            | _models_record(self.models)
+            | self._duplicates_record()
+        )
+
+    def _duplicates_record(self) -> dict[str, dict[str, Any]]:
+        return {"duplicates": self.duplicate_report()} if self.config.duplicates else {}
+
+    def duplicate_report(self) -> dict[str, Any]:
+        """
+        Summarises the files whose content was identical to an earlier file in the scan.
+
+        Returns:
+            dict[str, Any]: the number of copies, the tokens they account for, and one group per
+                content, listing the first file, its copies, and the tokens in each, largest first.
+        """
+        groups: dict[Path, dict[str, Any]] = {}
+        for copy, (original, tokens) in self._copies.items():
+            group = groups.setdefault(
+                original, {"file": str(original), "copies": [], "tokens": tokens}
+            )
+            group["copies"].append(str(copy))
         return {
-            "root": str(self.config.root),
-            "all_files": [path.name for path in self.all_files],
-            "ignored_files": {
-                key: [path.name for path in paths]
-                for key, paths in self.ignored_files.items()
-            },
-            "scanned_files": {
-                ext: category.to_dict() for ext, category in self.scanned_files.items()
-            },
-            "total": self.total,
+            "files": len(self._copies),
+            "tokens": sum(tokens for _, tokens in self._copies.values()),
+            "groups": sorted(
+                groups.values(),
+                key=lambda group: group["tokens"] * len(group["copies"]),
+                reverse=True,
+            ),
         }
 
     def to_text(self) -> str:
         """
         Converts TokenCounter to an ASCII-style table.
         """
-        result: str = ""
+        return "".join(self.iter_text())
+
+    def iter_text(self) -> Iterator[str]:
+        """
+        Yields the ASCII-style table line by line, so it can be written without building it in memory.
+        """
         if self.config.is_verbose:
-            result += "ignored:\n"
+            yield "ignored:\n"
             for extension, ignored in self.ignored_files.items():
-                result += "=========================\n"
-                result += f"{extension} files ignored:\n"
-                result += "*************************\n"
+                yield "=========================\n"
+                yield f"{extension} files ignored:\n"
+                yield "*************************\n"
                 for file in ignored:
-                    result += f"{str(file)}\n"
-            result += "=========================\n"
-        result += "totals:\n"
+                    yield f"{file!s}\n"
+            yield "=========================\n"
+        yield "totals:\n"
         for extension, file_extension in self.scanned_files.items():
-            result += "-------------------------\n"
-            result += f"{extension} tokens:\n"
-            result += "*************************\n"
+            yield "-------------------------\n"
+            yield f"{extension} tokens:\n"
+            yield "*************************\n"
             for file in file_extension.files:
-                result += f"{file['file']}: {file['tokens']:,} tokens\n"
-            result += ".........................\n"
-            result += (
-                f"{file_extension.extension} total: {file_extension.total:,} tokens\n"
-            )
+                was = f" (was {file['before']:,})" if "before" in file else ""
+                yield f"{file['file']}: {file['tokens']:,} tokens{_models_text(file.get('models'))}{was}\n"
+            yield ".........................\n"
+            yield f"{file_extension.extension} total: {file_extension.total:,} tokens{_models_text(file_extension.models)}{_margin_text(file_extension.margin)}{_sampled_text(file_extension)}{_delta_text(file_extension.total, file_extension.before)}\n"
 
-        result += "-------------------------\n"
-        result += f"grand total: {self.total:,}\n"
-        result += (
-            f"remaining tokens given 128K context window: {128_000 - self.total:,}\n"
-        )
-        return result
+        yield "-------------------------\n"
+        yield f"grand total: {self.total:,}{_models_text(self.models)}{_margin_text(self.margin)}{_delta_text(self.total, self.before)}\n"
+        yield f"remaining tokens given 128K context window: {128_000 - self.total:,}\n"
+        if self.config.duplicates:
+            report = self.duplicate_report()
+            yield "=========================\n"
+            yield "duplicates:\n"
+            yield "*************************\n"
+            for group in report["groups"]:
+                yield f"{group['file']}: {len(group['copies']):,} copies, {group['tokens']:,} tokens each\n"
+            yield ".........................\n"
+            yield f"duplicated tokens: {report['tokens']:,} in {report['files']:,} files\n"
 
     def to_html(self) -> str:
         """
         Converts TokenCounter to an HTML table.
         """
+        return "".join(self.iter_html())
+
+    def iter_html(self) -> Iterator[str]:
+        """
+        Yields the HTML table in chunks as Jinja renders it, so it can be written without building it in memory.
+        """
+        # Jinja is only imported for HTML output, which most runs never ask for.
+        from jinja2 import Environment, PackageLoader, select_autoescape
+
         env = Environment(loader=PackageLoader("ddt"), autoescape=select_autoescape())
         template = env.get_template("template.html")
         values: dict[
-            str, Path | bool | dict[str, list[Path]] | dict[str, FileCategory] | int
+            str,
+            Path
+            | bool
+            | dict[str, list[Path]]
+            | dict[str, FileCategory]
+            | dict[str, int]
+            | dict[str, Any]
+            | int
+            | None,
         ] = {
             "directory": self.config.root,
             "verbose": self.config.is_verbose,
             "ignored_files": self.ignored_files,
             "scanned_files": self.scanned_files,
             "total": self.total,
+            "margin": round(self.margin) if self.margin is not None else None,
+            "before": self.before,
+            "models": self.models,
+            "duplicates": self.duplicate_report() if self.config.duplicates else None,
         }
-        result: str = template.render(values)
-        return result
+        # buffer Jinja's many tiny fragments into fewer, larger writes.
+        stream = template.stream(values)
+        stream.enable_buffering(HTML_BUFFER_SIZE)
+        return stream
 
     def add_exclusions(self, exclusions: list[str]) -> None:
         """
-        Adds filetypes to the excluded files list.
+        Adds filetypes to the excluded extensions.
 
         Args:
             exclusions (list[str]): The file extensions to be excluded.
         """
         if exclusions is None or len(exclusions) < 1:
             return
-        for ext in exclusions:
-            for file in self.config.root.glob(f"**/*.{ext}"):
-                self.excluded_files.add(file.resolve())
+        self.filters.exclude_extensions(exclusions)
 
     def add_inclusions(self, inclusions: list[str]) -> None:
         """
-        Adds files to the included files list.
+        Adds filetypes to the included extensions. All other filetypes are ignored.
 
         Args:
             inclusions (list[str]): The file extensions to be included.
         """
         if inclusions is None or len(inclusions) < 1:
             return
-        for ext in inclusions:
-            for file in self.config.root.glob(f"**/*.{ext}"):
-                self.included_files.add(file.resolve())
+        self.filters.include_extensions(inclusions)
+
+    def add_path_exclusions(self, globs: list[str]) -> None:
+        """
+        Adds gitignore-style path globs, relative to the root, to the excluded paths.
+        Directories the globs cover are pruned from the walk.
+
+        Args:
+            globs (list[str]): The path globs to be excluded, e.g. "vendor/**".
+        """
+        if globs is None or len(globs) < 1:
+            return
+        self.filters.exclude_paths(globs)
 
     def count_text_file(self, file: Path) -> int:
         """
@@ -146,15 +382,267 @@ class TokenCounter:
             file_extension (str): The suffix of the filetype.
 
         Returns:
-            int: the total number of tokens in the file.
+            int: the total number of tokens in the file, or 0 if it is binary or can't be decoded.
+        """
+        pending = self._prepare_text(file, self.grab_suffix(file))
+        return max(next(self._flush_pending([pending]))[2], 0)
+
+    def _prepare_text(
+        self, file: Path, file_extension: str, stat: os.stat_result | None = None
+    ) -> "_PendingText":
+        """
+        Looks the file up in the token cache, and reads it only if the count isn't cached.
+        Files over LARGE_FILE_BYTES are counted straight away, in chunks.
+        `stat` is the file's stat data when the walk already fetched it, so it isn't fetched again.
+
+        Binary files are ignored, with a count of -1: known binary extensions without being
+        opened, anything else once the first `binary.SNIFF_BYTES` give it away.
+
+        In `config.git` mode an unchanged tracked file is cached under its blob id instead of a
+        content hash, so the count is shared with every other checkout of the same content.
         """
+        if binary.is_binary_extension(file_extension):
+            return self._ignore_binary(file)
+
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(file, self.engine.encoding_name, stat)
+            if key is not None:
+                counts = self._cached(key)
+                if counts is not None:
+                    return self._dedupe_cached(
+                        self._cached_text(file, file_extension, counts),
+                        key.size,
+                        lambda: _hash_file(file),
+                    )
+
+        git_digest = self._git_digest(file, key)
+        if self.cache is not None and key is not None and git_digest:
+            counts = self._cached(key, git_digest)
+            if counts is not None:
+                return self._dedupe_cached(
+                    self._cached_text(file, file_extension, counts),
+                    key.size,
+                    lambda: _hash_file(file),
+                )
+
+        if key is not None:
+            size = key.size
+        else:
+            size = stat.st_size if stat is not None else _file_size(file)
+        if size > LARGE_FILE_BYTES:
+            return self._prepare_large_text(file, file_extension, size, key, git_digest)
+
+        data = self._read_unless_binary(file)
+        if data is None:
+            if self.cache is not None and key is not None:
+                self.cache.put(key, -1, git_digest)
+            return self._ignore_binary(file)
+        digest = git_digest
+        if self.cache is not None and not digest:
+            digest = cache.content_digest(data)
+            if key is not None:
+                counts = self._cached(key, digest)
+                if counts is not None:
+                    return self._dedupe_cached(
+                        self._cached_text(file, file_extension, counts),
+                        len(data),
+                        lambda: digest,
+                    )
+
+        try:
+            with self.stage("decode"):
+                text = binary.decode(data)
+        except UnicodeDecodeError:
+            logging.debug(f"file {file.name} hit unicode error, ignoring")
+            self.add_to_ignored(file)
+            return _PendingText(file, file_extension, tokens=-1)
+        pending = _PendingText(file, file_extension, text, key=key, digest=digest)
+        known = digest if digest and not git_digest else ""
+        _ = self._dedupe(
+            pending, len(data), lambda: known or cache.content_digest(data)
+        )
+        return pending
+
+    def _prepare_large_text(
+        self,
+        file: Path,
+        file_extension: str,
+        size: int,
+        key: cache.CacheKey | None,
+        git_digest: str = "",
+    ) -> "_PendingText":
+        with file.open("rb") as f:
+            is_binary = binary.looks_binary(f.read(binary.SNIFF_BYTES))
+        if is_binary:
+            if self.cache is not None and key is not None:
+                self.cache.put(key, -1, git_digest)
+            return self._ignore_binary(file)
+        pending = _PendingText(file, file_extension, key=key, digest=git_digest)
+        if self._dedupe(pending, size, lambda: _hash_file(file)):
+            return pending
         try:
-            text = file.read_text()
+            with self.stage("tokenize"):
+                counts, digest = self._count_large_text(file)
         except UnicodeDecodeError:
             logging.debug(f"file {file.name} hit unicode error, ignoring")
             self.add_to_ignored(file)
-            return 0
-        return tokenizer.calculate_text_tokens(text, self.config.model)
+            pending.tokens = -1
+            return pending
+        if key is not None:
+            self._put(key, counts, git_digest or digest)
+        pending.tokens, pending.others = counts[0], counts[1:]
+        return pending
+
+    def _dedupe(
+        self, pending: "_PendingText", size: int, hash_content: Callable[[], str]
+    ) -> bool:
+        """
+        Links a file to an earlier file of the scan with the same content, so the content is
+        only tokenized once. Files are grouped by size first: a file is only hashed once a
+        second file of its size turns up, so files of a unique size are never hashed.
+
+        Args:
+            pending (_PendingText): The file, read but not yet counted.
+            size (int): Its size in bytes.
+            hash_content (Callable[[], str]): Returns the content digest of the file.
+
+        Returns:
+            bool: True if the file is a copy, which takes its count from `pending.same_as`.
+        """
+        if size == 0:
+            return False
+        if size not in self._first_of_size:
+            self._first_of_size[size] = pending
+            return False
+        first = self._first_of_size[size]
+        if first is not None:
+            self._first_of_size[size] = None
+            with self.stage("read"):
+                first_digest = _hash_file(first.file)
+            if first_digest:
+                _ = self._contents.setdefault(first_digest, first)
+        with self.stage("read"):
+            digest = hash_content()
+        twin = self._contents.setdefault(digest, pending)
+        if twin is pending:
+            return False
+        pending.same_as, pending.text = twin, ""
+        return True
+
+    def _dedupe_cached(
+        self, pending: "_PendingText", size: int, hash_content: Callable[[], str]
+    ) -> "_PendingText":
+        """
+        Links a file whose count came from the cache to the earlier files with the same content.
+        The count needs no reading, so this is only done when `config.duplicates` asks for the
+        copies to be reported.
+        """
+        tokens = pending.tokens
+        if self.config.duplicates and tokens is not None and tokens >= 0:
+            _ = self._dedupe(pending, size, hash_content)
+        return pending
+
+    def _cached(self, key: cache.CacheKey, digest: str = "") -> list[int] | None:
+        """
+        Looks a file up in the token cache for every engine, by stat data or, given a digest,
+        by content. Returns None unless all of the counts are cached, and [-1] for a binary file.
+        """
+        if self.cache is None:
+            return None
+        with self.stage("cache"):
+            counts: list[int] = []
+            for engine in self.engines:
+                engine_key = replace(key, encoding=engine.encoding_name)
+                tokens = (
+                    self.cache.get_by_digest(engine_key, digest)
+                    if digest
+                    else self.cache.get(engine_key)
+                )
+                if tokens is None:
+                    return None
+                if tokens < 0:
+                    return [tokens]
+                counts.append(tokens)
+            return counts
+
+    def _cached_text(
+        self, file: Path, file_extension: str, counts: list[int]
+    ) -> "_PendingText":
+        if counts[0] < 0:
+            return self._ignore_binary(file)
+        return _PendingText(file, file_extension, tokens=counts[0], others=counts[1:])
+
+    def _put(self, key: cache.CacheKey, counts: list[int], digest: str = "") -> None:
+        """
+        Caches a file's count for every engine.
+        """
+        if self.cache is None:
+            return
+        with self.stage("cache"):
+            for engine, tokens in zip(self.engines, counts):
+                self.cache.put(
+                    replace(key, encoding=engine.encoding_name), tokens, digest
+                )
+
+    def _count_large_text(self, file: Path) -> tuple[list[int], str]:
+        """
+        Counts a text file CHUNK_BYTES at a time, so memory use doesn't grow with the file.
+
+        The bytes are decoded the way `Path.read_text` does, newline translation included,
+        and hashed on the way through for the token cache. The digest lookup is skipped for
+        these files, since it would take a second pass over the file.
+
+        Returns:
+            tuple[list[int], str]: the number of tokens for each engine, and the content digest.
+        """
+        with file.open("rb") as f:
+            counts, digest = self._count_stream(f)
+        if self.profiler is not None:
+            self.profiler.read(file, _file_size(file))
+        return counts, digest
+
+    def _count_stream(self, f: IO[bytes], prefix: bytes = b"") -> tuple[list[int], str]:
+        """
+        Counts text read from a stream CHUNK_BYTES at a time, like `_count_large_text`.
+        `prefix` holds bytes already read from the stream, e.g. to sniff for binary content.
+        """
+        hasher = cache.digest_hasher()
+        # the encoding `open` falls back to when none is given.
+        encoding = io.TextIOWrapper(io.BytesIO()).encoding
+        decoder = io.IncrementalNewlineDecoder(
+            codecs.getincrementaldecoder(encoding)(), translate=True
+        )
+
+        def chunks() -> Iterator[str]:
+            data = prefix or f.read(CHUNK_BYTES)
+            while data:
+                hasher.update(data)
+                yield decoder.decode(data)
+                data = f.read(CHUNK_BYTES)
+            yield decoder.decode(b"", final=True)
+
+        counts = tokenizer.count_chunks(self.engines, chunks())
+        return counts, hasher.hexdigest()
+
+    def _read_unless_binary(self, file: Path) -> bytes | None:
+        """
+        Reads a file whole, unless its first bytes show it is binary, in which case returns None.
+        Files already read ahead are taken from the reader threads instead.
+        """
+        with self.stage("read"):
+            if self._reader is not None and file in self._reader:
+                data = self._reader.take(file)
+            else:
+                data = binary.read_unless_binary(file)
+        if self.profiler is not None and data is not None:
+            self.profiler.read(file, len(data))
+        return data
+
+    def _ignore_binary(self, file: Path) -> "_PendingText":
+        logging.debug(f"file {file.name} is binary, ignoring")
+        self.add_to_ignored(file)
+        return _PendingText(file, "", tokens=-1)
 
     def count_image_file(self, file: Path) -> int:
         """
@@ -167,14 +655,30 @@ class TokenCounter:
         Returns:
             int: the total number of tokens in the file.
         """
-        try:
-            img = Image.open(file)
-            width, height = img.size
-            return tokenizer.calculate_image_tokens(width, height)
-        except Exception as e:
-            logging.debug(f"file {file.name} hit error {e}, ignoring")
+        pending = self._prepare_image(file, self.grab_suffix(file))
+        return next(self._flush_pending([pending]))[2]
+
+    def _prepare_image(
+        self, file: Path, file_extension: str, stat: os.stat_result | None = None
+    ) -> "_PendingImage":
+        """
+        Looks the image up in the token cache, and probes its dimensions only if the count isn't cached.
+        """
+        key = (
+            self.cache.key(file, cache.IMAGE_ENCODING, stat)
+            if self.cache is not None
+            else None
+        )
+        if self.cache is not None and key is not None:
+            tokens = self.cache.get(key)
+            if tokens is not None:
+                return _PendingImage(file, file_extension, tokens=tokens)
+        with self.stage("read"):
+            size = images.probe(file)
+        if size is None:
             self.add_to_ignored(file)
-            return 0
+            return _PendingImage(file, file_extension, tokens=0)
+        return _PendingImage(file, file_extension, size, key=key)
 
     def add_to_ignored(self, file: Path):
         """
@@ -182,37 +686,48 @@ class TokenCounter:
         """
         filetype = self.grab_suffix(file)
         logging.debug(f"ignoring {str(file)}")
+        if self.streaming:
+            self.emit({"type": "ignored", "path": str(file), "extension": filetype})
+            return
         if filetype not in self.ignored_files:
             self.ignored_files[filetype] = []
         self.ignored_files[filetype].append(file)
 
-    def filter_file(self, file: Path) -> bool:
-        if len(self.included_files) > 0 and file not in self.included_files:
-            self.add_to_ignored(file)
-            return True
+    def filter_file(self, file: Path, is_symlink: bool | None = None) -> bool:
+        """
+        Checks the given file against the scan filters, adding it to the ignored files if it fails one.
+        `is_symlink` is whether the file is a symlink, when the walk already knows.
 
-        if len(self.excluded_files) > 0 and file in self.excluded_files:
+        Returns:
+            bool: True if the file should not be counted.
+        """
+        if self.is_filtered(file, is_symlink):
             self.add_to_ignored(file)
             return True
+        return False
 
-        if not self.config.include_dotfiles and any(
-            part.startswith(".") for part in file.parts
-        ):
-            self.add_to_ignored(file)
-            return True
+    def is_filtered(self, file: Path, is_symlink: bool | None = None) -> bool:
+        """
+        Checks the given file against the scan filters, like `filter_file`, without listing it as ignored.
+        """
+        with self.stage("filter"):
+            if self.filters.excludes(file):
+                return True
 
-        if not self.config.include_gitignore and file in self.config.gitignore:
-            self.add_to_ignored(file)
-            return True
+            if not self.config.include_dotfiles and any(
+                part.startswith(".") for part in file.parts
+            ):
+                return True
 
-        if (
-            not self.config.include_symlinks
-            and self.config.root.name not in file.resolve().parts
-        ):
-            self.add_to_ignored(file)
-            return True
+            if self._gitignored(file):
+                return True
 
-        return False
+            # the walk never follows symlinked directories, so a file it knows isn't a symlink is inside the root.
+            return (
+                not self.config.include_symlinks
+                and is_symlink is not False
+                and self.config.root.name not in file.resolve().parts
+            )
 
     def parse_file(self, file: Path) -> tuple[str, int]:
         """
@@ -220,6 +735,200 @@ class TokenCounter:
         """
         file_extension = self.grab_suffix(file)
 
+        logging.debug(f"reading {file!s}")
+
+        match self.file_category(file_extension):
+            case "image":
+                if self.config.include_images:
+                    token_counts = self.count_image_file(file)
+                else:
+                    self.add_to_ignored(file)
+                    return "", -1
+            case _:
+                # currently assuming everything is a text file if it's not an image
+                pending = self._prepare_text(file, file_extension)
+                _, file_extension, token_counts = next(self._flush_pending([pending]))
+        return file_extension, token_counts
+
+    def parse_many(
+        self, files: Iterable[Path | walker.WalkEntry]
+    ) -> Iterator[tuple[Path, str, int]]:
+        """
+        Parses files in order, like `parse_file`, but reads text files and image headers ahead
+        and counts them in batches, so small files share a single encoder call.
+
+        Args:
+            files (Iterable[Path | walker.WalkEntry]): The files to parse, already filtered.
+                Walk entries carry the stat data the walk fetched, so each file is stat'd once.
+
+        Yields:
+            tuple[Path, str, int]: the file, its extension, and its token count.
+        """
+        entries: Iterable[walker.WalkEntry] = (
+            file if isinstance(file, walker.WalkEntry) else walker.WalkEntry(file)
+            for file in files
+        )
+        if self.config.read_ahead > 0:
+            entries = self._reading_ahead(entries)
+        yield from self._batched(self._prepare(entry) for entry in entries)
+
+    def _prepare(self, entry: walker.WalkEntry) -> "_PendingText | _PendingImage":
+        file, stat = entry.path, entry.stat()
+        file_extension = self.grab_suffix(file)
+        logging.debug(f"reading {file!s}")
+        if self.file_category(file_extension) == "image":
+            if self.config.include_images:
+                return self._prepare_image(file, file_extension, stat)
+            self.add_to_ignored(file)
+            return _PendingText(file, "", tokens=-1)
+        if self.profiler is not None:
+            with self.profiler.file(file):
+                return self._prepare_text(file, file_extension, stat)
+        return self._prepare_text(file, file_extension, stat)
+
+    def _batched(
+        self, prepared: Iterable["_PendingText | _PendingImage"]
+    ) -> Iterator[tuple[Path, str, int]]:
+        """
+        Counts prepared files in order, flushing them to the tokenizer once PENDING_TEXT_CHARS
+        characters or PENDING_FILES files are waiting.
+        """
+        pending: list[_PendingText | _PendingImage] = []
+        pending_chars = 0
+        for item in prepared:
+            pending.append(item)
+            if isinstance(item, _PendingText):
+                pending_chars += len(item.text)
+            if pending_chars >= PENDING_TEXT_CHARS or len(pending) >= PENDING_FILES:
+                yield from self._flush_pending(pending)
+                pending, pending_chars = [], 0
+        yield from self._flush_pending(pending)
+
+    def _reading_ahead(
+        self, entries: Iterable[walker.WalkEntry]
+    ) -> Iterator[walker.WalkEntry]:
+        """
+        Yields the files in order, while `config.read_ahead` threads read the text files that will
+        need reading ahead of them, within the byte budget of `readahead.ReadAhead`.
+        """
+        reader = readahead.ReadAhead(self.config.read_ahead)
+        self._reader = reader
+        # files pulled from the walk, with their size if they should be read ahead.
+        window: deque[tuple[walker.WalkEntry, int | None]] = deque()
+        submitted = 0
+        source = iter(entries)
+        try:
+            while True:
+                while len(window) < reader.max_files:
+                    entry = next(source, None)
+                    if entry is None:
+                        break
+                    window.append((entry, self._read_ahead_size(entry)))
+                if not window:
+                    return
+                # files are read in the order they will be needed, as the budget allows.
+                for entry, size in itertools.islice(window, submitted, None):
+                    if size is not None and entry.path not in reader:
+                        if not reader.has_room(size):
+                            break
+                        reader.submit(entry.path, size)
+                    submitted += 1
+                entry, _ = window.popleft()
+                submitted = max(submitted - 1, 0)
+                yield entry
+                # nothing more is read from it once the next file is asked for.
+                reader.discard(entry.path)
+        finally:
+            reader.close()
+            self._reader = None
+
+    def _read_ahead_size(self, entry: walker.WalkEntry) -> int | None:
+        """
+        Returns the size of a file `_prepare_text` will read whole, or None for files it won't:
+        images, binary extensions, files whose count is cached, and files over LARGE_FILE_BYTES.
+        """
+        file = entry.path
+        file_extension = self.grab_suffix(file)
+        if self.file_category(file_extension) == "image" or binary.is_binary_extension(
+            file_extension
+        ):
+            return None
+        if self.cache is not None:
+            key = self.cache.key(file, self.engine.encoding_name, entry.stat())
+            if key is None or self._cached(key) is not None:
+                return None
+            size = key.size
+        else:
+            size = entry.size
+        return size if size <= LARGE_FILE_BYTES else None
+
+    def _flush_pending(
+        self, pending: list["_PendingText | _PendingImage"]
+    ) -> Iterator[tuple[Path, str, int]]:
+        texts = [
+            item
+            for item in pending
+            if isinstance(item, _PendingText)
+            and item.tokens is None
+            and item.same_as is None
+        ]
+        start = time.perf_counter()
+        with self.stage("tokenize"):
+            batches = [
+                engine.count_batch([text.text for text in texts])
+                for engine in self.engines
+            ]
+        if self.profiler is not None:
+            self.profiler.share(
+                {text.file: len(text.text) for text in texts},
+                time.perf_counter() - start,
+            )
+        for text, counts in zip(texts, zip(*batches)):
+            text.tokens, *text.others = counts
+            # identical files found later only need the count.
+            text.text = ""
+            if text.key is not None:
+                self._put(text.key, list(counts), text.digest)
+
+        for copy in pending:
+            if not isinstance(copy, _PendingText):
+                continue
+            twin = copy.same_as
+            if twin is None:
+                continue
+            copy.tokens, copy.others = twin.tokens or 0, twin.others
+            self._copies[copy.file] = (twin.file, copy.tokens)
+            if copy.key is not None:
+                self._put(copy.key, [copy.tokens, *copy.others], copy.digest)
+
+        pictures = [
+            item
+            for item in pending
+            if isinstance(item, _PendingImage) and item.tokens is None
+        ]
+        counts = tokenizer.calculate_image_tokens_batch(
+            [picture.size for picture in pictures if picture.size is not None]
+        )
+        for picture, token_counts in zip(pictures, counts):
+            picture.tokens = token_counts
+            if self.cache is not None and picture.key is not None:
+                self.cache.put(picture.key, token_counts)
+
+        for item in pending:
+            token_counts = item.tokens or 0
+            if len(self.engines) > 1 and token_counts >= 0:
+                # image counts don't depend on the model.
+                self._others[item.file] = (
+                    item.others
+                    if isinstance(item, _PendingText)
+                    else [token_counts] * (len(self.engines) - 1)
+                )
+            yield item.file, item.extension, token_counts
+
+    def file_category(self, file_extension: str) -> str:
+        """
+        Returns the top-level MIME category for an extension, e.g. "image" or "text".
+        """
         # TODO: start subdividing by mimetypes and set up your own mimetype list
         # file_type = mimetypes.guess_file_type(file)
         # logging.debug(f"filetype guess: {file_type}")
@@ -228,24 +937,9 @@ class TokenCounter:
             if file_extension in mimetypes.types_map
             else None
         )
-
-        logging.debug(f"reading {str(file)}")
-
-        if mime:
-            category = mime.split("/")[0]
-            match category:
-                case "image":
-                    if self.config.include_images:
-                        token_counts = self.count_image_file(file)
-                    else:
-                        self.add_to_ignored(file)
-                        return "", -1
-                case _:
-                    # currently assuming everything is a text file if it's not an image
-                    token_counts = self.count_text_file(file)
-        else:
-            token_counts = self.count_text_file(file)
-        return file_extension, token_counts
+        if mime and mime.split("/")[0] == "image":
+            return "image"
+        return "text"
 
     def parse_files(self):
         """
@@ -253,28 +947,360 @@ class TokenCounter:
         Anything that didn't result in a token count is skipeped, and the rest are added
         to the list of scanned files.
 
+        When `config.jobs` is anything other than 1 the files are counted by a process pool instead; see `parallel.count_files`.
+        With `config.estimate` set, text files are not read at all; see `estimate.estimate_files`.
+        With `config.sample` or `config.sample_time` set, only some are; see `sampling.sample_files`.
+        With `config.since` set, only the files changed since that revision are; see `gitdiff.count_since`.
+        When the root is an archive, its members are counted instead; see `archives.count_archive`.
         """
-        for file in self.all_files:
-            logging.debug(f"checking {str(file)}")
-            if file.is_dir():
-                continue
+        if self.config.archive:
+            archives.count_archive(self)
+            return
+        if self.config.estimate:
+            estimate.estimate_files(self)
+            return
+        if self.config.sample is not None or self.config.sample_time is not None:
+            sampling.sample_files(self)
+            return
+        if self.config.since is not None:
+            gitdiff.count_since(self, self.config.since)
+            return
+        if self.config.jobs != 1:
+            parallel.count_files(self)
+            return
+
+        # the walk entries of the files being counted, whose sizes are needed once they are.
+        entries: dict[Path, walker.WalkEntry] = {}
+        if self.config.progress:
+            # counting doesn't wait for the walk, so the totals grow until it is over.
+            self.progress = progress.Progress(sys.stderr, 0, 0, walking=True)
+        for file, file_extension, token_counts in self.parse_many(
+            self._unfiltered(entries)
+        ):
+            size = entries.pop(file).size
+            self.record(file, file_extension, token_counts)
+            self.learn(file_extension, token_counts, size)
+            self.advance(size, token_counts)
+        self.finish_progress()
+        if self.cache is not None:
+            self.cache.close()
+        self.ratios.save()
+
+    def parse_members(
+        self, members: Iterable[tuple[Path, int, IO[bytes]]]
+    ) -> Iterator[tuple[Path, str, int]]:
+        """
+        Parses archive members in order, like `parse_many` parses files, counting small members
+        in batches and large ones a chunk at a time as they stream past.
+
+        Args:
+            members (Iterable[tuple[Path, int, IO[bytes]]]): The members to parse, already filtered,
+                named by their path inside the archive, with their size and a stream of their content.
+
+        Yields:
+            tuple[Path, str, int]: the member, its extension, and its token count.
+        """
+        yield from self._batched(
+            self._prepare_member(file, size, stream) for file, size, stream in members
+        )
+
+    def _prepare_member(
+        self, file: Path, size: int, stream: IO[bytes]
+    ) -> "_PendingText | _PendingImage":
+        """
+        Reads an archive member the way `_prepare_text` and `_prepare_image` read a file. Members
+        have no stat data of their own, so their counts are cached by content digest alone.
+        """
+        file_extension = self.grab_suffix(file)
+        logging.debug(f"reading {file!s}")
+        if self.file_category(file_extension) == "image":
+            if not self.config.include_images:
+                self.add_to_ignored(file)
+                return _PendingText(file, "", tokens=-1)
+            dimensions = images.probe_bytes(stream.read(), file.name)
+            if dimensions is None:
+                self.add_to_ignored(file)
+                return _PendingImage(file, file_extension, tokens=0)
+            return _PendingImage(file, file_extension, dimensions)
+        if binary.is_binary_extension(file_extension):
+            return self._ignore_binary(file)
+        prefix = stream.read(binary.SNIFF_BYTES)
+        if binary.looks_binary(prefix):
+            return self._ignore_binary(file)
+
+        if size > LARGE_FILE_BYTES:
+            try:
+                counts, digest = self._count_stream(stream, prefix)
+            except UnicodeDecodeError:
+                logging.debug(f"file {file.name} hit unicode error, ignoring")
+                self.add_to_ignored(file)
+                return _PendingText(file, file_extension, tokens=-1)
+            self._put(_member_key(digest, self.engine, size), counts, digest)
+            return _PendingText(
+                file, file_extension, tokens=counts[0], others=counts[1:]
+            )
+
+        data = prefix + stream.read()
+        digest = cache.content_digest(data)
+        key = _member_key(digest, self.engine, len(data))
+        counts = self._cached(key, digest)
+        if counts is not None:
+            return self._cached_text(file, file_extension, counts)
+        try:
+            text = binary.decode(data)
+        except UnicodeDecodeError:
+            logging.debug(f"file {file.name} hit unicode error, ignoring")
+            self.add_to_ignored(file)
+            return _PendingText(file, file_extension, tokens=-1)
+        pending = _PendingText(file, file_extension, text, key=key, digest=digest)
+        # the digest is at hand anyway, so identical members are linked without grouping by size.
+        twin = self._contents.setdefault(digest, pending)
+        if twin is not pending:
+            pending.same_as, pending.text = twin, ""
+        return pending
 
-            filtered: bool = self.filter_file(file)
+    def forget(self, files: Collection[Path]) -> None:
+        """
+        Drops what the counter remembers about files that changed since they were counted: the
+        git index, the first file of each size, and the copies taken from or made of them.
+        """
+        self._tracked = None
+        # the first file of a size may have changed since it was read, so sizes start over.
+        self._first_of_size = {}
+        self._copies = {
+            copy: (original, tokens)
+            for copy, (original, tokens) in self._copies.items()
+            if copy not in files and original not in files
+        }
+
+    def learn(self, file_extension: str, token_counts: int, size: int) -> None:
+        """
+        Feeds an exactly counted text file of `size` bytes to the bytes-per-token ratios, when they are stored.
+        """
+        if self.ratios.path is None or token_counts <= 0:
+            return
+        if self.file_category(file_extension) != "text":
+            return
+        self.ratios.learn(file_extension, size, token_counts)
+
+    def _unfiltered(
+        self, entries: dict[Path, walker.WalkEntry] | None = None
+    ) -> Iterator[walker.WalkEntry]:
+        """
+        Yields the walked files that pass the filters, recording their entries in `entries` if given.
+
+        While progress is shown the walk runs ahead of counting in a thread of its own, so the totals
+        and the ETA are known early in the scan. Profiling keeps it in step, since stages are timed one
+        at a time.
+        """
+        checked = self._checked()
+        if self.progress is not None and self.profiler is None:
+            checked = walker.ahead(checked)
+        for entry, filtered in checked:
             if filtered:
+                self.add_to_ignored(entry.path)
                 continue
 
-            file_extension, token_counts = self.parse_file(file)
+            if entries is not None:
+                entries[entry.path] = entry
+            yield entry
 
-            if token_counts < 0:
-                continue
+    def _checked(self) -> Iterator[tuple[walker.WalkEntry, bool]]:
+        """
+        Yields each walked file along with whether the filters leave it out, adding those they
+        don't to the progress totals while it is shown.
+        """
+        for entry in self.walk():
+            logging.debug(f"checking {entry.path!s}")
+            filtered = self.is_filtered(entry.path, entry.is_symlink)
+            if not filtered and self.progress is not None:
+                self.progress.discover(entry.size)
+            yield entry, filtered
+        if self.progress is not None:
+            self.progress.walked()
+
+    def advance(self, size: int, token_counts: int) -> None:
+        """
+        Marks a file of `size` bytes as counted on the progress line, while it is shown.
+        """
+        if self.progress is not None:
+            self.progress.advance(size, max(token_counts, 0))
+
+    def finish_progress(self) -> None:
+        """
+        Erases the progress line once counting is over, while it is shown.
+        """
+        if self.progress is not None:
+            self.progress.finish()
+            self.progress = None
+
+    def pop_extras(self, file: Path) -> tuple[list[int], Path | None]:
+        """
+        Returns and forgets what counting a file found out besides its count: the counts from the
+        other engines, and the identical file the count was taken from, if any.
+        """
+        return self._others.pop(file, []), self._copies.pop(file, (None, 0))[0]
+
+    def add_extras(
+        self, file: Path, token_counts: int, others: list[int], original: Path | None
+    ) -> None:
+        """
+        Takes in what counting a file elsewhere found out besides its count, as `pop_extras` returned it.
+        """
+        if others:
+            self._others[file] = others
+        if original is not None:
+            self._copies[file] = (original, token_counts)
+
+    def category(self, file_extension: str) -> "FileCategory":
+        """
+        Returns the scanned files of an extension, adding an empty category for it first if needed.
+        """
+        if file_extension not in self.scanned_files:
+            self.scanned_files[file_extension] = FileCategory(file_extension)
+        return self.scanned_files[file_extension]
+
+    def record(
+        self,
+        file: Path,
+        file_extension: str,
+        token_counts: int,
+        before: int | None = None,
+    ) -> None:
+        """
+        Adds a parsed file to the scanned files. Negative counts mean the file was skipped.
+        `before` is the file's count at the `config.since` revision, in delta scans.
+        """
+        if token_counts < 0:
+            return
 
-            if file_extension not in self.scanned_files:
-                self.scanned_files[file_extension] = FileCategory(file_extension)
-            self.scanned_files[file_extension].files.append(
-                {"file": file.name, "tokens": token_counts}
+        category = self.category(file_extension)
+        models = self._models_for(file, token_counts)
+        was = ({"before": before} if before is not None else {}) | _models_record(
+            models
+        )
+        record = {"file": file.name, "tokens": token_counts} | was
+        if self.config.watch:
+            self.watched[file] = (file_extension, record)
+        if self.streaming:
+            self.emit(
+                {
+                    "type": "file",
+                    "path": str(file),
+                    "extension": file_extension,
+                    "tokens": token_counts,
+                }
+                | was
             )
-            self.scanned_files[file_extension].total += token_counts
-            self.total += token_counts
+        else:
+            category.files.append(record)
+        category.count += 1
+        category.total += token_counts
+        self.total += token_counts
+        self._tally_models(category, models)
+        if before is not None:
+            category.before = (category.before or 0) + before
+            self.before = (self.before or 0) + before
+
+    def _models_for(self, file: Path, token_counts: int) -> dict[str, int] | None:
+        """
+        Returns a parsed file's count for each of `config.models`, or None when only one is counted.
+        """
+        if self.models is None:
+            return None
+        counts = [token_counts, *self._others.pop(file, [])]
+        return {model: counts[position] for model, position in self._engine_of.items()}
+
+    def _tally_models(
+        self, category: "FileCategory", models: dict[str, int] | None, sign: int = 1
+    ) -> None:
+        if models is None:
+            return
+        category.models = _add_models(category.models, models, sign)
+        self.models = _add_models(self.models, models, sign)
+
+    def revise(self, file: Path, file_extension: str, token_counts: int) -> None:
+        """
+        Replaces a file's earlier count, if it had one, with a new one. Negative counts mean
+        the file is no longer counted. When the extension stays the same, the file keeps its
+        place in its category.
+        """
+        known = file in self.watched
+        old_extension = file_extension
+        if known:
+            old_extension, record = self.watched.pop(file)
+            category = self.scanned_files[old_extension]
+            if (
+                old_extension == file_extension
+                and token_counts >= 0
+                and not self.streaming
+            ):
+                category.total += token_counts - record["tokens"]
+                self.total += token_counts - record["tokens"]
+                record["tokens"] = token_counts
+                if "models" in record:
+                    self._tally_models(category, record["models"], -1)
+                    record["models"] = self._models_for(file, token_counts)
+                    self._tally_models(category, record["models"])
+                self.watched[file] = (file_extension, record)
+                return
+            if not self.streaming:
+                category.files = [
+                    entry for entry in category.files if entry is not record
+                ]
+            category.count -= 1
+            category.total -= record["tokens"]
+            self.total -= record["tokens"]
+            self._tally_models(category, record.get("models"), -1)
+            if category.count == 0:
+                del self.scanned_files[old_extension]
+
+        if token_counts < 0:
+            if known and self.streaming:
+                self.emit(
+                    {"type": "removed", "path": str(file), "extension": old_extension}
+                )
+            return
+        self.record(file, file_extension, token_counts)
+
+    def emit(self, record: dict[str, Any]) -> None:
+        """
+        Writes a single NDJSON record to the output and flushes it, so readers see it immediately.
+        """
+        _ = self.config.output.write(json.dumps(record) + "\n")
+        self.config.output.flush()
+
+    def to_ndjson_summary(self) -> Iterator[dict[str, Any]]:
+        """
+        Yields the closing NDJSON records: one per extension, then the grand total.
+        """
+        for extension, category in self.scanned_files.items():
+            yield (
+                {
+                    "type": "extension",
+                    "extension": extension,
+                    "files": category.count,
+                    "tokens": category.total,
+                }
+                | _margin_record(category.margin)
+                | _sampled_record(category.sampled)
+                | _delta_record(category.total, category.before)
+                | _models_record(category.models)
+            )
+        yield (
+            {
+                "type": "total",
+                "files": sum(
+                    category.count for category in self.scanned_files.values()
+                ),
+                "tokens": self.total,
+            }
+            | _margin_record(self.margin)
+            | _delta_record(self.total, self.before)
+            | _models_record(self.models)
+        )
+        if self.config.duplicates:
+            yield {"type": "duplicates"} | self.duplicate_report()
 
     def grab_suffix(self, file: Path) -> str:
         """
@@ -299,14 +1325,115 @@ class TokenCounter:
         """
         if not self.config.output:
             exit(1)
-        with self.config.output as f:
-            match self.config.output_format:
-                case "json":
-                    json.dump(self, f, cls=TokenCounterEncoder, indent=2)
-                case "html":
-                    _ = f.write(self.to_html())
-                case _:
-                    _ = f.write(self.to_text())
+        with self.config.output as f, self.stage("render"):
+            self._write_output(f)
+
+    def profiled(self) -> AbstractContextManager[None]:
+        """
+        Profiles the block as a whole when `config.profile` is set, and does nothing otherwise.
+        """
+        return self.profiler.span() if self.profiler is not None else nullcontext()
+
+    def write_profile(self) -> None:
+        """
+        Writes the profile of the scan as JSON to `config.profile_json`, or as a table to stderr.
+        """
+        if self.profiler is None:
+            return
+        self.profiler.files = sum(
+            category.count for category in self.scanned_files.values()
+        )
+        self.profiler.tokens = self.total
+        if self.config.profile_json is None:
+            self.profiler.write(sys.stderr)
+            return
+        with self.config.profile_json.open("w", encoding="UTF-8") as f:
+            self.profiler.write(f, as_json=True)
+
+    def refresh_output(self) -> None:
+        """
+        Writes the current summary without closing the output, for watch mode. An output file
+        is rewritten in place; a terminal or pipe gets each summary after the last.
+        """
+        f = self.config.output
+        if not self.streaming and f.seekable():
+            _ = f.seek(0)
+            _ = f.truncate()
+        self._write_output(f)
+        f.flush()
+
+    def _write_output(self, f: TextIO) -> None:
+        match self.config.output_format:
+            case "ndjson":
+                for record in self.to_ndjson_summary():
+                    _ = f.write(json.dumps(record) + "\n")
+            case "json":
+                json.dump(self, f, cls=TokenCounterEncoder, indent=2)
+            case "html":
+                f.writelines(self.iter_html())
+            case _:
+                f.writelines(self.iter_text())
+
+
+def _hash_file(file: Path) -> str:
+    """
+    Returns the content digest of a file, read CHUNK_BYTES at a time, or "" if it can't be read.
+    """
+    hasher = cache.digest_hasher()
+    try:
+        with file.open("rb") as f:
+            while data := f.read(CHUNK_BYTES):
+                hasher.update(data)
+    except OSError as e:
+        logging.debug(f"could not read {file.name}: {e}")
+        return ""
+    return hasher.hexdigest()
+
+
+def _member_key(
+    digest: str, engine: tokenizer.TokenizerEngine, size: int
+) -> cache.CacheKey:
+    # archive members have no path or mtime of their own, so they are keyed by their digest.
+    return cache.CacheKey(digest, engine.encoding_name, size, 0)
+
+
+def _file_size(file: Path) -> int:
+    try:
+        return file.stat().st_size
+    except OSError:
+        return 0
+
+
+@dataclass
+class _PendingText:
+    """
+    A text file read ahead of tokenization. `tokens` is already set when the cache had the count,
+    and is -1 for a binary or undecodable file, which is only listed as ignored.
+    """
+
+    file: Path
+    extension: str
+    text: str = ""
+    tokens: int | None = None
+    key: cache.CacheKey | None = None
+    digest: str = ""
+    # counts from the other engines, in order, once `tokens` is set.
+    others: list[int] = field(default_factory=list)
+    # an earlier file of the scan with the same content, whose count this one takes.
+    same_as: "_PendingText | None" = None
+
+
+@dataclass
+class _PendingImage:
+    """
+    An image probed ahead of counting. `tokens` is already set when the cache had the count.
+    """
+
+    file: Path
+    extension: str
+    size: tuple[int, int] | None = None
+    tokens: int | None = None
+    key: cache.CacheKey | None = None
 
 
 class TokenCounterEncoder(json.JSONEncoder):
@@ -331,21 +1458,86 @@ class FileCategory:
 
     Attributes:
     extension: str - The file extension, e.g. .txt
-    files: list[dict[str, str | int]] - The files, with the structure {"file": str, "tokens": int}
+    files: list[dict[str, Any]] - The files, with the structure {"file": str, "tokens": int}, plus
+        "before": int in delta scans and "models": dict[str, int] when several models are counted.
     tital: int - the total number of tokens in this file category.
+    count: int - the number of files in this file category.
+    margin: float | None - the 95% margin of error on the total, or None when it is exact.
+    sampled: int | None - the number of files counted when the total was extrapolated from a sample.
+    before: int | None - the total at the `--since` revision, in delta scans.
+    models: dict[str, int] | None - the total for each model, when several are counted.
 
     """
 
     def __init__(self, extension: str) -> None:
         self.extension: str = extension
-        self.files: list[dict[str, str | int]] = []
+        self.files: list[dict[str, Any]] = []
         self.total: int = 0
+        self.count: int = 0
+        self.margin: float | None = None
+        self.sampled: int | None = None
+        self.before: int | None = None
+        self.models: dict[str, int] | None = None
 
     def to_dict(self):
         """
         Converts TokenCounter to a dictionary type for JSON encoding.
         """
-        return {
-            "total": self.total,
-            "files": self.files,
-        }
+        return (
+            {
+                "total": self.total,
+                "files": self.files,
+            }
+            | _margin_record(self.margin)
+            | _sampled_record(self.sampled)
+            | _delta_record(self.total, self.before)
+            | _models_record(self.models)
+        )
+
+
+def _margin_record(margin: float | None) -> dict[str, int]:
+    return {"margin": round(margin)} if margin is not None else {}
+
+
+def _margin_text(margin: float | None) -> str:
+    return f" (± {round(margin):,})" if margin is not None else ""
+
+
+def _delta_record(total: int, before: int | None) -> dict[str, int]:
+    return {"before": before, "delta": total - before} if before is not None else {}
+
+
+def _delta_text(total: int, before: int | None) -> str:
+    return f" (was {before:,}, {total - before:+,})" if before is not None else ""
+
+
+def _add_models(
+    totals: dict[str, int] | None, models: dict[str, int], sign: int = 1
+) -> dict[str, int]:
+    if totals is None:
+        totals = {model: 0 for model in models}
+    for model, tokens in models.items():
+        totals[model] += sign * tokens
+    return totals
+
+
+def _models_record(models: dict[str, int] | None) -> dict[str, dict[str, int]]:
+    return {"models": models} if models is not None else {}
+
+
+def _models_text(models: dict[str, int] | None) -> str:
+    # the first model's count is the one shown already.
+    if models is None:
+        return ""
+    others = list(models.items())[1:]
+    return " (" + ", ".join(f"{model}: {tokens:,}" for model, tokens in others) + ")"
+
+
+def _sampled_record(sampled: int | None) -> dict[str, int]:
+    return {"sampled": sampled} if sampled is not None else {}
+
+
+def _sampled_text(category: FileCategory) -> str:
+    if category.sampled is None:
+        return ""
+    return f", sampled {category.sampled:,} of {category.count:,} files"
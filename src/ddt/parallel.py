@@ -0,0 +1,193 @@
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from . import progress, tokenizer
+from .config import Config
+
+if TYPE_CHECKING:
+    from .models import TokenCounter
+
+"""
+Process pool counting
+"""
+
+# target number of batches handed to each worker, so the tail of the run stays balanced.
+BATCHES_PER_WORKER = 8
+# upper bound on files per batch, so a run of tiny files still spreads across the pool.
+MAX_BATCH_FILES = 512
+
+_worker_counter: "TokenCounter | None" = None
+# the extension, token count, whether the file was ignored, the other engines' counts, and
+# the identical file the count was taken from.
+type _WorkerResult = tuple[str, int, bool, list[int], Path | None]
+
+
+def count_files(counter: "TokenCounter") -> None:
+    """
+    Filters the files in walk order, fans the survivors out to a process pool largest-first,
+    then replays the walk so `scanned_files` and `ignored_files` come out exactly as the serial path builds them.
+    When streaming, each batch is written out as soon as it finishes instead.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    workers = counter.config.jobs or os.process_cpu_count() or 1
+    plan: list[tuple[Path, bool]] = []
+    sizes: dict[int, int] = {}
+    for entry in counter.walk():
+        logging.debug(f"checking {entry.path!s}")
+        filtered = counter.is_filtered(entry.path, entry.is_symlink)
+        if not filtered:
+            sizes[len(plan)] = entry.size
+        elif counter.streaming:
+            counter.add_to_ignored(entry.path)
+        plan.append((entry.path, filtered))
+
+    results: dict[int, _WorkerResult] = {}
+    if counter.config.progress:
+        counter.progress = progress.Progress(
+            sys.stderr, len(sizes), sum(sizes.values())
+        )
+    if sizes:
+        batches = _schedule_batches(sizes, workers)
+        with (
+            counter.stage("workers"),
+            ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(type(counter), counter.config),
+            ) as executor,
+        ):
+            futures = {
+                executor.submit(
+                    _parse_batch_in_worker, [plan[index][0] for index in batch]
+                ): batch
+                for batch in batches
+            }
+            for future in as_completed(futures):
+                batch, counted = futures[future], future.result()
+                for index, (_, token_counts, *_) in zip(batch, counted):
+                    counter.advance(sizes[index], token_counts)
+                if not counter.streaming:
+                    results.update(zip(batch, counted))
+                    continue
+                for index, result in zip(batch, counted):
+                    file_extension, token_counts, *_ = result
+                    _collect(counter, plan[index][0], result)
+                    counter.record(plan[index][0], file_extension, token_counts)
+                    counter.learn(file_extension, token_counts, sizes[index])
+
+    counter.finish_progress()
+    if not counter.streaming:
+        _replay(counter, plan, results, sizes)
+    cache = counter.cache
+    if cache is not None:
+        cache.close()
+    counter.ratios.save()
+
+
+def _collect(counter: "TokenCounter", file: Path, result: _WorkerResult) -> None:
+    """
+    Takes in what a worker found out about a file besides its count.
+    """
+    _, token_counts, ignored, others, original = result
+    if ignored:
+        counter.add_to_ignored(file)
+    counter.add_extras(file, token_counts, others, original)
+
+
+def _replay(
+    counter: "TokenCounter",
+    plan: list[tuple[Path, bool]],
+    results: dict[int, _WorkerResult],
+    sizes: dict[int, int],
+) -> None:
+    """
+    Records the pool's results in walk order, interleaved with the filtered files.
+    """
+    for index, (file, filtered) in enumerate(plan):
+        if filtered:
+            counter.add_to_ignored(file)
+            continue
+        file_extension, token_counts, *_ = results[index]
+        _collect(counter, file, results[index])
+        counter.record(file, file_extension, token_counts)
+        counter.learn(file_extension, token_counts, sizes[index])
+
+
+def _schedule_batches(sizes: dict[int, int], workers: int) -> list[list[int]]:
+    """
+    Groups files into batches of roughly equal byte size, largest files first.
+    Large files end up alone in their own batch at the front of the queue, so a single
+    huge file starts early instead of becoming the long tail of the run.
+
+    Args:
+        sizes (dict[int, int]): file sizes in bytes, keyed by the file's position in the walk.
+        workers (int): the number of processes in the pool.
+
+    Returns:
+        list[list[int]]: the batches of walk positions, in submission order.
+    """
+    budget = max(sum(sizes.values()) // (workers * BATCHES_PER_WORKER), 1)
+    batches: list[list[int]] = []
+    batch: list[int] = []
+    batch_bytes = 0
+    for index in sorted(sizes, key=lambda index: sizes[index], reverse=True):
+        batch.append(index)
+        batch_bytes += sizes[index]
+        if batch_bytes >= budget or len(batch) >= MAX_BATCH_FILES:
+            batches.append(batch)
+            batch = []
+            batch_bytes = 0
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _init_worker(counter_type: type["TokenCounter"], cfg: Config) -> None:
+    """
+    Builds the per-process counter and loads its encoders once, up front. The parent passes
+    the counter class along, since models imports this module rather than the other way round.
+    """
+    global _worker_counter
+    # workers started by a server process inherit its environment, not the parent's.
+    vocab_dir = cfg.vocab_dir
+    if vocab_dir is not None:
+        tokenizer.use_vocab_dir(vocab_dir)
+    _worker_counter = counter_type(cfg, files=[])
+    # only the parent process writes to the output.
+    _worker_counter.streaming = False
+    # the parent profiles the pool as a whole.
+    _worker_counter.profiler = None
+    for engine in _worker_counter.engines:
+        _ = engine.encoding
+
+
+def _parse_batch_in_worker(files: list[Path]) -> list[_WorkerResult]:
+    """
+    Parses a batch of files inside a worker process.
+
+    Returns:
+        list[_WorkerResult]: the extension, token count, whether parsing ignored the file, the
+            counts from the other engines, and the identical file it took its count from, per file.
+    """
+    counter = _worker_counter
+    if counter is None:
+        raise RuntimeError("worker process was not initialised")
+    counter.ignored_files = {}
+    parsed = list(counter.parse_many(files))
+    cache = counter.cache
+    if cache is not None:
+        cache.flush()
+    ignored = {file for paths in counter.ignored_files.values() for file in paths}
+    return [
+        (
+            file_extension,
+            token_counts,
+            file in ignored,
+            *counter.pop_extras(file),
+        )
+        for file, file_extension, token_counts in parsed
+    ]
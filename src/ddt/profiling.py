@@ -0,0 +1,267 @@
+import cProfile
+import heapq
+import importlib.util
+import json
+import sys
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, TextIO
+
+"""
+Per-stage scan profiling
+"""
+
+# how many of the slowest files the report lists.
+SLOWEST_FILES = 10
+# Windows has no getrusage; peak memory is then left out of the report.
+_HAVE_RESOURCE = importlib.util.find_spec("resource") is not None
+# stages in the order the report lists them; any others follow in the order they were entered.
+STAGES = (
+    "walk",
+    "gitignore",
+    "filter",
+    "cache",
+    "read",
+    "decode",
+    "tokenize",
+    "workers",
+    "render",
+    "other",
+)
+
+
+class Profiler:
+    """
+    Records where a scan spends its time, stage by stage.
+
+    Stages nest: time spent in an inner stage, e.g. reading a .gitignore file while walking,
+    counts towards the inner stage only, so the stages add up to the profiled wall time.
+    Time inside the profiled span but outside every stage counts as "other".
+
+    Per-file times cover preparing the file (cache lookups, reading, decoding, and counting
+    files too large to batch) plus its share of the batch it was tokenized in, split by characters.
+
+    Args:
+        slowest (int): How many of the slowest files to report.
+    """
+
+    def __init__(self, slowest: int = SLOWEST_FILES) -> None:
+        self.slowest: int = slowest
+        self.bytes_read: int = 0
+        self.files: int = 0
+        self.tokens: int = 0
+        # wall and CPU seconds spent in each stage, not counting the stages inside it.
+        self._times: dict[str, list[float]] = {}
+        # the stages currently entered, innermost last, with when each was last resumed.
+        self._stack: list[tuple[str, float, float]] = []
+        # seconds and bytes read for each file.
+        self._files: dict[Path, list[float]] = {}
+        self._wall: float = 0.0
+        self._cpu: float = 0.0
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Attributes the time spent inside the block to a stage, pausing the enclosing stage.
+        """
+        self._pause()
+        self._stack.append((name, time.perf_counter(), time.process_time()))
+        try:
+            yield
+        finally:
+            self._pause()
+            _ = self._stack.pop()
+            self._resume()
+
+    @contextmanager
+    def span(self) -> Iterator[None]:
+        """
+        Profiles the block as a whole: its wall and CPU time are the report's totals.
+        """
+        wall, cpu = time.perf_counter(), time.process_time()
+        with self.stage("other"):
+            yield
+        self._wall += time.perf_counter() - wall
+        self._cpu += time.process_time() - cpu
+
+    def timed[T](self, name: str, items: Iterable[T]) -> Iterator[T]:
+        """
+        Yields the items, attributing the time spent producing each one to a stage.
+        """
+        iterator = iter(items)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    @contextmanager
+    def file(self, file: Path) -> Iterator[None]:
+        """
+        Adds the wall time spent inside the block to a file's time.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._file(file)[0] += time.perf_counter() - start
+
+    def share(self, weights: dict[Path, int], seconds: float) -> None:
+        """
+        Splits the time of a batch between its files, in proportion to their weights.
+        """
+        total = sum(weights.values())
+        if total <= 0:
+            return
+        for file, weight in weights.items():
+            self._file(file)[0] += seconds * weight / total
+
+    def read(self, file: Path, size: int) -> None:
+        """
+        Records the bytes read from a file.
+        """
+        self.bytes_read += size
+        self._file(file)[1] += size
+
+    def report(self) -> dict[str, Any]:
+        """
+        Returns the profile as a JSON-ready dictionary.
+        """
+        order = [name for name in STAGES if name in self._times]
+        order += [name for name in self._times if name not in STAGES]
+        tokenize = sum(
+            self._times.get(name, [0.0])[0] for name in ("tokenize", "workers")
+        )
+        slowest = heapq.nlargest(
+            self.slowest, self._files.items(), key=lambda item: item[1][0]
+        )
+        return {
+            "wall_seconds": self._wall,
+            "cpu_seconds": self._cpu,
+            "stages": {
+                name: {
+                    "wall_seconds": self._times[name][0],
+                    "cpu_seconds": self._times[name][1],
+                }
+                for name in order
+            },
+            "files": self.files,
+            "tokens": self.tokens,
+            "bytes_read": self.bytes_read,
+            "files_per_second": _rate(self.files, self._wall),
+            "tokens_per_second": _rate(self.tokens, tokenize),
+            "peak_rss_bytes": _peak_rss(),
+            "peak_worker_rss_bytes": _peak_rss(children=True),
+            "slowest_files": [
+                {"path": str(file), "seconds": seconds, "bytes": int(size)}
+                for file, (seconds, size) in slowest
+            ],
+        }
+
+    def write(self, f: TextIO, as_json: bool = False) -> None:
+        """
+        Writes the report, as JSON or as a table for a terminal.
+        """
+        report = self.report()
+        if as_json:
+            json.dump(report, f, indent=2)
+            _ = f.write("\n")
+            return
+        _ = f.write("profile:\n")
+        _ = f.write(f"{'stage':<12}{'wall':>10}{'cpu':>10}\n")
+        for name, times in report["stages"].items():
+            _ = f.write(
+                f"{name:<12}{times['wall_seconds']:>9.3f}s{times['cpu_seconds']:>9.3f}s\n"
+            )
+        _ = f.write(
+            f"{'total':<12}{report['wall_seconds']:>9.3f}s{report['cpu_seconds']:>9.3f}s\n"
+        )
+        _ = f.write(
+            f"{report['files']:,} files, {_size_text(report['bytes_read'])} read, "
+            f"{report['files_per_second']:,.0f} files/s, {report['tokens_per_second']:,.0f} tokens/s\n"
+        )
+        if report["peak_rss_bytes"] is not None:
+            workers = report["peak_worker_rss_bytes"]
+            _ = f.write(
+                f"peak RSS {_size_text(report['peak_rss_bytes'])}"
+                + (f", largest worker {_size_text(workers)}" if workers else "")
+                + "\n"
+            )
+        if report["slowest_files"]:
+            _ = f.write("slowest files:\n")
+        for entry in report["slowest_files"]:
+            _ = f.write(
+                f"  {entry['path']} ({_size_text(entry['bytes'])}): {entry['seconds']:.3f}s\n"
+            )
+
+    def _pause(self) -> None:
+        if not self._stack:
+            return
+        name, wall, cpu = self._stack[-1]
+        times = self._times.setdefault(name, [0.0, 0.0])
+        times[0] += time.perf_counter() - wall
+        times[1] += time.process_time() - cpu
+
+    def _resume(self) -> None:
+        if self._stack:
+            name, _, _ = self._stack[-1]
+            self._stack[-1] = (name, time.perf_counter(), time.process_time())
+
+    def _file(self, file: Path) -> list[float]:
+        if file not in self._files:
+            self._files[file] = [0.0, 0]
+        return self._files[file]
+
+
+def stage(profiler: Profiler | None, name: str):
+    """
+    Returns `profiler.stage(name)`, or a context that does nothing when there is no profiler.
+    """
+    return profiler.stage(name) if profiler is not None else nullcontext()
+
+
+@contextmanager
+def cprofile(path: Path | None) -> Iterator[None]:
+    """
+    Runs the block under cProfile and dumps the statistics to `path` in pstats format.
+    Does nothing when `path` is None.
+    """
+    if path is None:
+        yield
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
+
+
+def _rate(count: int, seconds: float) -> float:
+    return count / seconds if seconds > 0 else 0.0
+
+
+def _peak_rss(children: bool = False) -> int | None:
+    if not _HAVE_RESOURCE:
+        return None
+    import resource
+
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports kibibytes, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _size_text(size: float) -> str:
+    if size < 1024:
+        return f"{size:,.0f}B"
+    for unit in ("KiB", "MiB"):
+        size /= 1024
+        if size < 1024:
+            return f"{size:,.1f}{unit}"
+    return f"{size / 1024:,.1f}GiB"
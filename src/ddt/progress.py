@@ -0,0 +1,142 @@
+import time
+from typing import TextIO
+
+"""
+Live progress on a terminal
+"""
+
+# how often the progress line is redrawn, in seconds.
+UPDATE_SECONDS = 0.25
+# how much each redraw's rates move the smoothed rates, between 0 and 1.
+SMOOTHING = 0.3
+
+_CLEAR_LINE = "\r\x1b[K"
+
+
+class Progress:
+    """
+    A single status line of files and bytes done out of the total, current throughput and an
+    estimated time left, redrawn in place at most every `interval` seconds however fast files
+    are counted. Meant for a terminal: the line is redrawn with a carriage return.
+
+    Throughput is smoothed across redraws, and the ETA is the bytes left at the current
+    byte rate, since a scan's cost follows its bytes far more than its file count.
+
+    When counting starts before the walk is over, the totals grow as the walk finds files
+    (see `discover`) and are shown as lower bounds, without an ETA, until `walked` is called.
+
+    Args:
+        stream (TextIO): The terminal to draw on, usually stderr.
+        files (int): The number of files to count.
+        size (int): Their total size in bytes.
+        interval (float | None): The least number of seconds between redraws - None uses UPDATE_SECONDS.
+        walking (bool): Flag - True while the walk is still finding files to add to the totals.
+    """
+
+    def __init__(
+        self,
+        stream: TextIO,
+        files: int,
+        size: int,
+        interval: float | None = None,
+        walking: bool = False,
+    ) -> None:
+        self.stream: TextIO = stream
+        self.files: int = files
+        self.size: int = size
+        self.interval: float = interval if interval is not None else UPDATE_SECONDS
+        self.walking: bool = walking
+        self.files_done: int = 0
+        self.bytes_done: int = 0
+        self.tokens_done: int = 0
+        self.bytes_per_second: float | None = None
+        self.tokens_per_second: float | None = None
+        self._last: float = time.monotonic()
+        self._last_bytes: int = 0
+        self._last_tokens: int = 0
+        self._redraws: int = 0
+
+    def discover(self, size: int) -> None:
+        """
+        Adds a file of `size` bytes the walk just found to the totals.
+        """
+        self.files += 1
+        self.size += size
+
+    def walked(self) -> None:
+        """
+        Marks the totals as final, once the walk is over.
+        """
+        self.walking = False
+
+    def advance(self, size: int, tokens: int) -> None:
+        """
+        Marks a file of `size` bytes as counted, redrawing the line if it is due.
+        """
+        self.files_done += 1
+        self.bytes_done += size
+        self.tokens_done += tokens
+        now = time.monotonic()
+        if now - self._last >= self.interval:
+            self._update(now)
+            _ = self.stream.write(_CLEAR_LINE + self.line())
+            self.stream.flush()
+
+    def finish(self) -> None:
+        """
+        Erases the line, so whatever is written next starts on a clean one.
+        """
+        _ = self.stream.write(_CLEAR_LINE)
+        self.stream.flush()
+
+    def line(self) -> str:
+        """
+        Returns the status line, e.g. `1,204/5,000 files, 12.1/48.0 MB, 3.2 MB/s, 812,040 tokens/s, ETA 11s`,
+        or `1,204/3,120+ files, 12.1/30.2+ MB, 3.2 MB/s, 812,040 tokens/s, still walking` before the walk is over.
+        """
+        more = "+" if self.walking else ""
+        parts = [
+            f"{self.files_done:,}/{self.files:,}{more} files",
+            f"{self.bytes_done / 1e6:,.1f}/{self.size / 1e6:,.1f}{more} MB",
+        ]
+        if self.bytes_per_second is not None and self.tokens_per_second is not None:
+            parts.append(f"{self.bytes_per_second / 1e6:,.1f} MB/s")
+            parts.append(f"{self.tokens_per_second:,.0f} tokens/s")
+            if self.walking:
+                parts.append("still walking")
+            elif self.bytes_per_second > 0:
+                left = max(self.size - self.bytes_done, 0) / self.bytes_per_second
+                parts.append(f"ETA {_duration(left)}")
+        return ", ".join(parts)
+
+    def _update(self, now: float) -> None:
+        elapsed = now - self._last
+        # the first stretch includes loading the encodings, so it says little about the rates.
+        if self._redraws > 0:
+            bytes_rate = (self.bytes_done - self._last_bytes) / elapsed
+            tokens_rate = (self.tokens_done - self._last_tokens) / elapsed
+            self.bytes_per_second = _smooth(self.bytes_per_second, bytes_rate)
+            self.tokens_per_second = _smooth(self.tokens_per_second, tokens_rate)
+        self._redraws += 1
+        self._last, self._last_bytes, self._last_tokens = (
+            now,
+            self.bytes_done,
+            self.tokens_done,
+        )
+
+
+def _smooth(average: float | None, rate: float) -> float:
+    if average is None:
+        return rate
+    return average + SMOOTHING * (rate - average)
+
+
+def _duration(seconds: float) -> str:
+    seconds = round(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m{seconds:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m"
@@ -0,0 +1,86 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+from . import binary
+
+"""
+Read-ahead file reading
+"""
+
+# the most file contents held in memory ahead of the tokenizer, in bytes.
+READ_AHEAD_BYTES = 64 * 1024 * 1024
+# the most files read ahead of the tokenizer for each reader thread.
+FILES_PER_THREAD = 16
+
+
+class ReadAhead:
+    """
+    Reads files on a pool of threads ahead of when they are needed, so waiting on slow
+    storage such as NFS or FUSE mounts overlaps with tokenizing instead of stalling it.
+
+    Files are submitted in the order they will be taken. No more than `max_bytes` of file
+    contents, and `threads * FILES_PER_THREAD` files, are being read or waiting to be
+    taken at once. A single file larger than the budget may still go ahead on its own.
+
+    Args:
+        threads (int): The number of reader threads.
+        max_bytes (int): The byte budget for files read ahead.
+    """
+
+    def __init__(self, threads: int, max_bytes: int = READ_AHEAD_BYTES) -> None:
+        self.max_bytes: int = max_bytes
+        self.max_files: int = threads * FILES_PER_THREAD
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            threads, thread_name_prefix="ddt-read"
+        )
+        self._pending: dict[Path, tuple[Future[bytes | None], int]] = {}
+        self._bytes: int = 0
+
+    def __contains__(self, file: Path) -> bool:
+        return file in self._pending
+
+    def has_room(self, size: int) -> bool:
+        """
+        Checks whether a file of `size` bytes fits within the budget right now.
+        """
+        if not self._pending:
+            return True
+        return (
+            len(self._pending) < self.max_files and self._bytes + size <= self.max_bytes
+        )
+
+    def submit(self, file: Path, size: int) -> None:
+        """
+        Starts reading a file. `size` is what it counts against the budget until it is taken.
+        """
+        future = self._executor.submit(binary.read_unless_binary, file)
+        self._pending[file] = (future, size)
+        self._bytes += size
+
+    def take(self, file: Path) -> bytes | None:
+        """
+        Waits for a submitted file and hands over its contents, freeing its share of the budget.
+
+        Returns:
+            bytes | None: the contents, or None if the file turned out to be binary.
+
+        Raises:
+            OSError: If the file couldn't be read.
+        """
+        future, size = self._pending.pop(file)
+        self._bytes -= size
+        return future.result()
+
+    def discard(self, file: Path) -> None:
+        """
+        Drops a file that was read ahead but is no longer needed, e.g. because its count was cached.
+        """
+        if file in self._pending:
+            future, size = self._pending.pop(file)
+            _ = future.cancel()
+            self._bytes -= size
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._pending = {}
+        self._bytes = 0
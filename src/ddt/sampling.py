@@ -0,0 +1,246 @@
+import bisect
+import logging
+import math
+import random
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from . import binary, estimate
+
+if TYPE_CHECKING:
+    from .models import TokenCounter
+
+"""
+Sampled scans
+"""
+
+# every stratum gets at least this many draws, so its variance can be estimated.
+MIN_DRAWS = 2
+# fixed so repeated sampled scans of the same tree give the same answer.
+SEED = 0
+
+
+class Stratum:
+    """
+    The text files of one extension, sampled with replacement with probability proportional to size.
+
+    Each draw yields the file's tokens per byte, and the Hansen-Hurwitz estimator scales
+    their mean by the stratum's total size. Once every non-empty file has been drawn, the
+    total is known exactly.
+
+    Args:
+        extension (str): The extension the files share.
+
+    Attributes:
+        files (list[Path]): The files, in walk order.
+        sizes (list[int]): Their sizes in bytes.
+        bytes (int): The combined size of the files.
+        counts (dict[int, int]): Token counts of the files drawn so far, keyed by position.
+        rates (list[float]): Tokens per byte of every draw, repeats included.
+        discarded (int): The drawn files that turned out not to be text, left out of the stratum.
+    """
+
+    def __init__(self, extension: str) -> None:
+        self.extension: str = extension
+        self.files: list[Path] = []
+        self.sizes: list[int] = []
+        self.bytes: int = 0
+        self.counts: dict[int, int] = {}
+        self.rates: list[float] = []
+        self.discarded: int = 0
+        self._nonempty: int = 0
+        self._cumulative: list[int] = []
+
+    def add(self, file: Path, size: int) -> None:
+        self.files.append(file)
+        self.sizes.append(size)
+        self.bytes += size
+        if size > 0:
+            self._nonempty += 1
+
+    @property
+    def complete(self) -> bool:
+        """
+        Whether every non-empty file has been counted, making the total exact.
+        """
+        return len(self.counts) >= self._nonempty
+
+    def draws_for(self, fraction: float) -> int:
+        """
+        Returns the number of draws that samples `fraction` of the files, but at least MIN_DRAWS.
+        """
+        return max(MIN_DRAWS, math.ceil(fraction * len(self.files)))
+
+    def draw(self, rng: random.Random) -> int:
+        """
+        Picks a file position with probability proportional to its size, or uniformly when
+        every file is empty.
+        """
+        if self.bytes <= 0:
+            return rng.randrange(len(self.files))
+        if len(self._cumulative) != len(self.sizes):
+            self._cumulative = []
+            running = 0
+            for size in self.sizes:
+                running += size
+                self._cumulative.append(running)
+        return bisect.bisect_right(self._cumulative, rng.random() * self.bytes)
+
+    def discard(self, index: int) -> None:
+        """
+        Leaves a drawn file out of the stratum, e.g. because it turned out to be binary:
+        it is never drawn again and its bytes no longer count towards the total.
+        """
+        if self.sizes[index] > 0:
+            self._nonempty -= 1
+        self.bytes -= self.sizes[index]
+        self.sizes[index] = 0
+        self.discarded += 1
+        self._cumulative = []
+
+    def observe(self, index: int, tokens: int) -> None:
+        """
+        Records the token count of a drawn file.
+        """
+        self.counts[index] = tokens
+        if self.sizes[index] > 0:
+            self.rates.append(tokens / self.sizes[index])
+
+    def total(self) -> float:
+        """
+        Returns the estimated token total of the stratum.
+        """
+        if self.complete:
+            return sum(self.counts.values())
+        return self.bytes * sum(self.rates) / len(self.rates)
+
+    def variance(self) -> float:
+        """
+        Returns the variance of `total`, which is 0 once the stratum is complete.
+        """
+        if self.complete or len(self.rates) < 2:
+            return 0.0
+        n = len(self.rates)
+        mean = sum(self.rates) / n
+        spread = sum((rate - mean) ** 2 for rate in self.rates) / (n - 1)
+        return self.bytes * self.bytes * spread / n
+
+
+def sample_files(counter: "TokenCounter") -> None:
+    """
+    Walks every file's metadata, but tokenizes only a sample of the text files of each
+    extension, drawn with probability proportional to size, and extrapolates the totals.
+
+    `config.sample` draws that fraction of each extension's files. `config.sample_time`
+    instead keeps drawing until that many seconds have passed since the scan started,
+    spreading draws across extensions in proportion to their size. Extensions whose every
+    file gets counted are exact; the rest get a 95% margin.
+    """
+    sample_time = counter.config.sample_time
+    deadline = time.monotonic() + sample_time if sample_time is not None else None
+    strata: dict[str, Stratum] = {}
+    for entry in counter.walk():
+        if counter.filter_file(entry.path, entry.is_symlink):
+            continue
+        file_extension = counter.grab_suffix(entry.path)
+        if counter.file_category(file_extension) != "text":
+            file_extension, token_counts = counter.parse_file(entry.path)
+            counter.record(entry.path, file_extension, token_counts)
+            continue
+        if binary.is_binary_extension(file_extension):
+            counter.add_to_ignored(entry.path)
+            continue
+        if file_extension not in strata:
+            strata[file_extension] = Stratum(file_extension)
+        strata[file_extension].add(entry.path, entry.size)
+
+    rng = random.Random(SEED)
+    for stratum in strata.values():
+        draws = (
+            stratum.draws_for(counter.config.sample)
+            if counter.config.sample is not None
+            else MIN_DRAWS
+        )
+        if draws >= len(stratum.files):
+            for index in range(len(stratum.files)):
+                _ = _sample_file(counter, stratum, index)
+            continue
+        # files that turn out not to be text don't use up a draw, and once every file is
+        # counted, or there are no bytes left to draw from, the total is exact.
+        drawn = 0
+        while drawn < draws and not stratum.complete:
+            if _sample_file(counter, stratum, stratum.draw(rng)):
+                drawn += 1
+
+    if deadline is not None:
+        while time.monotonic() < deadline:
+            open_strata = [s for s in strata.values() if not s.complete]
+            if not open_strata:
+                break
+            stratum = min(open_strata, key=lambda s: len(s.rates) / s.bytes)
+            _ = _sample_file(counter, stratum, stratum.draw(rng))
+
+    cache = counter.cache
+    if cache is not None:
+        cache.close()
+    counter.ratios.save()
+
+    margins = [_record_stratum(counter, stratum) for stratum in strata.values()]
+    if any(category.sampled is not None for category in counter.scanned_files.values()):
+        # extensions are sampled independently, so their margins add in quadrature.
+        counter.margin = math.sqrt(sum(margin * margin for margin in margins))
+
+
+def _sample_file(counter: "TokenCounter", stratum: Stratum, index: int) -> bool:
+    """
+    Counts a drawn file, or repeats its count if it was drawn before.
+
+    Returns:
+        bool: False when the file turned out to be binary or undecodable, which leaves it
+            out of the stratum and lists it as ignored only.
+    """
+    if index in stratum.counts:
+        stratum.observe(index, stratum.counts[index])
+        return True
+    file = stratum.files[index]
+    logging.debug(f"sampling {file!s}")
+    _, token_counts = counter.parse_file(file)
+    if token_counts < 0:
+        stratum.discard(index)
+        return False
+    counter.learn(stratum.extension, token_counts, stratum.sizes[index])
+    stratum.observe(index, token_counts)
+    return True
+
+
+def _record_stratum(counter: "TokenCounter", stratum: Stratum) -> float:
+    """
+    Adds a sampled extension to the scanned files, listing only the files that were counted.
+
+    Returns:
+        float: the 95% margin of the extension's total, 0 when it is exact.
+    """
+    category = counter.category(stratum.extension)
+    for index in sorted(stratum.counts):
+        file, token_counts = stratum.files[index], stratum.counts[index]
+        if counter.streaming:
+            counter.emit(
+                {
+                    "type": "file",
+                    "path": str(file),
+                    "extension": stratum.extension,
+                    "tokens": token_counts,
+                }
+            )
+        else:
+            category.files.append({"file": file.name, "tokens": token_counts})
+    category.count = len(stratum.files) - stratum.discarded
+    category.total = round(stratum.total())
+    counter.total += category.total
+    if stratum.complete:
+        return 0.0
+    category.sampled = len(stratum.counts)
+    margin = estimate.margin(stratum.variance(), len(stratum.rates))
+    category.margin = margin
+    return margin
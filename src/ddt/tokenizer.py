@@ -1,19 +1,307 @@
-from tiktoken import model, encoding_for_model
+import os
+from collections.abc import Iterable
+from functools import cache
 from math import ceil
-from typing import NewType
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, NewType
+
+if TYPE_CHECKING:
+    from tiktoken import Encoding
 
 """
 type aliasing for convenince
 """
 
+# tiktoken is imported on first use rather than here: loading it and its regex engine is
+# the largest part of the CLI's startup, and `--help` or a bad flag never needs it.
+
 
 def get_models():
+    from tiktoken import model
+
     return [key for key in model.MODEL_TO_ENCODING.keys()]
 
 
 Model = NewType("Model", str)
 GPT_4O = Model("gpt-4o")
-MODEL_CHOICES: set[Model] = set(Model(model) for model in get_models())
+
+
+@cache
+def model_choices() -> set[Model]:
+    """
+    Returns the models tiktoken knows an encoding for, looked up the first time it is asked for.
+    """
+    return set(Model(model) for model in get_models())
+
+
+def __getattr__(name: str) -> Any:
+    # MODEL_CHOICES is kept as a module attribute, resolved lazily like everything from tiktoken.
+    if name == "MODEL_CHOICES":
+        return model_choices()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+"""
+Encoder registry
+"""
+
+# tiktoken looks for its BPE files in this directory before downloading them.
+VOCAB_DIR_ENV = "TIKTOKEN_CACHE_DIR"
+
+# loaded encodings by encoding name, so models sharing one parse its BPE files once per process.
+_ENCODINGS: "dict[str, Encoding]" = {}
+
+
+class VocabularyError(RuntimeError):
+    """
+    Raised when an encoding's BPE files are neither in the vocabulary directory nor downloadable.
+    """
+
+
+def use_vocab_dir(vocab_dir: Path) -> None:
+    """
+    Makes encodings load from `vocab_dir`, downloading only the files missing from it, into it.
+    Set through the environment, so worker processes started afterwards share it.
+    """
+    os.environ[VOCAB_DIR_ENV] = str(vocab_dir)
+
+
+def encoding_name(model_name: str) -> str:
+    """
+    Returns the name of a model's encoding, without loading it.
+    """
+    from tiktoken.model import encoding_name_for_model
+
+    return encoding_name_for_model(model_name)
+
+
+def load_encoding(name: str) -> "Encoding":
+    """
+    Returns an encoding by name, loading it only the first time it is asked for.
+
+    tiktoken checks the files it loads against their published SHA-256 hashes, and downloads
+    them again if a cached copy doesn't match.
+
+    Raises:
+        VocabularyError: If the encoding's files aren't in the vocabulary directory and can't
+            be downloaded, e.g. without network access.
+    """
+    if name not in _ENCODINGS:
+        import tiktoken
+
+        try:
+            _ENCODINGS[name] = tiktoken.get_encoding(name)
+        except (OSError, ValueError) as e:
+            vocab_dir = os.environ.get(VOCAB_DIR_ENV)
+            where = vocab_dir or "tiktoken's default cache"
+            command = (
+                f"ddt cache warm --vocab-dir {vocab_dir}"
+                if vocab_dir
+                else "ddt cache warm"
+            )
+            raise VocabularyError(
+                f"could not load the {name} encoding from {where}: {e}. "
+                + f"run `{command}` where the network is reachable to download it"
+            ) from e
+    return _ENCODINGS[name]
+
+
+def get_encoding(model_name: str) -> "Encoding":
+    """
+    Returns the encoding for the given model, resolving it only the first time it is asked for.
+    """
+    return load_encoding(encoding_name(model_name))
+
+
+def warm(models: Iterable[str]) -> list[str]:
+    """
+    Loads the encodings of the given models, so their BPE files are in the vocabulary
+    directory for scans that can't reach the network.
+
+    Returns:
+        list[str]: the distinct encoding names loaded, in the order first seen.
+
+    Raises:
+        VocabularyError: If an encoding's files can't be downloaded.
+    """
+    names = list(dict.fromkeys(encoding_name(model) for model in models))
+    for name in names:
+        _ = load_encoding(name)
+    return names
+
+
+# texts at or below this many characters are grouped into a single batched encoder call.
+SMALL_TEXT_CHARS = 16_384
+# threads tiktoken may use for a batched encoder call.
+BATCH_THREADS = 8
+# text held back waiting for a safe split point before one is forced.
+MAX_CARRY_CHARS = 4 * 1024 * 1024
+
+
+class TokenizerEngine:
+    """
+    Counts tokens for many texts with a single model, resolving the encoding once.
+
+    Small texts are grouped into `encode_ordinary_batch` calls, which run on tiktoken's
+    thread pool without holding the GIL, and large texts get individual calls. Special-token
+    text such as `<|endoftext|>` is counted as ordinary text, so no file's content can make
+    counting fail.
+
+    Args:
+        model_name (str): The model whose encoding is used.
+        small_text_chars (int): The largest text, in characters, that is batched.
+        num_threads (int): The threads used for each batched call.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        small_text_chars: int = SMALL_TEXT_CHARS,
+        num_threads: int = BATCH_THREADS,
+    ) -> None:
+        self.model_name: str = model_name
+        self.small_text_chars: int = small_text_chars
+        self.num_threads: int = num_threads
+        self._encoding: Encoding | None = None
+
+    @property
+    def encoding_name(self) -> str:
+        """
+        The name of the model's encoding, resolved without loading it.
+        """
+        return encoding_name(self.model_name)
+
+    @property
+    def encoding(self) -> "Encoding":
+        """
+        The model's encoding, loaded on first use.
+        """
+        if self._encoding is None:
+            self._encoding = get_encoding(self.model_name)
+        return self._encoding
+
+    def count(self, text: str) -> int:
+        """
+        Returns the number of tokens in a single text.
+        """
+        if not text:
+            return 0
+        return len(self.encoding.encode_ordinary(text))
+
+    def count_batch(self, texts: list[str]) -> list[int]:
+        """
+        Returns the number of tokens in each text, in order.
+        """
+        counts = [0] * len(texts)
+        small: list[int] = []
+        for index, text in enumerate(texts):
+            if not text:
+                continue
+            if len(text) <= self.small_text_chars:
+                small.append(index)
+            else:
+                counts[index] = self.count(text)
+
+        if len(small) == 1:
+            counts[small[0]] = len(self.encoding.encode_ordinary(texts[small[0]]))
+        elif small:
+            encoded = self.encoding.encode_ordinary_batch(
+                [texts[index] for index in small], num_threads=self.num_threads
+            )
+            for index, tokens in zip(small, encoded):
+                counts[index] = len(tokens)
+        return counts
+
+    def count_chunks(
+        self, chunks: Iterable[str], max_carry: int = MAX_CARRY_CHARS
+    ) -> int:
+        """
+        Returns the number of tokens in a text delivered as a stream of chunks, holding
+        only about one chunk in memory at a time.
+
+        The stream is re-cut at points where the encoding's pre-tokenizer always starts
+        a new piece, so no BPE merge can cross a cut and the sum equals the whole-text count
+        (see `safe_split`). If `max_carry` characters arrive without any such point, e.g. in
+        a minified or base64 blob, the text is cut anyway; only the pieces touching that cut
+        can change, typically by a token or two.
+
+        Args:
+            chunks (Iterable[str]): The text, in order.
+            max_carry (int): The most characters held back waiting for a safe cut.
+
+        Returns:
+            int: the total number of tokens.
+        """
+        return count_chunks([self], chunks, max_carry)[0]
+
+
+def engines_for(models: Iterable[str]) -> tuple[list[TokenizerEngine], dict[str, int]]:
+    """
+    Returns one engine per distinct encoding among the models, in the order first seen, so
+    models that share an encoding are only tokenized once.
+
+    Returns:
+        tuple[list[TokenizerEngine], dict[str, int]]: the engines, and the position of each model's engine.
+    """
+    engines: list[TokenizerEngine] = []
+    positions: dict[str, int] = {}
+    by_encoding: dict[str, int] = {}
+    for model_name in models:
+        name = encoding_name(model_name)
+        if name not in by_encoding:
+            by_encoding[name] = len(engines)
+            engines.append(TokenizerEngine(model_name))
+        positions[model_name] = by_encoding[name]
+    return engines, positions
+
+
+def count_chunks(
+    engines: list[TokenizerEngine],
+    chunks: Iterable[str],
+    max_carry: int = MAX_CARRY_CHARS,
+) -> list[int]:
+    """
+    Like `TokenizerEngine.count_chunks`, for several engines at once. Safe cuts don't depend
+    on the encoding, so the stream is only re-cut once and read once.
+
+    Returns:
+        list[int]: the total number of tokens for each engine, in order.
+    """
+    totals = [0] * len(engines)
+    carry = ""
+    for chunk in chunks:
+        carry += chunk
+        split = safe_split(carry)
+        if split == 0 and len(carry) > max_carry:
+            split = len(carry) // 2
+        if split > 0:
+            for index, engine in enumerate(engines):
+                totals[index] += engine.count(carry[:split])
+            carry = carry[split:]
+    return [total + engine.count(carry) for total, engine in zip(totals, engines)]
+
+
+def safe_split(text: str) -> int:
+    """
+    Returns the last position in `text` where it can be cut without changing its token count, or 0 if there is none.
+
+    tiktoken's encodings split text into pieces with a regex before running BPE, and merges
+    never cross a piece boundary. Two kinds of position are always piece boundaries for the
+    built-in encodings, whatever text follows:
+
+      - just after a lone newline that follows non-whitespace and precedes a letter or digit.
+      - just before a lone space that follows non-whitespace and precedes a letter or digit.
+
+    Newlines are preferred, so cuts fall between lines where possible.
+    """
+    end = len(text) - 1
+    for separator, offset in (("\n", 1), (" ", 0)):
+        position = text.rfind(separator, 0, end)
+        while position > 0:
+            if not text[position - 1].isspace() and text[position + 1].isalnum():
+                return position + offset
+            position = text.rfind(separator, 0, position)
+    return 0
 
 
 """
@@ -22,9 +310,9 @@ Tokenizing methods
 
 
 def calculate_text_tokens(string: str, model_name: str) -> int:
-    """Returns the number of tokens in a text string"""
-    encoding = encoding_for_model(model_name)
-    num_tokens = len(encoding.encode(string))
+    """Returns the number of tokens in a text string, counting special-token text as ordinary text"""
+    encoding = get_encoding(model_name)
+    num_tokens = len(encoding.encode_ordinary(string))
     return num_tokens
 
 
@@ -72,3 +360,17 @@ def calculate_image_tokens(width: int, height: int) -> int:
     total_tokens = 85 + 170 * (tiles_width * tiles_height)
 
     return total_tokens
+
+
+def calculate_image_tokens_batch(sizes: Iterable[tuple[int, int]]) -> list[int]:
+    """
+    Returns the number of tokens of each image in a batch of (width, height) sizes.
+    Image sets tend to repeat a handful of sizes, so each distinct size is only worked out once.
+    """
+    known: dict[tuple[int, int], int] = {}
+    tokens: list[int] = []
+    for width, height in sizes:
+        if (width, height) not in known:
+            known[width, height] = calculate_image_tokens(width, height)
+        tokens.append(known[width, height])
+    return tokens
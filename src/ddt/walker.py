@@ -0,0 +1,150 @@
+import logging
+import os
+import queue
+import threading
+from collections.abc import Callable, Iterable, Iterator
+from pathlib import Path
+
+"""
+Directory walking
+"""
+
+
+class WalkEntry:
+    """
+    A file found by `walk`, carrying the type and stat information its DirEntry already fetched.
+
+    Args:
+        path (Path): The path of the file.
+        entry (os.DirEntry[str] | None): The directory entry the file was found through, if any.
+        symlink (bool | None): Whether the file is a symlink, when known without a directory entry.
+    """
+
+    __slots__: tuple[str, ...] = ("_entry", "_stat", "_symlink", "path")
+
+    def __init__(
+        self,
+        path: Path,
+        entry: os.DirEntry[str] | None = None,
+        symlink: bool | None = None,
+    ) -> None:
+        self.path: Path = path
+        self._entry: os.DirEntry[str] | None = entry
+        self._stat: os.stat_result | None = None
+        self._symlink: bool | None = symlink
+
+    def stat(self) -> os.stat_result | None:
+        """
+        Returns the file's stat data, following symlinks, or None if it can't be read.
+        The result is fetched at most once.
+        """
+        if self._stat is None:
+            try:
+                self._stat = (
+                    self._entry.stat() if self._entry is not None else self.path.stat()
+                )
+            except OSError:
+                return None
+        return self._stat
+
+    @property
+    def size(self) -> int:
+        """
+        The file size in bytes, or 0 if it can't be read.
+        """
+        stat = self.stat()
+        return stat.st_size if stat is not None else 0
+
+    @property
+    def is_symlink(self) -> bool | None:
+        """
+        Whether the file is a symlink, or None when it wasn't found by a walk and is unknown.
+        """
+        if self._entry is None:
+            return self._symlink
+        return self._entry.is_symlink()
+
+
+def walk(
+    root: Path, skip_dir: Callable[[Path], bool] | None = None
+) -> Iterator[WalkEntry]:
+    """
+    Lazily walks a directory tree with `os.scandir`, depth first, in name order.
+
+    Every file is yielded, with or without an extension. Directories for which `skip_dir`
+    returns True are never opened, and symlinked directories are not followed.
+
+    Args:
+        root (Path): The directory to walk.
+        skip_dir (Callable[[Path], bool] | None): Decides which directories to prune.
+
+    Yields:
+        WalkEntry: each file under the root.
+    """
+    stack: list[Iterator[os.DirEntry[str]]] = [_scan(root)]
+    while stack:
+        entry = next(stack[-1], None)
+        if entry is None:
+            _ = stack.pop()
+            continue
+
+        path = Path(entry.path)
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                if skip_dir is None or not skip_dir(path):
+                    stack.append(_scan(path))
+                continue
+            if entry.is_symlink() and entry.is_dir():
+                continue
+        except OSError as e:
+            logging.debug(f"could not read {entry.path}: {e}")
+            continue
+        yield WalkEntry(path, entry)
+
+
+def ahead[T](items: Iterable[T]) -> Iterator[T]:
+    """
+    Yields `items` in order while a thread of their own runs through them as fast as it can,
+    so a slow consumer doesn't hold back a walk, whose work is mostly waiting on the filesystem.
+    An error `items` raises is raised again once the consumer reaches it, and the thread stops
+    at the next item once the consumer is closed.
+
+    Args:
+        items (Iterable[T]): The items to run through, usually a walk.
+
+    Yields:
+        T: each of the items.
+    """
+    # one-item tuples, then None at the end of the items or the error they raised.
+    found: queue.SimpleQueue[tuple[T] | Exception | None] = queue.SimpleQueue()
+    closed = threading.Event()
+
+    def run() -> None:
+        try:
+            for item in items:
+                if closed.is_set():
+                    return
+                found.put((item,))
+        except Exception as e:
+            found.put(e)
+            return
+        found.put(None)
+
+    threading.Thread(target=run, name="ddt-walk", daemon=True).start()
+    try:
+        while (next_item := found.get()) is not None:
+            if isinstance(next_item, Exception):
+                raise next_item
+            yield next_item[0]
+    finally:
+        closed.set()
+
+
+def _scan(directory: Path) -> Iterator[os.DirEntry[str]]:
+    try:
+        with os.scandir(directory) as entries:
+            listing = sorted(entries, key=lambda entry: entry.name)
+    except OSError as e:
+        logging.debug(f"could not read {directory}: {e}")
+        listing = []
+    return iter(listing)
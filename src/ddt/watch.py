@@ -0,0 +1,363 @@
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from collections.abc import Callable, Iterable
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from . import walker
+
+if TYPE_CHECKING:
+    import ctypes
+
+    from .models import TokenCounter
+
+"""
+Filesystem change watching
+"""
+
+# how long to keep collecting events after the first one, so a save that writes, renames
+# and touches a file is handled as one change, in seconds.
+DEBOUNCE_SECONDS = 0.02
+# how often the polling fallback rescans the tree, in seconds.
+POLL_SECONDS = 1.0
+
+# inotify(7) event bits.
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_DONT_FOLLOW = 0x02000000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = (
+    _IN_MODIFY
+    | _IN_ATTRIB
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_ONLYDIR
+    | _IN_DONT_FOLLOW
+)
+# wd, mask, cookie and name length, followed by the NUL-padded name.
+_EVENT = struct.Struct("iIII")
+_READ_BYTES = 64 * 1024
+
+
+class PollingWatcher:
+    """
+    Watches a directory tree by rescanning it every `interval` seconds and comparing sizes
+    and modification times. Used where inotify isn't available.
+
+    Args:
+        root (Path): The directory to watch.
+        skip_dir (Callable[[Path], bool] | None): Decides which directories to leave unwatched.
+        interval (float): The seconds between scans.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        skip_dir: Callable[[Path], bool] | None = None,
+        interval: float = POLL_SECONDS,
+    ) -> None:
+        self.root: Path = root
+        self.interval: float = interval
+        self._skip_dir: Callable[[Path], bool] | None = skip_dir
+        self._snapshot: dict[Path, tuple[int, int]] = self._scan()
+
+    def wait(self, timeout: float | None = None) -> set[Path]:
+        """
+        Blocks until something under the root changes, or `timeout` seconds pass.
+
+        Returns:
+            set[Path]: the files created, changed or deleted, empty on a timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            pause = self.interval
+            if deadline is not None:
+                pause = min(pause, max(deadline - time.monotonic(), 0.0))
+            time.sleep(pause)
+            snapshot = self._scan()
+            changed = {
+                file
+                for file in snapshot.keys() | self._snapshot.keys()
+                if snapshot.get(file) != self._snapshot.get(file)
+            }
+            self._snapshot = snapshot
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def watch_tree(self, directory: Path) -> None:
+        # every scan walks the whole tree again, so directories that are no longer skipped
+        # are picked up without being told about.
+        pass
+
+    def close(self) -> None:
+        self._snapshot = {}
+
+    def _scan(self) -> dict[Path, tuple[int, int]]:
+        snapshot: dict[Path, tuple[int, int]] = {}
+        for entry in walker.walk(self.root, self._skip_dir):
+            stat = entry.stat()
+            if stat is not None:
+                snapshot[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+
+class InotifyWatcher:
+    """
+    Watches a directory tree with Linux inotify, one watch per directory. Directories created
+    or moved into the tree are watched as they appear.
+
+    Changed paths may be files or directories: a directory stands for everything below it,
+    e.g. when it is moved in or out, or when the kernel's event queue overflowed.
+
+    Args:
+        root (Path): The directory to watch.
+        skip_dir (Callable[[Path], bool] | None): Decides which directories to leave unwatched.
+
+    Raises:
+        OSError: If inotify isn't available or the root can't be watched.
+    """
+
+    def __init__(
+        self, root: Path, skip_dir: Callable[[Path], bool] | None = None
+    ) -> None:
+        self.root: Path = root
+        self._skip_dir: Callable[[Path], bool] | None = skip_dir
+        self._libc: ctypes.CDLL = _libc()
+        self._fd: int = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise _errno_error("inotify_init1")
+        self._dirs: dict[int, Path] = {}
+        try:
+            self._watch_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def wait(self, timeout: float | None = None) -> set[Path]:
+        """
+        Blocks until something under the root changes, or `timeout` seconds pass, then
+        collects events until DEBOUNCE_SECONDS go by without one.
+
+        Returns:
+            set[Path]: the files and directories created, changed or deleted, empty on a timeout.
+        """
+        changed: set[Path] = set()
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        while ready:
+            self._read(changed)
+            ready, _, _ = select.select([self._fd], [], [], DEBOUNCE_SECONDS)
+        return changed
+
+    def watch_tree(self, directory: Path) -> None:
+        """
+        Watches the directories below `directory` that aren't skipped, e.g. once a .gitignore
+        edit stops skipping some of them. Directories already watched keep their watch.
+        """
+        self._watch_tree(directory)
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+        self._dirs = {}
+
+    def _read(self, changed: set[Path]) -> None:
+        try:
+            data = os.read(self._fd, _READ_BYTES)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & _IN_Q_OVERFLOW:
+                logging.debug("inotify queue overflowed, rescanning everything")
+                changed.add(self.root)
+                continue
+            if mask & _IN_IGNORED:
+                _ = self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = directory / os.fsdecode(name)
+            changed.add(path)
+            if not mask & _IN_ISDIR:
+                continue
+            if mask & (_IN_CREATE | _IN_MOVED_TO):
+                if self._skip_dir is None or not self._skip_dir(path):
+                    self._watch_tree(path)
+            elif mask & _IN_MOVED_FROM:
+                self._unwatch_tree(path)
+
+    def _watch_tree(self, directory: Path) -> None:
+        pending = [directory]
+        while pending:
+            current = pending.pop()
+            wd = self._libc.inotify_add_watch(
+                self._fd, os.fsencode(current), _WATCH_MASK
+            )
+            if wd < 0:
+                # it may have gone again already; only the root must be watchable.
+                if current == self.root:
+                    raise _errno_error(f"inotify_add_watch {current}")
+                logging.debug(f"could not watch {current}")
+                continue
+            self._dirs[wd] = current
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        path = Path(entry.path)
+                        if entry.is_dir(follow_symlinks=False) and (
+                            self._skip_dir is None or not self._skip_dir(path)
+                        ):
+                            pending.append(path)
+            except OSError as e:
+                logging.debug(f"could not read {current}: {e}")
+
+    def _unwatch_tree(self, directory: Path) -> None:
+        # a directory moved out of the tree would otherwise keep reporting under its old path.
+        for wd, path in list(self._dirs.items()):
+            if path == directory or path.is_relative_to(directory):
+                _ = self._libc.inotify_rm_watch(self._fd, wd)
+                del self._dirs[wd]
+
+
+def watcher(
+    root: Path, skip_dir: Callable[[Path], bool] | None = None
+) -> InotifyWatcher | PollingWatcher:
+    """
+    Returns an inotify watcher for the tree where the platform has one, or a polling watcher otherwise.
+    """
+    try:
+        return InotifyWatcher(root, skip_dir)
+    except OSError as e:
+        logging.debug(f"inotify unavailable ({e}), polling every {POLL_SECONDS}s")
+        return PollingWatcher(root, skip_dir)
+
+
+def run(counter: "TokenCounter") -> None:
+    """
+    Scans the root, writes the summary, then keeps it live until interrupted: every time
+    files change, only those are recounted, `scanned_files` and the totals are updated in
+    place, and a refreshed summary is written. inotify is used where the platform has it,
+    and the tree is polled otherwise.
+    """
+    # started first, so nothing that changes during the scan is missed.
+    changes = watcher(counter.config.root, counter.skip_dir)
+    try:
+        counter.parse_files()
+        counter.refresh_output()
+        while True:
+            changed = changes.wait()
+            started = time.perf_counter()
+            if update(counter, changed):
+                counter.refresh_output()
+                logging.debug(
+                    f"recounted {len(changed)} changes in {(time.perf_counter() - started) * 1000:.1f}ms"
+                )
+            for path in changed:
+                if path.name == ".gitignore" and path.parent.is_dir():
+                    changes.watch_tree(path.parent)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        changes.close()
+
+
+def update(counter: "TokenCounter", changed: Iterable[Path]) -> bool:
+    """
+    Recounts files after they changed, updating `scanned_files`, the category totals and
+    the grand total in place. A directory stands for every file below it, and files that
+    no longer exist, or are now filtered out, are dropped from the counts. A changed
+    .gitignore is read again and stands for its whole directory, whose files it may now
+    ignore or stop ignoring.
+
+    Args:
+        changed (Iterable[Path]): The files and directories that changed.
+
+    Returns:
+        bool: True if anything counted changed.
+    """
+    gitignore = counter.config.gitignore
+    files: dict[Path, None] = {}
+    for path in changed:
+        if counter.config.resolve_paths:
+            path = path.resolve()
+        if path.name == ".gitignore" and gitignore is not None:
+            path = path.parent
+            gitignore.reload(path)
+        if path.is_dir() or (path not in counter.watched and not path.exists()):
+            files.update(
+                (file, None) for file in counter.watched if file.is_relative_to(path)
+            )
+            if path.is_dir() and (
+                path == counter.config.root or not counter.skip_dir(path)
+            ):
+                files.update(
+                    (entry.path, None) for entry in walker.walk(path, counter.skip_dir)
+                )
+        else:
+            files[path] = None
+
+    counter.forget(files)
+    recount: list[Path] = []
+    for file in files:
+        listed = file in counter.watched
+        ignored = counter.ignored_files.get(counter.grab_suffix(file))
+        if ignored is not None and file in ignored:
+            ignored.remove(file)
+            listed = True
+        exists = file.is_file() and (
+            not counter.config.git or file in counter.tracked_files()
+        )
+        if not counter.streaming and listed != exists:
+            if exists:
+                counter.all_files.append(file)
+            else:
+                counter.all_files.remove(file)
+        if not exists or counter.filter_file(file):
+            counter.revise(file, "", -1)
+        else:
+            recount.append(file)
+    for file, file_extension, token_counts in counter.parse_many(recount):
+        counter.revise(file, file_extension, token_counts)
+    return bool(files)
+
+
+def _libc() -> "ctypes.CDLL":
+    if not sys.platform.startswith("linux"):
+        raise OSError("inotify is Linux only")
+    import ctypes.util
+
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    if not hasattr(libc, "inotify_init1"):
+        raise OSError("libc has no inotify")
+    return libc
+
+
+def _errno_error(call: str) -> OSError:
+    import ctypes
+
+    errno = ctypes.get_errno()
+    return OSError(errno, f"{call}: {os.strerror(errno)}")
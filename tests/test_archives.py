@@ -0,0 +1,78 @@
+import io
+import os
+import shutil
+import tarfile
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from ddt import archives
+
+
+def make_tree(path: Path) -> Path:
+    (path / "src").mkdir(parents=True)
+    _ = (path / "README.md").write_text("# readme\n")
+    _ = (path / "src" / "main.py").write_text("print('hi')\n")
+    os.symlink("main.py", path / "src" / "link.py")
+    return path
+
+
+def read_members(archive: Path) -> dict[str, tuple[int, bytes]]:
+    return {
+        name: (size, stream.read()) for name, size, stream in archives.members(archive)
+    }
+
+
+def test_is_archive(tmp_path: Path):
+    for name in ("a.tar", "a.tar.gz", "a.TGZ", "a.tar.xz", "a.zip"):
+        _ = (tmp_path / name).write_bytes(b"")
+        assert archives.is_archive(tmp_path / name)
+    _ = (tmp_path / "a.gz").write_bytes(b"")
+    assert not archives.is_archive(tmp_path / "a.gz")
+    assert not archives.is_archive(tmp_path / "missing.zip")
+    (tmp_path / "dir.zip").mkdir()
+    assert not archives.is_archive(tmp_path / "dir.zip")
+
+
+@pytest.mark.parametrize("archive_format", ["tar", "gztar", "xztar"])
+def test_tar_members(tmp_path: Path, archive_format: str):
+    _ = make_tree(tmp_path / "tree")
+    # members are named ./tree/..., as tarballs made from inside a directory often are.
+    archive = Path(
+        shutil.make_archive(
+            str(tmp_path / "t"), archive_format, root_dir=tmp_path, base_dir="./tree"
+        )
+    )
+    assert read_members(archive) == {
+        "tree/README.md": (9, b"# readme\n"),
+        "tree/src/main.py": (12, b"print('hi')\n"),
+    }
+
+
+def test_zip_members(tmp_path: Path):
+    archive = tmp_path / "t.zip"
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr("/abs/a.txt", "alpha")
+        zip_file.writestr("dir/", "")
+        zip_file.writestr("dir/b.txt", "beta")
+        link = zipfile.ZipInfo("dir/link.txt")
+        link.external_attr = 0o120777 << 16
+        zip_file.writestr(link, "b.txt")
+    assert read_members(archive) == {
+        "abs/a.txt": (5, b"alpha"),
+        "dir/b.txt": (4, b"beta"),
+    }
+
+
+def test_members_of_a_truncated_archive(tmp_path: Path):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        data = os.urandom(100_000)
+        info = tarfile.TarInfo("noise.bin")
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+    archive = tmp_path / "t.tar.gz"
+    _ = archive.write_bytes(buffer.getvalue()[:50_000])
+    with pytest.raises(archives.ARCHIVE_ERRORS):
+        _ = read_members(archive)
@@ -0,0 +1,65 @@
+import copy
+from pathlib import Path
+
+import bench
+import pytest
+from synthetic import TreeSpec, generate
+
+
+def snapshot(root: Path) -> dict[str, bytes | str]:
+    return {
+        path.relative_to(root).as_posix(): (
+            f"-> {path.readlink()}" if path.is_symlink() else path.read_bytes()
+        )
+        for path in sorted(root.rglob("*"))
+        if path.is_symlink() or path.is_file()
+    }
+
+
+def test_generate_is_deterministic(tmp_path: Path):
+    spec = TreeSpec(files=200, depth=2, fanout=3, symlink_ratio=0.1, seed=7)
+    written = generate(tmp_path / "a", spec)
+    _ = generate(tmp_path / "b", spec)
+    assert snapshot(tmp_path / "a") == snapshot(tmp_path / "b")
+    _ = generate(tmp_path / "c", TreeSpec(files=200, depth=2, fanout=3, seed=8))
+    assert snapshot(tmp_path / "a") != snapshot(tmp_path / "c")
+
+    names = [path.name for path in written]
+    assert sum(name.startswith("link_") for name in names) > 0
+    assert sum(name.endswith(".png") for name in names) > 0
+    assert sum(name.startswith("blob_") for name in names) > 0
+    assert ".gitignore" in names
+    assert max(len(path.relative_to(tmp_path / "a").parts) for path in written) <= 4
+
+
+def test_bench_run_and_compare(tmp_path: Path):
+    spec = TreeSpec(files=60, depth=1, fanout=2)
+    results = bench.run(spec, repeat=1)
+    assert set(results["stages"]) == {
+        "gitignore",
+        "walk",
+        "filter",
+        "tokenize",
+        "tokenize_cached",
+        "output_text",
+        "output_html",
+        "output_json",
+    }
+    assert results["sizes"]["tokens"] > 0
+
+    baseline = copy.deepcopy(results)
+    for stage in baseline["stages"].values():
+        stage["seconds"] = max(stage["seconds"], bench.MIN_COMPARED_SECONDS)
+    assert not any(
+        line.endswith("REGRESSION") for line in bench.compare(results, baseline, 0.1)
+    )
+    baseline["stages"]["tokenize"]["seconds"] = 1.0
+    results["stages"]["tokenize"]["seconds"] = 1.2
+    lines = bench.compare(results, baseline, 0.1)
+    assert [line.split(":")[0] for line in lines if line.endswith("REGRESSION")] == [
+        "tokenize"
+    ]
+
+    baseline["spec"]["seed"] = 1
+    with pytest.raises(ValueError):
+        _ = bench.compare(results, baseline, 0.1)
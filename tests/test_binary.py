@@ -0,0 +1,20 @@
+from ddt import binary
+
+
+def test_is_binary_extension():
+    assert binary.is_binary_extension(".so")
+    assert binary.is_binary_extension(".tar.gz")
+    assert binary.is_binary_extension(".PYC")
+    assert not binary.is_binary_extension(".py")
+    assert not binary.is_binary_extension("")
+
+
+def test_looks_binary():
+    assert not binary.looks_binary(b"")
+    assert not binary.looks_binary(b"plain text\n")
+    assert binary.looks_binary(b"ELF\x00\x01\x02")
+    assert binary.looks_binary(bytes(range(128, 256)) * 4)
+    # a multi-byte character cut off by the end of the prefix is still text.
+    assert not binary.looks_binary("naïve café ☕".encode()[:-1])
+    # a few stray latin-1 bytes aren't enough.
+    assert not binary.looks_binary(b"caf\xe9 " + b"ordinary words " * 20)
@@ -0,0 +1,142 @@
+import os
+import sys
+from pathlib import Path
+
+from ddt import cache, config, models
+from ddt.tokenizer import Model
+
+
+def test_default_vocab_dir(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", "/opt/vocab")
+    assert cache.default_vocab_dir() == Path("/opt/vocab")
+    monkeypatch.delenv("TIKTOKEN_CACHE_DIR")
+    assert cache.default_vocab_dir() == tmp_path / "ddt" / "vocab"
+
+
+def test_cache_round_trip(tmp_path: Path):
+    file = tmp_path / "hello.txt"
+    _ = file.write_text("hello world")
+    tc = cache.TokenCache(tmp_path / "cache")
+    key = tc.key(file, "o200k_base")
+    assert key is not None
+    assert tc.get(key) is None
+    tc.put(key, 2, cache.content_digest(file.read_bytes()))
+    tc.close()
+
+    reopened = cache.TokenCache(tmp_path / "cache")
+    assert reopened.get(key) == 2
+    assert (
+        reopened.get(cache.CacheKey(key.path, "cl100k_base", key.size, key.mtime_ns))
+        is None
+    )
+
+
+def test_cache_misses_changed_files(tmp_path: Path):
+    file = tmp_path / "hello.txt"
+    _ = file.write_text("hello world")
+    tc = cache.TokenCache(tmp_path / "cache")
+    key = tc.key(file, "o200k_base")
+    assert key is not None
+    tc.put(key, 2)
+    tc.flush()
+    os.utime(file, ns=(key.mtime_ns + 1_000_000_000, key.mtime_ns + 1_000_000_000))
+    changed = tc.key(file, "o200k_base")
+    assert changed is not None
+    assert tc.get(changed) is None
+
+
+def test_cache_digest_fallback(tmp_path: Path):
+    original = tmp_path / "a.txt"
+    copy = tmp_path / "b.txt"
+    _ = original.write_text("same content")
+    _ = copy.write_text("same content")
+    digest = cache.content_digest(original.read_bytes())
+    tc = cache.TokenCache(tmp_path / "cache")
+    original_key = tc.key(original, "o200k_base")
+    copy_key = tc.key(copy, "o200k_base")
+    assert original_key is not None and copy_key is not None
+    tc.put(original_key, 2, digest)
+    tc.flush()
+    assert tc.get(copy_key) is None
+    assert tc.get_by_digest(copy_key, digest) == 2
+    tc.flush()
+    assert tc.get(copy_key) == 2
+
+
+def test_cache_eviction(tmp_path: Path):
+    tc = cache.TokenCache(tmp_path / "cache", max_entries=2)
+    for index in range(5):
+        tc.put(cache.CacheKey(f"/file{index}", "o200k_base", 1, index), index)
+    tc.close()
+    reopened = cache.TokenCache(tmp_path / "cache")
+    assert reopened.get(cache.CacheKey("/file4", "o200k_base", 1, 4)) == 4
+    assert reopened.get(cache.CacheKey("/file0", "o200k_base", 1, 0)) is None
+
+
+def test_tokencounter_uses_cache(tmp_path: Path):
+    cfg = config.Config(
+        Path("tests/test_files"),
+        False,
+        False,
+        False,
+        False,
+        False,
+        False,
+        Model("gpt-4o"),
+        sys.stdout,
+        "txt",
+        [],
+        [],
+        cache_dir=tmp_path / "cache",
+    )
+    file = Path("tests/test_files/testfile.txt")
+    tc = models.TokenCounter(cfg)
+    assert tc.count_text_file(file) == 22
+    cache = tc.cache
+    assert cache is not None
+    cache.flush()
+
+    cached = models.TokenCounter(cfg)
+    cache = cached.cache
+    assert cache is not None
+    key = cache.key(file, cached.engine.encoding_name)
+    assert key is not None
+    assert cache.get(key) == 22
+    assert cached.count_text_file(file) == 22
+
+
+def test_tokencounter_stats_each_file_once(tmp_path: Path, monkeypatch):
+    root = tmp_path / "root"
+    root.mkdir()
+    for name in ("a.txt", "b.py", "c.md"):
+        _ = (root / name).write_text(f"contents of {name}\n")
+    cfg = config.Config(
+        root,
+        False,
+        False,
+        False,
+        False,
+        False,
+        False,
+        Model("gpt-4o"),
+        sys.stdout,
+        "txt",
+        [],
+        [],
+        cache_dir=tmp_path / "cache",
+    )
+    stat = Path.stat
+    stated: list[Path] = []
+
+    def counting_stat(self: Path, *args, **kwargs) -> os.stat_result:
+        stated.append(self)
+        return stat(self, *args, **kwargs)
+
+    monkeypatch.setattr(Path, "stat", counting_stat)
+    for _ in range(2):
+        tc = models.TokenCounter(cfg)
+        tc.parse_files()
+        assert tc.total > 0
+    # the walk's directory entries already hold the stat data the cache key needs.
+    assert [file for file in stated if file.parent == root] == []
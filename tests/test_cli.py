@@ -43,13 +43,66 @@ def test_resolve_paths_arg():
 
 def test_model_choices_arg():
     parser = cli.setup_argparse()
-    for model in tokenizer.MODEL_CHOICES:
+    for model in tokenizer.model_choices():
         args = parser.parse_args(["--model", model, "src"])
         assert args.model == model
     with pytest.raises(SystemExit):
         _ = parser.parse_args([".", "-m", "invalid_model"])
 
 
+def test_jobs_arg():
+    parser = cli.setup_argparse()
+    args = parser.parse_args(["src"])
+    assert args.jobs == 1
+    args = parser.parse_args(["--jobs", "4", "src"])
+    assert args.jobs == 4
+    with pytest.raises(SystemExit):
+        _ = parser.parse_args([".", "-j", "-1"])
+
+
+def test_cache_args():
+    parser = cli.setup_argparse()
+    args = parser.parse_args(["src"])
+    assert not args.no_cache
+    assert args.cache_dir is None
+    args = parser.parse_args(["--cache-dir", "/tmp/ddt", "src"])
+    assert args.cache_dir == Path("/tmp/ddt")
+    args = parser.parse_args(["--no-cache", "src"])
+    assert args.no_cache
+    with pytest.raises(SystemExit):
+        _ = parser.parse_args([".", "--no-cache", "--cache-dir", "/tmp/ddt"])
+
+
+def test_vocab_dir_arg():
+    parser = cli.setup_argparse()
+    assert parser.parse_args(["src"]).vocab_dir is None
+    args = parser.parse_args(["--vocab-dir", "/tmp/vocab", "--no-cache", "src"])
+    assert args.vocab_dir == Path("/tmp/vocab")
+
+
+def test_cache_warm_args():
+    assert cli.is_cache_command(["cache", "warm"])
+    assert cli.is_cache_command(["cache", "--help"])
+    assert not cli.is_cache_command(["cache"])
+    assert not cli.is_cache_command(["cache", "--html"])
+    assert not cli.is_cache_command(["src", "warm"])
+
+    parser = cli.setup_cache_argparse()
+    args = parser.parse_args(["warm"])
+    assert args.command == "warm"
+    assert getattr(args, "models", None) is None
+    assert args.vocab_dir is None
+    args = parser.parse_args(
+        ["warm", "-m", "gpt-4,gpt-4o", "--vocab-dir", "/tmp/vocab"]
+    )
+    assert args.models == ["gpt-4", "gpt-4o"]
+    assert args.vocab_dir == Path("/tmp/vocab")
+    with pytest.raises(SystemExit):
+        _ = parser.parse_args([])
+    with pytest.raises(SystemExit):
+        _ = parser.parse_args(["warm", "-m", "invalid_model"])
+
+
 def test_output_arg():
     parser = cli.setup_argparse()
     # TODO: replace with pytest temp dir stuff
@@ -97,3 +150,96 @@ def test_input_filter_args():
     parser = cli.setup_argparse()
     with pytest.raises(SystemExit):
         _ = parser.parse_args([".", "--include", ".py", "--exclude", ".json"])
+
+
+def test_exclude_path_args():
+    parser = cli.setup_argparse()
+    args = parser.parse_args(
+        [
+            "--exclude-path",
+            "vendor/**",
+            "--exclude-path",
+            "*.lock",
+            "--include",
+            "py",
+            "src",
+        ]
+    )
+    assert args.exclude_path == ["vendor/**", "*.lock"]
+    assert args.include == ["py"]
+
+
+def test_output_ndjson_arg():
+    parser = cli.setup_argparse()
+    args = parser.parse_args(["--ndjson", "src"])
+    assert args.ndjson
+    with pytest.raises(SystemExit):
+        _ = parser.parse_args([".", "--json", "--ndjson"])
+
+
+def test_estimate_arg():
+    parser = cli.setup_argparse()
+    assert not parser.parse_args(["src"]).estimate
+    assert parser.parse_args(["--estimate", "src"]).estimate
+
+
+def test_sample_args():
+    parser = cli.setup_argparse()
+    args = parser.parse_args(["--sample", "0.25", "src"])
+    assert args.sample == 0.25
+    assert args.sample_time is None
+    assert parser.parse_args(["--sample-time", "3", "src"]).sample_time == 3.0
+    for bad in (["--sample", "0"], ["--sample", "1.5"], ["--sample-time", "-1"]):
+        with pytest.raises(SystemExit):
+            _ = parser.parse_args([*bad, "src"])
+    with pytest.raises(SystemExit):
+        _ = parser.parse_args(["--sample", "0.5", "--estimate", "src"])
+
+
+def test_git_arg():
+    parser = cli.setup_argparse()
+    assert not parser.parse_args(["src"]).git
+    assert parser.parse_args(["--git", "src"]).git
+
+
+def test_since_arg():
+    parser = cli.setup_argparse()
+    assert parser.parse_args(["src"]).since is None
+    assert parser.parse_args(["--since", "main~3", "src"]).since == "main~3"
+    with pytest.raises(SystemExit):
+        _ = parser.parse_args(["--since", "main", "--estimate", "src"])
+
+
+def test_watch_arg():
+    parser = cli.setup_argparse()
+    assert not parser.parse_args(["src"]).watch
+    assert parser.parse_args(["--watch", "src"]).watch
+    with pytest.raises(SystemExit):
+        _ = parser.parse_args(["--watch", "--sample", "0.5", "src"])
+
+
+def test_multiple_model_args():
+    parser = cli.setup_argparse()
+    args = parser.parse_args(["src"])
+    assert args.model == tokenizer.GPT_4O
+    args = parser.parse_args(
+        ["-m", "gpt-4", "--model", "gpt-4o,gpt-3.5-turbo", "-m", "gpt-4", "src"]
+    )
+    assert args.model == "gpt-4"
+    assert args.models == ["gpt-4", "gpt-4o", "gpt-3.5-turbo"]
+    with pytest.raises(SystemExit):
+        _ = parser.parse_args(["-m", "gpt-4o,invalid_model", "src"])
+
+
+def test_duplicates_arg():
+    parser = cli.setup_argparse()
+    assert not parser.parse_args(["src"]).duplicates
+    assert parser.parse_args(["--duplicates", "src"]).duplicates
+
+
+def test_read_ahead_arg():
+    parser = cli.setup_argparse()
+    assert parser.parse_args(["src"]).read_ahead == 0
+    assert parser.parse_args(["--read-ahead", "8", "src"]).read_ahead == 8
+    with pytest.raises(SystemExit):
+        _ = parser.parse_args(["--read-ahead", "-1", "src"])
@@ -1,6 +1,11 @@
-from pathlib import Path
+import os
 import sys
-from ddt import config, tokenizer
+import tarfile
+from pathlib import Path
+
+import pytest
+
+from ddt import cli, config, tokenizer
 
 
 def test_config_happy_path():
@@ -113,3 +118,123 @@ def test_generate_config():
         assert cfg.output_format == argset["output_type"]
         assert cfg.exclude == ["foo"]
         assert cfg.include == ["bar"]
+
+
+def test_config_models():
+    def make(**kwargs) -> config.Config:
+        return config.Config(
+            Path("."),
+            False,
+            False,
+            False,
+            False,
+            False,
+            False,
+            tokenizer.Model("gpt-4"),
+            sys.stdout,
+            "txt",
+            [],
+            [],
+            **kwargs,
+        )
+
+    assert make().models == ["gpt-4"]
+    cfg = make(models=[tokenizer.Model("gpt-4o"), tokenizer.Model("gpt-4")])
+    assert cfg.models == ["gpt-4", "gpt-4o"]
+    with pytest.raises(SystemExit):
+        _ = make(models=[tokenizer.Model("gpt-4o")], estimate=True)
+
+
+def test_config_archive(tmp_path: Path):
+    archive = tmp_path / "release.tar.gz"
+    with tarfile.open(archive, "w:gz"):
+        pass
+
+    def make(root: Path, **kwargs) -> config.Config:
+        return config.Config(
+            root,
+            False,
+            False,
+            False,
+            False,
+            False,
+            False,
+            tokenizer.Model("gpt-4"),
+            sys.stdout,
+            "txt",
+            [],
+            [],
+            **kwargs,
+        )
+
+    cfg = make(archive)
+    assert cfg.archive
+    assert cfg.gitignore is None
+    assert not make(tmp_path).archive
+    with pytest.raises(SystemExit):
+        _ = make(archive, watch=True)
+    with pytest.raises(SystemExit):
+        _ = make(archive, estimate=True)
+    with pytest.raises(SystemExit):
+        _ = make(tmp_path / "notes.txt")
+
+
+def test_config_profile(tmp_path: Path):
+    def make(**kwargs) -> config.Config:
+        return config.Config(
+            tmp_path,
+            False,
+            False,
+            False,
+            False,
+            False,
+            False,
+            tokenizer.Model("gpt-4"),
+            sys.stdout,
+            "txt",
+            [],
+            [],
+            **kwargs,
+        )
+
+    assert not make().profile
+    assert make(profile_stats=tmp_path / "scan.pstats").profile
+    with pytest.raises(SystemExit):
+        _ = make(profile=True, watch=True)
+
+
+def test_config_vocab_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv(tokenizer.VOCAB_DIR_ENV, "/elsewhere")
+
+    def make(**kwargs) -> config.Config:
+        return config.Config(
+            tmp_path,
+            False,
+            False,
+            False,
+            False,
+            False,
+            False,
+            tokenizer.Model("gpt-4"),
+            sys.stdout,
+            "txt",
+            [],
+            [],
+            **kwargs,
+        )
+
+    assert make().vocab_dir is None
+    cfg = make(vocab_dir=tmp_path / "vocab")
+    assert cfg.vocab_dir == tmp_path / "vocab"
+    # the entry point applies it; building a Config leaves the environment alone.
+    assert os.environ[tokenizer.VOCAB_DIR_ENV] == "/elsewhere"
+    # a plain run loads from where `ddt cache warm` downloads to, once that exists.
+    monkeypatch.delenv(tokenizer.VOCAB_DIR_ENV)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "xdg"))
+    args = cli.setup_argparse().parse_args([str(tmp_path)])
+    assert config.generate_config(vars(args)).vocab_dir is None
+    (tmp_path / "xdg" / "ddt" / "vocab").mkdir(parents=True)
+    assert (
+        config.generate_config(vars(args)).vocab_dir
+        == tmp_path / "xdg" / "ddt" / "vocab"
+    )
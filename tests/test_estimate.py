@@ -0,0 +1,54 @@
+import json
+from pathlib import Path
+
+from ddt import estimate
+
+
+def test_default_ratios():
+    table = estimate.RatioTable(None, "o200k_base")
+    assert table.estimate(".py", 3700) == 1000
+    assert table.estimate(".unknown", 4000) == 1000
+    rate, spread, error = table.tokens_per_byte(".py")
+    assert spread == error == rate * estimate.DEFAULT_RELATIVE_ERROR
+
+
+def test_learned_ratios_round_trip(tmp_path: Path):
+    path = tmp_path / estimate.RATIOS_FILE
+    table = estimate.RatioTable(path, "o200k_base")
+    for size, tokens in [(1000, 500), (2000, 1000), (3000, 1500), (400, 200)]:
+        table.learn(".py", size, tokens)
+    table.learn(".py", 0, 0)
+    table.save()
+    # too few files to trust yet.
+    assert estimate.RatioTable(path, "o200k_base").estimate(".py", 100) == 27
+
+    table.learn(".py", 1000, 500)
+    table.save()
+    learned = estimate.RatioTable(path, "o200k_base")
+    assert learned.stats[".py"].files == 5
+    assert learned.estimate(".py", 100) == 50
+    assert learned.variance(".py", 100, 10_000) == 0.0
+    # ratios are kept apart per encoding.
+    assert estimate.RatioTable(path, "cl100k_base").estimate(".py", 100) == 27
+
+
+def test_learned_ratio_spread_sets_margin(tmp_path: Path):
+    table = estimate.RatioTable(tmp_path / estimate.RATIOS_FILE, "o200k_base")
+    for tokens in [400, 500, 600, 450, 550]:
+        table.learn(".md", 1000, tokens)
+    table.save()
+    _, spread, error = table.tokens_per_byte(".md")
+    assert round(spread, 4) == 0.0791
+    variance = table.variance(".md", 2000, 2 * 1000**2)
+    assert variance == 2 * 1000**2 * spread**2 + (2000 * error) ** 2
+    assert estimate.margin(variance) == estimate.Z_95 * variance**0.5
+
+
+def test_unreadable_table_falls_back_to_defaults(tmp_path: Path):
+    path = tmp_path / estimate.RATIOS_FILE
+    _ = path.write_text("{not json")
+    table = estimate.RatioTable(path, "o200k_base")
+    assert table.stats == {}
+    table.learn(".txt", 100, 25)
+    table.save()
+    assert json.loads(path.read_text())["encodings"]["o200k_base"][".txt"]["files"] == 1
@@ -0,0 +1,40 @@
+from pathlib import Path
+
+from ddt import filters
+
+
+def test_extension_rules():
+    ff = filters.FileFilter(Path("root"))
+    assert not ff.excludes(Path("root/a.py"))
+    ff.exclude_extensions(["py", ".tar.gz"])
+    assert ff.excludes(Path("root/a.py"))
+    assert ff.excludes(Path("root/release.tar.gz"))
+    assert not ff.excludes(Path("root/a.pyc"))
+
+    ff = filters.FileFilter(Path("root"))
+    ff.include_extensions([".md"])
+    assert not ff.excludes(Path("root/README.md"))
+    assert ff.excludes(Path("root/Makefile"))
+
+
+def test_path_globs():
+    ff = filters.FileFilter(Path("root"))
+    ff.exclude_paths(["vendor/**", "node_modules", "docs/*.html"])
+    assert ff.excludes(Path("root/vendor/lib/x.go"))
+    assert ff.excludes(Path("root/docs/index.html"))
+    assert not ff.excludes(Path("root/docs/index.md"))
+    assert not ff.excludes(Path("root/src/vendor.go"))
+    assert not ff.excludes(Path("elsewhere/vendor/x.go"))
+
+
+def test_directory_prunes():
+    ff = filters.FileFilter(Path("root"))
+    assert not ff.prunes(Path("root/vendor"))
+    ff.exclude_paths(["vendor/**", "node_modules"])
+    assert ff.prunes(Path("root/vendor"))
+    assert ff.prunes(Path("root/web/node_modules"))
+    assert not ff.prunes(Path("root/src"))
+
+    ff.exclude_paths(["!vendor/keep.go"])
+    assert not ff.prunes(Path("root/vendor"))
+    assert not ff.excludes(Path("root/vendor/keep.go"))
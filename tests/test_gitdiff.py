@@ -0,0 +1,75 @@
+import subprocess
+from pathlib import Path
+
+from ddt import gitdiff
+
+
+def git(cwd: Path, *args: str) -> str:
+    return subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+
+def make_repo(path: Path) -> Path:
+    (path / "src").mkdir(parents=True)
+    _ = git(path, "init", "-q")
+    _ = (path / "README.md").write_text("# readme\n")
+    _ = (path / "src" / "main.py").write_text("print('hi')\n")
+    _ = (path / "src" / "old name.py").write_text("x = 1\n")
+    _ = (path / "src" / "same.py").write_text("y = 2\n")
+    _ = git(path, "add", ".")
+    _ = git(path, "commit", "-q", "-m", "initial")
+    return path
+
+
+def test_resolve_revision(tmp_path: Path):
+    repo = make_repo(tmp_path / "repo")
+    head = git(repo, "rev-parse", "HEAD").strip()
+    assert gitdiff.resolve_revision(repo, "HEAD") == head
+    assert gitdiff.resolve_revision(repo / "src", "HEAD") == head
+    assert gitdiff.resolve_revision(repo, "no-such-branch") is None
+    assert gitdiff.resolve_revision(tmp_path, "HEAD") is None
+
+
+def test_changed_paths(tmp_path: Path):
+    repo = make_repo(tmp_path / "repo")
+    _ = (repo / "src" / "main.py").write_text("print('hello')\n")
+    _ = git(repo, "mv", "src/old name.py", "src/new name.py")
+    _ = (repo / "src" / "untracked.py").write_text("z = 3\n")
+    _ = (repo / ".gitignore").write_text("ignored.py\n")
+    _ = (repo / "src" / "ignored.py").write_text("w = 4\n")
+
+    assert gitdiff.changed_paths(repo, "HEAD") == [
+        ".gitignore",
+        "src/main.py",
+        "src/new name.py",
+        "src/old name.py",
+        "src/untracked.py",
+    ]
+    # paths are relative to the root, and only files below it are listed.
+    assert gitdiff.changed_paths(repo / "src", "HEAD") == [
+        "main.py",
+        "new name.py",
+        "old name.py",
+        "untracked.py",
+    ]
+
+
+def test_read_blobs(tmp_path: Path):
+    repo = make_repo(tmp_path / "repo")
+    _ = (repo / "src" / "main.py").write_text("print('hello')\n")
+    _ = (repo / "src" / "added.py").write_text("z = 3\n")
+
+    blobs = gitdiff.read_blobs(
+        repo / "src", "HEAD", ["main.py", "added.py", "old name.py"]
+    )
+    assert sorted(blobs) == ["main.py", "old name.py"]
+    blob, content = blobs["main.py"]
+    assert content == b"print('hi')\n"
+    assert blob == git(repo, "rev-parse", "HEAD:src/main.py").strip()
+    assert blobs["old name.py"][1] == b"x = 1\n"
+    assert gitdiff.read_blobs(repo, "HEAD", []) == {}
@@ -0,0 +1,88 @@
+from pathlib import Path
+
+from ddt import gitignore
+
+
+def test_compile_pattern_skips_blanks_and_comments():
+    assert gitignore.compile_pattern("") is None
+    assert gitignore.compile_pattern("   \n") is None
+    assert gitignore.compile_pattern("# comment") is None
+    pattern = gitignore.compile_pattern("\\#literal")
+    assert pattern is not None
+    assert pattern.regex.fullmatch("#literal")
+
+
+def test_compile_pattern_flags():
+    pattern = gitignore.compile_pattern("!build/")
+    assert pattern is not None
+    assert pattern.negated
+    assert pattern.dir_only
+
+
+def test_unanchored_patterns_match_at_any_depth():
+    rules = gitignore.IgnoreFile(gitignore.parse_lines(["*.log", "node_modules/"]))
+    assert rules.match("debug.log", False)
+    assert rules.match("a/b/debug.log", False)
+    assert rules.match("a/node_modules", True)
+    assert rules.match("a/node_modules", False) is None
+    assert rules.match("debug.txt", False) is None
+
+
+def test_anchored_patterns():
+    rules = gitignore.IgnoreFile(gitignore.parse_lines(["/todo.txt", "doc/*.md"]))
+    assert rules.match("todo.txt", False)
+    assert rules.match("sub/todo.txt", False) is None
+    assert rules.match("doc/notes.md", False)
+    assert rules.match("doc/api/notes.md", False) is None
+
+
+def test_double_star_patterns():
+    rules = gitignore.IgnoreFile(gitignore.parse_lines(["**/logs", "a/**/b", "out/**"]))
+    assert rules.match("logs", True)
+    assert rules.match("x/y/logs", True)
+    assert rules.match("a/b", False)
+    assert rules.match("a/x/y/b", False)
+    assert rules.match("out/x/y.txt", False)
+    assert rules.match("out", True) is None
+
+
+def test_negation_last_match_wins():
+    rules = gitignore.IgnoreFile(gitignore.parse_lines(["*.json", "!keep.json"]))
+    assert rules.match("drop.json", False)
+    assert rules.match("keep.json", False) is False
+
+
+def test_gitignore_nested_files_and_directories(tmp_path: Path):
+    _ = (tmp_path / ".gitignore").write_text("target/\n*.tmp\n")
+    nested = tmp_path / "pkg"
+    nested.mkdir()
+    _ = (nested / ".gitignore").write_text("!keep.tmp\n*.gen.py\n")
+    matcher = gitignore.GitIgnore(tmp_path)
+    assert matcher.matches(tmp_path / "target", is_dir=True)
+    assert matcher.matches(tmp_path / "target" / "main.rs")
+    assert matcher.matches(tmp_path / "a.tmp")
+    assert not matcher.matches(nested / "keep.tmp")
+    assert matcher.matches(nested / "drop.tmp")
+    assert matcher.matches(nested / "x.gen.py")
+    assert not matcher.matches(tmp_path / "x.gen.py")
+    assert not matcher.matches(Path("/somewhere/else.tmp"))
+
+
+def test_gitignore_reload(tmp_path: Path):
+    nested = tmp_path / "pkg"
+    (nested / "build").mkdir(parents=True)
+    _ = (nested / ".gitignore").write_text("build/\n")
+    matcher = gitignore.GitIgnore(tmp_path)
+    assert matcher.matches(nested / "build", is_dir=True)
+    assert not matcher.matches(nested / "notes.log")
+
+    _ = (nested / ".gitignore").write_text("*.log\n")
+    # the old rules stay until the directory is reloaded.
+    assert matcher.matches(nested / "build", is_dir=True)
+    matcher.reload(nested)
+    assert not matcher.matches(nested / "build", is_dir=True)
+    assert matcher.matches(nested / "notes.log")
+
+    _ = (tmp_path / ".gitignore").write_text("pkg/\n")
+    matcher.reload(tmp_path)
+    assert matcher.matches(nested / "main.py")
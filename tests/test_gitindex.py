@@ -0,0 +1,80 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from ddt import gitindex
+
+
+def git(cwd: Path, *args: str) -> str:
+    return subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+
+def make_repo(path: Path) -> Path:
+    path.mkdir()
+    _ = git(path, "init", "-q")
+    (path / "src" / "pkg").mkdir(parents=True)
+    _ = (path / "README.md").write_text("# readme\n")
+    _ = (path / "src" / "main.py").write_text("print('hi')\n")
+    _ = (path / "src" / "pkg" / "module_with_a_long_name.py").write_text("x = 1\n")
+    _ = (path / "src" / "pkg" / "other.py").write_text("y = 2\n")
+    _ = git(path, "add", ".")
+    return path
+
+
+def ls_files(path: Path) -> list[tuple[str, str]]:
+    lines = git(path, "ls-files", "-s").splitlines()
+    return [(line.split("\t")[1], line.split()[1]) for line in lines]
+
+
+@pytest.mark.parametrize("version", ["2", "3", "4"])
+def test_read_index_versions(tmp_path: Path, version: str):
+    repo = make_repo(tmp_path / "repo")
+    _ = git(repo, "update-index", "--index-version", version)
+    if version == "3":
+        # intent-to-add entries use the extended flags only version 3 and up have.
+        _ = (repo / "new.txt").write_text("new\n")
+        _ = git(repo, "add", "-N", "new.txt")
+    entries = gitindex.read_index(repo / ".git")
+    assert [(entry.path, entry.blob) for entry in entries] == ls_files(repo)
+    stat = (repo / "README.md").stat()
+    assert entries[0].matches(stat.st_size, stat.st_mtime_ns)
+
+
+def test_tracked_files_below_root(tmp_path: Path):
+    repo = make_repo(tmp_path / "repo")
+    _ = (repo / "src" / "untracked.py").write_text("z = 3\n")
+    tracked = gitindex.tracked_files(repo / "src")
+    assert tracked is not None
+    assert list(tracked) == [
+        repo / "src" / "main.py",
+        repo / "src" / "pkg" / "module_with_a_long_name.py",
+        repo / "src" / "pkg" / "other.py",
+    ]
+    assert gitindex.tracked_files(tmp_path) is None
+
+
+def test_tracked_files_in_linked_worktree(tmp_path: Path):
+    repo = make_repo(tmp_path / "repo")
+    _ = git(repo, "commit", "-q", "-m", "initial")
+    _ = git(repo, "worktree", "add", "-q", str(tmp_path / "linked"))
+    top, git_dir = gitindex.find_work_tree(tmp_path / "linked" / "src") or (None, None)
+    assert top == tmp_path / "linked"
+    assert git_dir is not None and git_dir.is_dir()
+    tracked = gitindex.tracked_files(tmp_path / "linked")
+    assert tracked is not None and len(tracked) == 4
+
+
+def test_modified_file_no_longer_matches(tmp_path: Path):
+    repo = make_repo(tmp_path / "repo")
+    _ = (repo / "README.md").write_text("# a longer readme\n")
+    entry = gitindex.read_index(repo / ".git")[0]
+    stat = (repo / "README.md").stat()
+    assert not entry.matches(stat.st_size, stat.st_mtime_ns)
+    assert entry.digest == f"git:{entry.blob}"
@@ -0,0 +1,67 @@
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from ddt import images
+
+
+@pytest.mark.parametrize(
+    "name,options",
+    [
+        ("image.png", {}),
+        ("image.gif", {}),
+        ("image.jpeg", {}),
+        ("progressive.jpeg", {"progressive": True}),
+        ("exif.jpeg", {"exif": b"Exif\x00\x00" + b"\x00" * 4096}),
+        ("lossy.webp", {}),
+        ("lossless.webp", {"lossless": True}),
+        ("extended.webp", {"exif": b"Exif\x00\x00" + b"\x00" * 64}),
+    ],
+)
+def test_probe_reads_headers_only(tmp_path: Path, monkeypatch, name: str, options):
+    file = tmp_path / name
+    Image.new("RGB", (1234, 567)).save(file, **options)
+
+    def no_pillow(*args, **kwargs):
+        raise AssertionError("Pillow should not be needed for this format")
+
+    monkeypatch.setattr(Image, "open", no_pillow)
+    assert images.probe(file) == (1234, 567)
+
+
+def test_probe_falls_back_to_pillow(tmp_path: Path):
+    file = tmp_path / "image.bmp"
+    Image.new("RGB", (31, 17)).save(file)
+    assert images.probe(file) == (31, 17)
+
+
+def test_probe_unreadable(tmp_path: Path):
+    file = tmp_path / "broken.png"
+    _ = file.write_bytes(b"not an image")
+    assert images.probe(file) is None
+    assert images.probe(tmp_path / "missing.png") is None
+
+
+@pytest.mark.parametrize(
+    "name,data",
+    [
+        ("truncated.gif", b"GIF89a\x01\x00"),
+        ("truncated.png", b"\x89PNG\r\n\x1a\n\x00\x00\x00\x0dIHDR\x00\x00"),
+    ],
+)
+def test_probe_truncated_header(tmp_path: Path, name: str, data: bytes):
+    file = tmp_path / name
+    _ = file.write_bytes(data)
+    assert images.probe(file) is None
+    assert images.probe_bytes(data, name) is None
+
+
+def test_probe_repo_assets():
+    for file in [
+        Path("assets/contextwindow.png"),
+        Path("assets/demo.gif"),
+        Path("tests/test_files/test_image.jpeg"),
+    ]:
+        with Image.open(file) as image:
+            assert images.probe(file) == image.size
@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import ddt
+
+# modules only some runs need, which importing the entry point must not pull in.
+LAZY_MODULES = (
+    "PIL",
+    "jinja2",
+    "tiktoken",
+    "concurrent.futures.process",
+    "subprocess",
+    "ctypes",
+)
+# prints every module the code before it imported, one per line, once the interpreter exits.
+LIST_MODULES = (
+    "import atexit, sys; "
+    "atexit.register(lambda: sys.stderr.write('\\n'.join(sys.modules) + '\\n')); "
+)
+
+
+def imported_modules(*args: str) -> set[str]:
+    """
+    Runs `ddt` with the given arguments, or just imports it without any, and returns the
+    names of every module it imported.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = str(Path(ddt.__file__).parent.parent)
+    code = LIST_MODULES + "import ddt.__main__"
+    if args:
+        code = LIST_MODULES + (
+            f"import runpy; sys.argv = ['ddt', *{list(args)!r}]; "
+            "runpy.run_module('ddt', run_name='__main__')"
+        )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return set(result.stderr.split())
+
+
+def test_entry_point_imports_lazily():
+    imported = imported_modules()
+    assert "ddt.__main__" in imported
+    assert [name for name in LAZY_MODULES if name in imported] == []
+    # everything else it needs comes with python.
+    packages = {name.partition(".")[0] for name in imported} - {"__main__"}
+    assert packages - sys.stdlib_module_names == {"ddt"}
+
+
+def test_text_scan_skips_html_and_image_dependencies(tmp_path: Path):
+    _ = (tmp_path / "a.txt").write_text("hello world\n")
+    imported = imported_modules(str(tmp_path), "--no-cache")
+    assert "tiktoken" in imported
+    assert "jinja2" not in imported
+    assert "PIL" not in imported
+
+    imported = imported_modules(str(tmp_path), "--no-cache", "--html")
+    assert "jinja2" in imported
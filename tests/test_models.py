@@ -1,8 +1,16 @@
+import io
+import json
 import os
-from pathlib import Path
+import shutil
 import string
 import sys
-from ddt import config, models
+import time
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from ddt import config, filters, models, tokenizer, watch
 from ddt.tokenizer import Model
 
 """
@@ -27,11 +35,20 @@ def test_tokencounter_init():
     )
     tc = models.TokenCounter(cfg)
     assert tc.config == cfg
-    assert tc.all_files == [file for file in Path(".").glob("**/*.*")]
+    assert tc.all_files == []
+    walked = [entry.path for entry in tc.walk()]
+    assert tc.all_files == walked
+    assert Path("LICENSE") in walked
+    assert not any(
+        part.startswith(".") for file in walked for part in file.parent.parts
+    )
+    gitignore = cfg.gitignore
+    assert gitignore is not None
+    assert not any(gitignore.matches(file.parent, is_dir=True) for file in walked)
     assert tc.ignored_files == dict()
     assert tc.scanned_files == dict()
-    assert tc.excluded_files == set()
-    assert tc.included_files == set()
+    assert tc.filters.excluded_extensions == set()
+    assert tc.filters.included_extensions == set()
     assert tc.total == 0
 
 
@@ -53,7 +70,7 @@ def test_tokencounter_to_dict():
     tc = models.TokenCounter(cfg)
     result = tc.to_dict()
     assert result["root"] == str(Path("."))
-    assert result["all_files"] == [file.name for file in Path(".").glob("**/*.*")]
+    assert result["all_files"] == [file.name for file in tc.all_files]
     assert result["ignored_files"] == dict()
     assert result["scanned_files"] == dict()
     assert result["total"] == 0
@@ -122,10 +139,12 @@ def test_tokencounter_add_exclusions():
     )
     tc = models.TokenCounter(cfg)
     tc.add_exclusions([])
-    assert tc.included_files == set()
+    assert tc.filters.excluded_extensions == set()
     exclusions = ["tape"]
     tc.add_exclusions(exclusions)
-    assert tc.excluded_files == {Path("assets/demo.tape").resolve()}
+    assert tc.filters.excluded_extensions == {"tape"}
+    assert tc.filter_file(Path("assets/demo.tape"))
+    assert not tc.filter_file(Path("assets/demo.gif"))
 
 
 def test_tokencounter_add_inclusions():
@@ -145,10 +164,36 @@ def test_tokencounter_add_inclusions():
     )
     tc = models.TokenCounter(cfg)
     tc.add_inclusions([])
-    assert tc.included_files == set()
-    inclusions = ["tape"]
+    assert tc.filters.included_extensions == set()
+    inclusions = [".tape"]
     tc.add_inclusions(inclusions)
-    assert tc.included_files == {Path("assets/demo.tape").resolve()}
+    assert tc.filters.included_extensions == {"tape"}
+    assert not tc.filter_file(Path("assets/demo.tape"))
+    assert tc.filter_file(Path("assets/demo.gif"))
+
+
+def test_tokencounter_add_path_exclusions():
+    cfg = config.Config(
+        Path("."),
+        True,
+        False,
+        False,
+        True,
+        False,
+        False,
+        Model("gpt-4o"),
+        sys.stdout,
+        "txt",
+        [],
+        [],
+    )
+    tc = models.TokenCounter(cfg)
+    tc.add_path_exclusions(["tests/**", "*.gif"])
+    walked = [entry.path for entry in tc.walk()]
+    assert not any(file.parts[0] == "tests" for file in walked)
+    assert Path("pyproject.toml") in walked
+    assert tc.filter_file(Path("assets/demo.gif"))
+    assert not tc.filter_file(Path("assets/demo.tape"))
 
 
 def test_tokencounter_count_text_file():
@@ -173,6 +218,38 @@ def test_tokencounter_count_text_file():
     assert count == 830
 
 
+def test_tokencounter_count_large_text_file(tmp_path: Path, monkeypatch):
+    text = "".join(
+        f"line {i}: ümlaut text;\r\n    indented {i}\n" for i in range(5_000)
+    )
+    large = tmp_path / "large.txt"
+    _ = large.write_bytes(text.encode())
+    expected = tokenizer.calculate_text_tokens(large.read_text(), "gpt-4o")
+    monkeypatch.setattr(models, "LARGE_FILE_BYTES", 1024)
+    monkeypatch.setattr(models, "CHUNK_BYTES", 1000)
+    for cache_dir in (None, tmp_path / "cache"):
+        cfg = config.Config(
+            tmp_path,
+            True,
+            False,
+            False,
+            False,
+            False,
+            False,
+            Model("gpt-4o"),
+            sys.stdout,
+            "txt",
+            [],
+            [],
+            cache_dir=cache_dir,
+        )
+        tc = models.TokenCounter(cfg)
+        assert tc.count_text_file(large) == expected
+        cache = tc.cache
+        if cache is not None:
+            cache.close()
+
+
 def test_tokencounter_count_image_file():
     cfg = config.Config(
         Path("."),
@@ -235,21 +312,20 @@ def test_tokencounter_filter_file():
 
     inclusions = ["json"]
     tc.add_inclusions(inclusions)
-    not_included = Path("output.json")
+    not_included = Path("tests/test_files/testfile.txt")
     inclusion_filtered = tc.filter_file(not_included)
     assert inclusion_filtered
-    assert tc.ignored_files[".json"] == [not_included]
-    tc.included_files = set()
+    assert tc.ignored_files[".txt"] == [not_included]
+    tc.filters = filters.FileFilter(cfg.root)
     tc.ignored_files = dict()
 
-    # TODO: figure out why this isn't getting flagged
     exclusions = ["html"]
     tc.add_exclusions(exclusions)
-    excluded_file = Path("output.html")
+    excluded_file = Path("tests/test_files/output.html")
     exclusion_filtered = tc.filter_file(excluded_file)
     assert exclusion_filtered
     assert tc.ignored_files[".html"] == [excluded_file]
-    tc.excluded_files = set()
+    tc.filters = filters.FileFilter(cfg.root)
     tc.ignored_files = dict()
 
     # dotfiles
@@ -335,6 +411,36 @@ def test_tokencounter_parse_files():
     assert tc.total == 22
 
 
+def test_tokencounter_parse_files_parallel():
+    counters: list[models.TokenCounter] = []
+    for jobs in [1, 2]:
+        cfg = config.Config(
+            Path("tests/test_files"),
+            True,
+            False,
+            False,
+            False,
+            True,
+            False,
+            Model("gpt-4o"),
+            sys.stdout,
+            "txt",
+            [],
+            [],
+            jobs=jobs,
+        )
+        tc = models.TokenCounter(cfg)
+        tc.parse_files()
+        counters.append(tc)
+    serial, parallel = counters
+    assert parallel.ignored_files == serial.ignored_files
+    assert parallel.scanned_files.keys() == serial.scanned_files.keys()
+    for extension, category in serial.scanned_files.items():
+        assert parallel.scanned_files[extension].files == category.files
+        assert parallel.scanned_files[extension].total == category.total
+    assert parallel.total == serial.total
+
+
 def test_tokencounter_grab_suffix():
     cfg = config.Config(
         Path("assets"),
@@ -462,3 +568,866 @@ def test_filecategory():
     assert fc.files == []
     assert fc.total == 0
     assert fc.to_dict() == {"total": 0, "files": []}
+
+
+def test_tokencounter_ndjson_output(tmp_path: Path):
+    for jobs in [1, 2]:
+        output = tmp_path / f"output{jobs}.ndjson"
+        with open(output, "w") as file:
+            cfg = config.Config(
+                Path("tests/test_files"),
+                False,
+                False,
+                False,
+                False,
+                False,
+                False,
+                Model("gpt-4o"),
+                file,
+                "ndjson",
+                [],
+                [],
+                jobs=jobs,
+            )
+            tc = models.TokenCounter(cfg)
+            tc.parse_files()
+            assert tc.all_files == []
+            assert tc.ignored_files == {}
+            assert tc.scanned_files[".txt"].files == []
+            tc.output()
+        with open(output) as f:
+            records = [json.loads(line) for line in f]
+        assert {
+            "type": "file",
+            "path": "tests/test_files/testfile.txt",
+            "extension": ".txt",
+            "tokens": 22,
+        } in records
+        assert {
+            "type": "ignored",
+            "path": "tests/test_files/test_image.jpeg",
+            "extension": ".jpeg",
+        } in records
+        assert records[-2:] == [
+            {"type": "extension", "extension": ".txt", "files": 1, "tokens": 22},
+            {"type": "total", "files": 1, "tokens": 22},
+        ]
+
+
+def test_tokencounter_iter_outputs_match_strings():
+    cfg = config.Config(
+        Path("tests/test_files"),
+        True,
+        False,
+        False,
+        False,
+        False,
+        False,
+        Model("gpt-4o"),
+        sys.stdout,
+        "txt",
+        [],
+        [],
+    )
+    tc = models.TokenCounter(cfg)
+    tc.parse_files()
+    chunks = list(tc.iter_text())
+    assert len(chunks) > 1
+    assert "".join(chunks) == tc.to_text()
+    assert "".join(tc.iter_html()) == tc.to_html()
+
+
+def test_tokencounter_estimate(tmp_path: Path, monkeypatch):
+    root = tmp_path / "tree"
+    root.mkdir()
+    for i in range(6):
+        _ = (root / f"file{i}.py").write_text(
+            f"def f{i}(x):\n    return x * {i}\n" * (i + 1)
+        )
+
+    def make_counter(estimate: bool) -> models.TokenCounter:
+        cfg = config.Config(
+            root,
+            False,
+            True,
+            False,
+            False,
+            False,
+            False,
+            Model("gpt-4o"),
+            sys.stdout,
+            "txt",
+            [],
+            [],
+            cache_dir=tmp_path / "cache",
+            estimate=estimate,
+        )
+        return models.TokenCounter(cfg)
+
+    exact = make_counter(False)
+    exact.parse_files()
+    assert exact.margin is None
+    assert (tmp_path / "cache" / "ratios.json").exists()
+
+    def no_reads(*args):
+        raise AssertionError("estimates must not read files")
+
+    monkeypatch.setattr(models.TokenCounter, "_prepare_text", no_reads)
+    estimated = make_counter(True)
+    estimated.parse_files()
+    assert estimated.scanned_files[".py"].count == 6
+    margin = estimated.margin
+    assert margin is not None
+    assert estimated.scanned_files[".py"].margin == margin
+    assert abs(estimated.total - exact.total) <= margin
+    assert f"(± {round(margin):,})" in estimated.to_text()
+    assert estimated.to_dict()["margin"] == round(margin)
+    assert " ± " in estimated.to_html()
+    summary = list(estimated.to_ndjson_summary())
+    assert summary[-1]["margin"] == round(margin)
+
+
+def test_tokencounter_sample(tmp_path: Path):
+    root = tmp_path / "tree"
+    root.mkdir()
+    for i in range(40):
+        words = [f"name_{n * i}" if n % 3 else "return" for n in range(i * 13 + 5)]
+        _ = (root / f"file{i:02}.py").write_text(" ".join(words))
+    _ = (root / "notes.md").write_text("A single note, always counted.\n")
+
+    def make_counter(**kwargs: Any) -> models.TokenCounter:
+        cfg = config.Config(
+            root,
+            False,
+            True,
+            False,
+            False,
+            False,
+            False,
+            Model("gpt-4o"),
+            sys.stdout,
+            "txt",
+            [],
+            [],
+            **kwargs,
+        )
+        counter = models.TokenCounter(cfg)
+        counter.parse_files()
+        return counter
+
+    exact = make_counter()
+    everything = make_counter(sample=1.0)
+    assert everything.total == exact.total
+    assert everything.margin is None
+
+    sampled = make_counter(sample=0.25)
+    category = sampled.scanned_files[".py"]
+    assert category.count == 40
+    drawn, margin = category.sampled, category.margin
+    assert drawn is not None and drawn <= 10
+    assert len(category.files) == drawn
+    assert margin is not None and sampled.margin is not None
+    assert margin > 0
+    assert abs(category.total - exact.scanned_files[".py"].total) <= 0.03 * exact.total
+    assert sampled.scanned_files[".md"].margin is None
+    assert sampled.scanned_files[".md"].total == exact.scanned_files[".md"].total
+    assert f"sampled {category.sampled} of 40 files" in sampled.to_text()
+    assert sampled.to_dict()["scanned_files"][".py"]["sampled"] == category.sampled
+    assert f"(sampled {category.sampled} of 40 files)" in sampled.to_html()
+    assert next(iter(sampled.to_ndjson_summary()))["sampled"] == category.sampled
+
+    timed = make_counter(sample_time=0.01)
+    assert timed.scanned_files[".py"].count == 40
+
+
+def test_tokencounter_sample_without_text(tmp_path: Path):
+    root = tmp_path / "tree"
+    root.mkdir()
+    for i in range(30):
+        _ = (root / f"empty{i:02}.txt").write_text("")
+        _ = (root / f"blob{i:02}.dat").write_bytes(b"\0\1" * (i + 1))
+    _ = (root / "text00.dat").write_text("only the one text file\n")
+
+    def make_counter(**kwargs: Any) -> models.TokenCounter:
+        cfg = config.Config(
+            root,
+            False,
+            True,
+            False,
+            False,
+            False,
+            False,
+            Model("gpt-4o"),
+            sys.stdout,
+            "txt",
+            [],
+            [],
+            **kwargs,
+        )
+        counter = models.TokenCounter(cfg)
+        counter.parse_files()
+        return counter
+
+    exact = make_counter()
+    sampled = make_counter(sample=0.1)
+    # a stratum of empty files has nothing to draw, and its total is exact.
+    assert sampled.scanned_files[".txt"].count == 30
+    assert sampled.scanned_files[".txt"].total == 0
+    assert sampled.scanned_files[".txt"].margin is None
+    # drawn files that turn out to be binary are only listed as ignored.
+    category = sampled.scanned_files[".dat"]
+    ignored = sampled.ignored_files[".dat"]
+    assert ignored
+    assert not {root / file["file"] for file in category.files} & set(ignored)
+    assert category.count + len(ignored) == 31
+    assert exact.scanned_files[".dat"].count == 1
+
+
+def test_tokencounter_skips_binary_files(tmp_path: Path):
+    _ = (tmp_path / "text.txt").write_text("hello there\n")
+    _ = (tmp_path / "program").write_bytes(b"\x7fELF\x02\x01\x01\x00" + bytes(64))
+    _ = (tmp_path / "library.so").write_text("not opened, so never seen as text")
+    for cache_dir in (None, tmp_path / "cache", tmp_path / "cache"):
+        cfg = config.Config(
+            tmp_path,
+            False,
+            True,
+            False,
+            False,
+            False,
+            False,
+            Model("gpt-4o"),
+            sys.stdout,
+            "txt",
+            [],
+            [],
+            cache_dir=cache_dir,
+        )
+        tc = models.TokenCounter(cfg)
+        tc.add_path_exclusions(["cache/"])
+        tc.parse_files()
+        assert list(tc.scanned_files) == [".txt"]
+        assert tc.ignored_files[""] == [tmp_path / "program"]
+        assert tc.ignored_files[".so"] == [tmp_path / "library.so"]
+        assert tc.count_text_file(tmp_path / "program") == 0
+        cache = tc.cache
+        if cache is not None:
+            cache.close()
+
+
+def test_tokencounter_git_mode(tmp_path: Path, monkeypatch):
+    import subprocess
+
+    def git(cwd: Path, *args: str) -> None:
+        _ = subprocess.run(
+            ["git", "-c", "user.name=t", "-c", "user.email=t@example.com", *args],
+            cwd=cwd,
+            check=True,
+            capture_output=True,
+        )
+
+    repo = tmp_path / "repo"
+    (repo / "vendor").mkdir(parents=True)
+    git(repo, "init", "-q")
+    _ = (repo / "main.py").write_text("print('tracked')\n")
+    _ = (repo / "vendor" / "lib.py").write_text("print('vendored')\n")
+    _ = (repo / ".gitignore").write_text("main.py\n")
+    git(repo, "add", "-f", ".")
+    git(repo, "commit", "-q", "-m", "initial")
+    _ = (repo / "untracked.py").write_text("print('untracked')\n")
+    git(tmp_path, "clone", "-q", str(repo), "clone")
+
+    def make_counter(root: Path) -> models.TokenCounter:
+        cfg = config.Config(
+            root,
+            False,
+            False,
+            False,
+            False,
+            False,
+            False,
+            Model("gpt-4o"),
+            sys.stdout,
+            "txt",
+            [],
+            [],
+            cache_dir=tmp_path / "cache",
+            git=True,
+        )
+        counter = models.TokenCounter(cfg)
+        counter.add_path_exclusions(["vendor/"])
+        counter.parse_files()
+        return counter
+
+    first = make_counter(repo)
+    # tracked files count even when gitignored, and untracked files never do.
+    assert first.all_files == [repo / ".gitignore", repo / "main.py"]
+    assert [file["file"] for file in first.scanned_files[".py"].files] == ["main.py"]
+
+    def no_tokenizing(self, texts: list[str]) -> list[int]:
+        assert not texts, "the clone's blobs should come from the cache"
+        return []
+
+    monkeypatch.setattr(tokenizer.TokenizerEngine, "count_batch", no_tokenizing)
+    second = make_counter(tmp_path / "clone")
+    assert second.total == first.total
+
+    with pytest.raises(SystemExit):
+        _ = config.Config(
+            tmp_path,
+            False,
+            False,
+            False,
+            False,
+            False,
+            False,
+            Model("gpt-4o"),
+            sys.stdout,
+            "txt",
+            [],
+            [],
+            git=True,
+        )
+
+
+def test_tokencounter_since(tmp_path: Path):
+    import subprocess
+
+    def git(*args: str) -> None:
+        _ = subprocess.run(
+            ["git", "-c", "user.name=t", "-c", "user.email=t@example.com", *args],
+            cwd=tmp_path,
+            check=True,
+            capture_output=True,
+        )
+
+    engine = tokenizer.TokenizerEngine(Model("gpt-4o"))
+    git("init", "-q")
+    _ = (tmp_path / "changed.py").write_text("print('before')\n")
+    _ = (tmp_path / "deleted.py").write_text("x = [1, 2, 3]\n")
+    _ = (tmp_path / "same.py").write_text("y = 2\n")
+    git("add", ".")
+    git("commit", "-q", "-m", "initial")
+    _ = (tmp_path / "changed.py").write_text("print('after, with more words')\n")
+    _ = (tmp_path / "added.md").write_text("# a new file\n")
+    (tmp_path / "deleted.py").unlink()
+
+    cfg = config.Config(
+        tmp_path,
+        False,
+        False,
+        False,
+        False,
+        False,
+        False,
+        Model("gpt-4o"),
+        sys.stdout,
+        "json",
+        [],
+        [],
+        cache_dir=tmp_path / ".cache",
+        since="HEAD",
+    )
+    tc = models.TokenCounter(cfg)
+    tc.parse_files()
+    result = tc.to_dict()
+
+    before = engine.count("print('before')\n") + engine.count("x = [1, 2, 3]\n")
+    now = engine.count("print('after, with more words')\n") + engine.count(
+        "# a new file\n"
+    )
+    assert result["before"] == before
+    assert result["delta"] == now - before
+    files = {file["file"]: file for file in result["scanned_files"][".py"]["files"]}
+    assert sorted(files) == ["changed.py", "deleted.py"]
+    assert files["deleted.py"] == {
+        "file": "deleted.py",
+        "tokens": 0,
+        "before": engine.count("x = [1, 2, 3]\n"),
+    }
+    assert result["scanned_files"][".md"]["before"] == 0
+    assert "grand total: " in tc.to_text() and "(was " in tc.to_text()
+
+    with pytest.raises(SystemExit):
+        _ = config.Config(
+            tmp_path,
+            False,
+            False,
+            False,
+            False,
+            False,
+            False,
+            Model("gpt-4o"),
+            sys.stdout,
+            "txt",
+            [],
+            [],
+            since="no-such-rev",
+        )
+
+
+def test_tokencounter_update(tmp_path: Path):
+    engine = tokenizer.TokenizerEngine(Model("gpt-4o"))
+    (tmp_path / "pkg").mkdir()
+    _ = (tmp_path / "main.py").write_text("print('hi')\n")
+    _ = (tmp_path / "pkg" / "a.py").write_text("x = 1\n")
+    _ = (tmp_path / "pkg" / "b.py").write_text("y = 2\n")
+    _ = (tmp_path / "notes.md").write_text("# notes\n")
+
+    output = io.StringIO()
+    cfg = config.Config(
+        tmp_path,
+        False,
+        False,
+        False,
+        False,
+        False,
+        False,
+        Model("gpt-4o"),
+        output,
+        "txt",
+        [],
+        [],
+        watch=True,
+    )
+    tc = models.TokenCounter(cfg)
+    tc.parse_files()
+    names = [file["file"] for file in tc.scanned_files[".py"].files]
+
+    # an edit keeps the file's place, and a file that didn't change is left alone.
+    _ = (tmp_path / "main.py").write_text("print('hello, world, again')\n")
+    assert watch.update(tc, [tmp_path / "main.py"])
+    assert [file["file"] for file in tc.scanned_files[".py"].files] == names
+
+    # a deleted directory drops every file counted below it.
+    (tmp_path / "pkg" / "a.py").unlink()
+    (tmp_path / "pkg" / "b.py").unlink()
+    (tmp_path / "pkg").rmdir()
+    (tmp_path / "notes.md").unlink()
+    _ = (tmp_path / "new.py").write_text("z = [1, 2]\n")
+    assert watch.update(
+        tc, [tmp_path / "pkg", tmp_path / "notes.md", tmp_path / "new.py"]
+    )
+
+    expected = engine.count("print('hello, world, again')\n") + engine.count(
+        "z = [1, 2]\n"
+    )
+    assert tc.total == expected
+    assert tc.scanned_files[".py"].total == expected
+    assert tc.scanned_files[".py"].count == 2
+    assert ".md" not in tc.scanned_files
+    assert sorted(tc.all_files) == [tmp_path / "main.py", tmp_path / "new.py"]
+
+    fresh = models.TokenCounter(cfg)
+    fresh.parse_files()
+    assert fresh.to_dict() == tc.to_dict()
+
+    tc.refresh_output()
+    assert f"grand total: {expected:,}\n" in output.getvalue()
+
+
+def test_tokencounter_update_gitignore(tmp_path: Path):
+    (tmp_path / "pkg" / "build").mkdir(parents=True)
+    _ = (tmp_path / "main.py").write_text("print('hi')\n")
+    _ = (tmp_path / "pkg" / "a.py").write_text("x = 1\n")
+    _ = (tmp_path / "pkg" / "build" / "gen.py").write_text("y = 2\n")
+    _ = (tmp_path / "pkg" / ".gitignore").write_text("build/\n")
+
+    def scan() -> models.TokenCounter:
+        cfg = config.Config(
+            tmp_path,
+            False,
+            False,
+            False,
+            False,
+            False,
+            False,
+            Model("gpt-4o"),
+            io.StringIO(),
+            "json",
+            [],
+            [],
+            watch=True,
+        )
+        counter = models.TokenCounter(cfg)
+        counter.parse_files()
+        return counter
+
+    def python_files(counter: models.TokenCounter) -> list[str]:
+        return sorted(file["file"] for file in counter.scanned_files[".py"].files)
+
+    tc = scan()
+    assert python_files(tc) == ["a.py", "main.py"]
+
+    # an edited .gitignore is read again, and its directory recounted under the new rules.
+    _ = (tmp_path / "pkg" / ".gitignore").write_text("a.py\n")
+    assert watch.update(tc, [tmp_path / "pkg" / ".gitignore"])
+    assert python_files(tc) == ["gen.py", "main.py"]
+    assert tc.total == scan().total
+
+    (tmp_path / "pkg" / ".gitignore").unlink()
+    assert watch.update(tc, [tmp_path / "pkg" / ".gitignore"])
+    assert python_files(tc) == ["a.py", "gen.py", "main.py"]
+    assert tc.total == scan().total
+
+
+def test_tokencounter_multiple_models(tmp_path: Path, monkeypatch):
+    texts = {
+        "main.py": "def main():\n    print('hello, world')\n",
+        "notes.md": "# Notes\n\nSome prose, with punctuation!\n",
+        "big.txt": "lorem ipsum dolor sit amet\n" * 40,
+    }
+    for name, text in texts.items():
+        _ = (tmp_path / "tree" / name).parent.mkdir(exist_ok=True)
+        _ = (tmp_path / "tree" / name).write_text(text)
+    models_ = [Model("gpt-4o"), Model("gpt-4"), Model("gpt-3.5-turbo")]
+    engines = {model: tokenizer.TokenizerEngine(model) for model in models_}
+
+    def make_counter(jobs: int = 1) -> models.TokenCounter:
+        cfg = config.Config(
+            tmp_path / "tree",
+            False,
+            False,
+            False,
+            False,
+            False,
+            False,
+            models_[0],
+            sys.stdout,
+            "json",
+            [],
+            [],
+            jobs=jobs,
+            cache_dir=tmp_path / "cache",
+            models=models_,
+        )
+        counter = models.TokenCounter(cfg)
+        counter.parse_files()
+        return counter
+
+    # the big file is read in chunks, once for every encoding.
+    monkeypatch.setattr(models, "LARGE_FILE_BYTES", 100)
+    tc = make_counter()
+    assert len(tc.engines) == 2
+    result = tc.to_dict()
+    for name, text in texts.items():
+        category = result["scanned_files"][Path(name).suffix]
+        assert category["files"][0]["models"] == {
+            model: engines[model].count(text) for model in models_
+        }
+        assert category["models"] == category["files"][0]["models"]
+        assert category["files"][0]["tokens"] == engines[models_[0]].count(text)
+    assert result["models"] == {
+        model: sum(engines[model].count(text) for text in texts.values())
+        for model in models_
+    }
+    assert result["total"] == result["models"]["gpt-4o"]
+    assert f"(gpt-4: {result['models']['gpt-4']:,}, gpt-3.5-turbo: " in tc.to_text()
+    assert "gpt-3.5-turbo: " in tc.to_html()
+
+    # every encoding's count comes from the cache, or from the pool, the same way.
+    def no_tokenizing(self, texts: list[str]) -> list[int]:
+        assert not texts, "every count should come from the cache"
+        return []
+
+    with monkeypatch.context() as patched:
+        patched.setattr(tokenizer.TokenizerEngine, "count_batch", no_tokenizing)
+        assert make_counter().to_dict() == result
+    shutil.rmtree(tmp_path / "cache")
+    assert make_counter(jobs=2).to_dict() == result
+
+
+def test_tokencounter_dedupes_identical_files(tmp_path: Path, monkeypatch):
+    vendored = "function add(a, b) {\n  return a + b;\n}\n" * 20
+    for directory in ("a", "b", "c"):
+        (tmp_path / "tree" / directory).mkdir(parents=True)
+        _ = (tmp_path / "tree" / directory / "lib.js").write_text(vendored)
+    # same size, different content.
+    _ = (tmp_path / "tree" / "a" / "other.js").write_text(
+        vendored.replace("a + b", "b + a")
+    )
+    _ = (tmp_path / "tree" / "main.py").write_text("print('unique')\n")
+
+    tokenized: list[str] = []
+    count_batch = tokenizer.TokenizerEngine.count_batch
+
+    def recording(self, texts: list[str]) -> list[int]:
+        tokenized.extend(texts)
+        return count_batch(self, texts)
+
+    monkeypatch.setattr(tokenizer.TokenizerEngine, "count_batch", recording)
+
+    def make_counter(cache_dir: Path | None = None) -> models.TokenCounter:
+        cfg = config.Config(
+            tmp_path / "tree",
+            False,
+            False,
+            False,
+            False,
+            False,
+            False,
+            Model("gpt-4o"),
+            sys.stdout,
+            "json",
+            [],
+            [],
+            cache_dir=cache_dir,
+            duplicates=True,
+        )
+        counter = models.TokenCounter(cfg)
+        counter.parse_files()
+        return counter
+
+    tc = make_counter()
+    assert tokenized.count(vendored) == 1
+    tokens = tokenizer.TokenizerEngine("gpt-4o").count(vendored)
+    assert [file["tokens"] for file in tc.scanned_files[".js"].files] == [tokens] * 4
+    report = tc.duplicate_report()
+    assert report["files"] == 2
+    assert report["tokens"] == 2 * tokens
+    assert report["groups"] == [
+        {
+            "file": str(tmp_path / "tree" / "a" / "lib.js"),
+            "copies": [
+                str(tmp_path / "tree" / "b" / "lib.js"),
+                str(tmp_path / "tree" / "c" / "lib.js"),
+            ],
+            "tokens": tokens,
+        }
+    ]
+    assert tc.to_dict()["duplicates"] == report
+    assert f"duplicated tokens: {2 * tokens:,} in 2 files" in tc.to_text()
+    assert "Duplicated Tokens" in tc.to_html()
+
+    # counts from a warm cache still find the copies.
+    for _ in range(2):
+        tokenized.clear()
+        cached = make_counter(tmp_path / "cache")
+        assert cached.duplicate_report() == report
+        assert cached.total == tc.total
+    assert not tokenized
+
+    # large files are hashed as a stream instead.
+    monkeypatch.setattr(models, "LARGE_FILE_BYTES", 100)
+    tokenized.clear()
+    large = make_counter()
+    assert large.duplicate_report() == report
+    assert large.total == tc.total
+
+
+def test_tokencounter_read_ahead(tmp_path: Path, monkeypatch):
+    import threading
+
+    for index in range(40):
+        directory = tmp_path / "tree" / f"d{index % 4}"
+        directory.mkdir(parents=True, exist_ok=True)
+        _ = (directory / f"f{index}.py").write_text(f"x = {index}\n" * (index + 1))
+    _ = (tmp_path / "tree" / "d0" / "data.bin").write_bytes(b"\0" * 10)
+    _ = (tmp_path / "tree" / "d1" / "blob.txt").write_bytes(b"\0\1" * 10)
+
+    def make_counter(read_ahead: int, cache_dir: Path | None) -> models.TokenCounter:
+        cfg = config.Config(
+            tmp_path / "tree",
+            False,
+            False,
+            False,
+            False,
+            False,
+            False,
+            Model("gpt-4o"),
+            sys.stdout,
+            "json",
+            [],
+            [],
+            cache_dir=cache_dir,
+            read_ahead=read_ahead,
+        )
+        counter = models.TokenCounter(cfg)
+        counter.parse_files()
+        return counter
+
+    expected = make_counter(0, None).to_dict()
+
+    threads: set[str] = set()
+    read_unless_binary = models.binary.read_unless_binary
+
+    def reading(file: Path) -> bytes | None:
+        threads.add(threading.current_thread().name)
+        return read_unless_binary(file)
+
+    monkeypatch.setattr(models.binary, "read_unless_binary", reading)
+
+    assert make_counter(4, None).to_dict() == expected
+    assert threads and all(name.startswith("ddt-read") for name in threads)
+
+    # cached files aren't read at all.
+    assert make_counter(4, tmp_path / "cache").to_dict() == expected
+    threads.clear()
+    assert make_counter(4, tmp_path / "cache").to_dict() == expected
+    assert not threads
+
+
+def test_tokencounter_archive(tmp_path: Path, monkeypatch):
+    import tarfile
+    import zipfile
+
+    monkeypatch.setattr(models, "LARGE_FILE_BYTES", 1024)
+    monkeypatch.setattr(models, "CHUNK_BYTES", 100)
+    tree = tmp_path / "tree"
+    (tree / "src").mkdir(parents=True)
+    (tree / ".hidden").mkdir()
+    _ = (tree / "src" / "main.py").write_text("print('hello world')\n")
+    _ = (tree / "src" / "copy.py").write_text("print('hello world')\n")
+    _ = (tree / "notes.md").write_text("word " * 1000)
+    _ = (tree / ".hidden" / "secret.txt").write_text("secret")
+    _ = (tree / "blob.txt").write_bytes(b"\0\1" * 10)
+    _ = (tree / "lib.so").write_bytes(b"ELF")
+
+    tarball = tmp_path / "tree.tar.gz"
+    with tarfile.open(tarball, "w:gz") as tar:
+        for file in sorted(tree.rglob("*")):
+            tar.add(file, arcname=file.relative_to(tree).as_posix(), recursive=False)
+    zipped = tmp_path / "tree.zip"
+    with zipfile.ZipFile(zipped, "w") as zip_file:
+        for file in sorted(tree.rglob("*")):
+            zip_file.write(file, file.relative_to(tree).as_posix())
+
+    def make_counter(root: Path, cache_dir: Path | None = None) -> models.TokenCounter:
+        cfg = config.Config(
+            root,
+            False,
+            False,
+            False,
+            False,
+            False,
+            False,
+            Model("gpt-4o"),
+            sys.stdout,
+            "json",
+            [],
+            [],
+            cache_dir=cache_dir,
+            duplicates=True,
+        )
+        counter = models.TokenCounter(cfg)
+        counter.parse_files()
+        return counter
+
+    def summary(counter: models.TokenCounter) -> dict[str, Any]:
+        return {
+            ext: sorted((entry["file"], entry["tokens"]) for entry in category.files)
+            for ext, category in counter.scanned_files.items()
+        } | {
+            "ignored": sorted(
+                path.name for paths in counter.ignored_files.values() for path in paths
+            ),
+            "total": counter.total,
+        }
+
+    expected = summary(make_counter(tree))
+    assert expected["total"] > 1000
+    for archive in (tarball, zipped):
+        counter = make_counter(archive)
+        assert summary(counter) == expected
+        assert archive / "src" / "main.py" in counter.all_files
+        report = counter.duplicate_report()
+        assert report["tokens"] == 5
+        # counts are cached by content, so a second scan reads the same totals.
+        cached = make_counter(archive, tmp_path / "cache")
+        assert summary(cached) == expected
+        assert summary(make_counter(archive, tmp_path / "cache")) == expected
+
+
+def test_tokencounter_profile(tmp_path: Path):
+    for index in range(20):
+        _ = (tmp_path / f"f{index}.py").write_text(f"x = {index}\n" * (index + 1))
+    _ = (tmp_path / "blob.txt").write_bytes(b"\0\1" * 10)
+
+    def make_counter(**kwargs) -> models.TokenCounter:
+        cfg = config.Config(
+            tmp_path,
+            False,
+            False,
+            False,
+            False,
+            False,
+            False,
+            Model("gpt-4o"),
+            io.StringIO(),
+            "json",
+            [],
+            [],
+            **kwargs,
+        )
+        return models.TokenCounter(cfg)
+
+    plain = make_counter()
+    plain.parse_files()
+    assert plain.profiler is None
+
+    counter = make_counter(profile_json=tmp_path / "profile.json")
+    assert counter.config.profile
+    with counter.profiled():
+        counter.parse_files()
+    counter.write_profile()
+    assert counter.to_dict() == plain.to_dict()
+
+    report = json.loads((tmp_path / "profile.json").read_text())
+    assert {"walk", "filter", "read", "tokenize"} <= set(report["stages"])
+    assert report["files"] == 20
+    assert report["tokens"] == plain.total
+    assert report["bytes_read"] == sum(
+        file.stat().st_size for file in tmp_path.glob("f*.py")
+    )
+    assert len(report["slowest_files"]) == 10
+
+
+def test_tokencounter_progress(tmp_path: Path, monkeypatch, capsys):
+    for index in range(30):
+        _ = (tmp_path / f"f{index}.py").write_text(f"x = {index}\n" * (index + 1))
+    monkeypatch.setattr(models.progress, "UPDATE_SECONDS", 0.0)
+
+    def make_counter(**kwargs) -> models.TokenCounter:
+        cfg = config.Config(
+            tmp_path,
+            False,
+            False,
+            False,
+            False,
+            False,
+            False,
+            Model("gpt-4o"),
+            io.StringIO(),
+            "json",
+            [],
+            [],
+            **kwargs,
+        )
+        counter = models.TokenCounter(cfg)
+        counter.parse_files()
+        return counter
+
+    expected = make_counter().to_dict()
+    assert capsys.readouterr().err == ""
+    for jobs in (1, 2):
+        assert make_counter(progress=True, jobs=jobs).to_dict() == expected
+        err = capsys.readouterr().err
+        assert "/30 files" in err
+        assert "30/30 files" in err
+        assert err.endswith("\r\x1b[K")
+
+    # the serial scan starts counting before the walk is over, and the walk finishes first.
+    monkeypatch.setattr(models, "PENDING_FILES", 1)
+    advance = models.progress.Progress.advance
+
+    def slow_advance(bar: models.progress.Progress, size: int, tokens: int) -> None:
+        deadline = time.monotonic() + 5
+        while bar.walking and time.monotonic() < deadline:
+            time.sleep(0.001)
+        advance(bar, size, tokens)
+
+    monkeypatch.setattr(models.progress.Progress, "advance", slow_advance)
+    _ = make_counter(progress=True)
+    err = capsys.readouterr().err
+    assert "+ files" not in err and "still walking" not in err
+    assert "1/30 files" in err and "ETA" in err
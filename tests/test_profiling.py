@@ -0,0 +1,64 @@
+import io
+import json
+import pstats
+import time
+from pathlib import Path
+
+import pytest
+
+from ddt import profiling
+
+
+def test_profiler_stages_are_exclusive():
+    profiler = profiling.Profiler()
+    with profiler.span():
+        with profiler.stage("walk"):
+            time.sleep(0.02)
+            with profiler.stage("gitignore"):
+                time.sleep(0.05)
+        items = list(profiler.timed("read", iter([1, 2, 3])))
+    assert items == [1, 2, 3]
+
+    report = profiler.report()
+    stages = report["stages"]
+    assert list(stages) == ["walk", "gitignore", "read", "other"]
+    assert 0.02 <= stages["walk"]["wall_seconds"] < 0.05
+    assert stages["gitignore"]["wall_seconds"] >= 0.05
+    total = sum(stage["wall_seconds"] for stage in stages.values())
+    assert abs(total - report["wall_seconds"]) < 0.005
+
+
+def test_profiler_files():
+    profiler = profiling.Profiler(slowest=2)
+    small, large, other = Path("small.py"), Path("large.py"), Path("other.py")
+    profiler.read(small, 10)
+    profiler.read(large, 3000)
+    with profiler.file(other):
+        time.sleep(0.01)
+    profiler.share({small: 1, large: 3}, 0.04)
+    profiler.files, profiler.tokens = 3, 500
+
+    report = profiler.report()
+    assert report["bytes_read"] == 3010
+    assert [entry["path"] for entry in report["slowest_files"]] == [
+        "large.py",
+        "other.py",
+    ]
+    assert report["slowest_files"][0]["seconds"] == pytest.approx(0.03)
+    assert report["slowest_files"][0]["bytes"] == 3000
+
+    text = io.StringIO()
+    profiler.write(text)
+    assert "large.py (2.9KiB): 0.030s" in text.getvalue()
+    as_json = io.StringIO()
+    profiler.write(as_json, as_json=True)
+    assert json.loads(as_json.getvalue())["files"] == 3
+
+
+def test_cprofile(tmp_path: Path):
+    with profiling.cprofile(None):
+        pass
+    with profiling.cprofile(tmp_path / "scan.pstats"):
+        _ = sorted(range(1000), key=str)
+    stats = pstats.Stats(str(tmp_path / "scan.pstats")).get_stats_profile()
+    assert stats.func_profiles
@@ -0,0 +1,61 @@
+import io
+
+from ddt import progress
+
+
+def test_progress_line(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(progress.time, "monotonic", lambda: now[0])
+    stream = io.StringIO()
+    bar = progress.Progress(stream, files=4, size=4_000_000, interval=1.0)
+
+    bar.advance(500_000, 100)
+    assert stream.getvalue() == ""
+    now[0] += 1.0
+    bar.advance(500_000, 100)
+    assert stream.getvalue() == "\r\x1b[K2/4 files, 1.0/4.0 MB"
+
+    now[0] += 0.5
+    bar.advance(1_000_000, 300)
+    # not due yet: nothing is redrawn between updates.
+    assert stream.getvalue().count("\r") == 1
+    now[0] += 0.5
+    bar.advance(1_000_000, 300)
+    assert bar.bytes_per_second == 2_000_000
+    assert stream.getvalue().endswith(
+        "\r\x1b[K4/4 files, 3.0/4.0 MB, 2.0 MB/s, 600 tokens/s, ETA 0s"
+    )
+
+    bar.finish()
+    assert stream.getvalue().endswith("\r\x1b[K")
+
+
+def test_progress_while_walking(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(progress.time, "monotonic", lambda: now[0])
+    stream = io.StringIO()
+    bar = progress.Progress(stream, 0, 0, interval=1.0, walking=True)
+    for _ in range(3):
+        bar.discover(1_000_000)
+
+    now[0] += 1.0
+    bar.advance(1_000_000, 100)
+    now[0] += 1.0
+    bar.advance(1_000_000, 100)
+    assert stream.getvalue().endswith(
+        "\r\x1b[K2/3+ files, 2.0/3.0+ MB, 1.0 MB/s, 100 tokens/s, still walking"
+    )
+
+    bar.discover(1_000_000)
+    bar.walked()
+    now[0] += 1.0
+    bar.advance(1_000_000, 100)
+    assert stream.getvalue().endswith(
+        "\r\x1b[K3/4 files, 3.0/4.0 MB, 1.0 MB/s, 100 tokens/s, ETA 1s"
+    )
+
+
+def test_progress_duration():
+    assert progress._duration(9.6) == "10s"
+    assert progress._duration(185) == "3m05s"
+    assert progress._duration(7_380) == "2h03m"
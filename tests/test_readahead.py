@@ -0,0 +1,40 @@
+from pathlib import Path
+
+import pytest
+
+from ddt import readahead
+
+
+def test_read_ahead_budget(tmp_path: Path):
+    files = []
+    for index in range(4):
+        file = tmp_path / f"{index}.txt"
+        _ = file.write_text(str(index) * 100)
+        files.append(file)
+    binary_file = tmp_path / "blob.txt"
+    _ = binary_file.write_bytes(b"\0\1\2" * 10)
+
+    reader = readahead.ReadAhead(threads=2, max_bytes=250)
+    try:
+        assert reader.max_files == 2 * readahead.FILES_PER_THREAD
+        assert reader.has_room(1_000), "a single file may always go ahead"
+        reader.submit(files[0], 100)
+        reader.submit(files[1], 100)
+        assert not reader.has_room(100)
+        assert reader.has_room(50)
+        assert files[0] in reader
+
+        assert reader.take(files[0]) == b"0" * 100
+        assert files[0] not in reader
+        assert reader.has_room(100)
+        reader.discard(files[1])
+        reader.discard(files[1])
+        assert files[1] not in reader
+
+        reader.submit(binary_file, 30)
+        assert reader.take(binary_file) is None
+        reader.submit(tmp_path / "missing.txt", 10)
+        with pytest.raises(OSError):
+            _ = reader.take(tmp_path / "missing.txt")
+    finally:
+        reader.close()
@@ -0,0 +1,67 @@
+import random
+from pathlib import Path
+
+from ddt import sampling
+
+
+def make_stratum(sizes: list[int]) -> sampling.Stratum:
+    stratum = sampling.Stratum(".txt")
+    for i, size in enumerate(sizes):
+        stratum.add(Path(f"file{i}.txt"), size)
+    return stratum
+
+
+def test_draw_is_proportional_to_size():
+    stratum = make_stratum([0, 100, 300])
+    rng = random.Random(1)
+    draws = [stratum.draw(rng) for _ in range(4000)]
+    assert 0 not in draws
+    assert 2700 < draws.count(2) < 3300
+
+
+def test_complete_stratum_is_exact():
+    stratum = make_stratum([0, 10, 20])
+    stratum.observe(1, 3)
+    assert not stratum.complete
+    stratum.observe(2, 5)
+    assert stratum.complete
+    assert stratum.total() == 8
+    assert stratum.variance() == 0.0
+
+
+def test_draw_from_empty_files():
+    stratum = make_stratum([0, 0, 0])
+    rng = random.Random(1)
+    assert {stratum.draw(rng) for _ in range(100)} == {0, 1, 2}
+    assert stratum.complete
+
+
+def test_discard():
+    stratum = make_stratum([0, 10, 30])
+    stratum.discard(2)
+    assert stratum.bytes == 10
+    assert stratum.discarded == 1
+    assert {stratum.draw(random.Random(seed)) for seed in range(20)} == {1}
+    stratum.observe(1, 4)
+    assert stratum.complete
+    assert stratum.total() == 4
+
+
+def test_estimate_from_draws():
+    stratum = make_stratum([100, 200, 300, 400])
+    tokens = [25, 50, 75, 100]
+    for index in [3, 1, 3]:
+        stratum.observe(index, tokens[index])
+    # every file has the same tokens per byte, so the estimate is exact and certain.
+    assert stratum.total() == 250
+    assert stratum.variance() == 0.0
+
+    stratum.observe(0, 50)
+    assert stratum.total() == 1000 * (0.25 * 3 + 0.5) / 4
+    assert stratum.variance() > 0
+
+
+def test_draws_for():
+    stratum = make_stratum([1] * 50)
+    assert stratum.draws_for(0.01) == sampling.MIN_DRAWS
+    assert stratum.draws_for(0.1) == 5
@@ -1,6 +1,18 @@
-from ddt import tokenizer
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from collections.abc import Callable
+from pathlib import Path
 from typing import TypedDict
 
+import pytest
+import tiktoken.load
+import tiktoken.registry
+
+from ddt import __main__, cli, tokenizer
+
 
 # TODO: update these two tests - they ONLY work for the default model of gpt-4o
 def test_calclate_known_text_tokens():
@@ -56,3 +68,175 @@ def test_calculate_known_image_tokens():
             tokenizer.calculate_image_tokens(case["width"], case["height"])
             == case["total"]
         )
+
+
+def test_get_encoding_is_cached():
+    assert tokenizer.get_encoding("gpt-4o") is tokenizer.get_encoding("gpt-4o")
+    # models sharing an encoding share the loaded one.
+    assert tokenizer.get_encoding("gpt-4o") is tokenizer.get_encoding("o1")
+
+
+def downloader(downloads: list[str]) -> Callable[[str], bytes]:
+    """
+    Returns a stand-in for tiktoken's download, serving the files it already downloaded and
+    recording each one asked for in `downloads`.
+    """
+    source = Path(
+        os.environ.get(tokenizer.VOCAB_DIR_ENV)
+        or Path(tempfile.gettempdir()) / "data-gym-cache"
+    )
+
+    def download(blobpath: str) -> bytes:
+        downloads.append(blobpath)
+        return (source / hashlib.sha1(blobpath.encode()).hexdigest()).read_bytes()
+
+    return download
+
+
+def offline(blobpath: str) -> bytes:
+    raise OSError("network is unreachable")
+
+
+def fresh_process(
+    monkeypatch: pytest.MonkeyPatch, read_file: Callable[[str], bytes]
+) -> None:
+    """
+    Forgets every loaded encoding, as a new process would, and downloads with `read_file`.
+    """
+    monkeypatch.setattr(tiktoken.load, "read_file", read_file)
+    monkeypatch.setattr(tiktoken.registry, "ENCODINGS", {})
+    monkeypatch.setattr(tokenizer, "_ENCODINGS", {})
+
+
+def test_warm_fills_the_vocab_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    expected = tokenizer.get_encoding("gpt-4o").encode("hello world")
+    downloads: list[str] = []
+    download = downloader(downloads)
+
+    vocab_dir = tmp_path / "vocab"
+    monkeypatch.setenv(tokenizer.VOCAB_DIR_ENV, str(vocab_dir))
+    fresh_process(monkeypatch, download)
+    assert tokenizer.warm(["gpt-4o", "o1"]) == ["o200k_base"]
+    assert len(downloads) == 1
+    assert len(list(vocab_dir.iterdir())) == 1
+
+    fresh_process(monkeypatch, offline)
+    assert tokenizer.get_encoding("o1").encode("hello world") == expected
+
+    tokenizer.use_vocab_dir(tmp_path / "empty")
+    fresh_process(monkeypatch, offline)
+    with pytest.raises(tokenizer.VocabularyError, match="o200k_base"):
+        _ = tokenizer.get_encoding("gpt-4o")
+
+
+def test_scan_loads_what_cache_warm_downloaded(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    expected = tokenizer.TokenizerEngine("gpt-4o").count("hello world\n")
+    downloads: list[str] = []
+    download = downloader(downloads)
+    # neither ddt's nor tiktoken's default directory has anything in it yet.
+    monkeypatch.delenv(tokenizer.VOCAB_DIR_ENV, raising=False)
+    monkeypatch.delenv("DATA_GYM_CACHE_DIR", raising=False)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "xdg"))
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path / "tmp"))
+
+    fresh_process(monkeypatch, download)
+    args = cli.setup_cache_argparse().parse_args(["warm", "-m", "gpt-4o"])
+    assert __main__.cache_command(args) == 0
+    assert len(downloads) == 1
+
+    # the scan is a process of its own, started without --vocab-dir or network access.
+    monkeypatch.delenv(tokenizer.VOCAB_DIR_ENV)
+    fresh_process(monkeypatch, offline)
+    (tmp_path / "tree").mkdir()
+    _ = (tmp_path / "tree" / "a.txt").write_text("hello world\n")
+    output = tmp_path / "tokens.json"
+    argv = ["ddt", str(tmp_path / "tree"), "--no-cache", "--json", "-o", str(output)]
+    monkeypatch.setattr(sys, "argv", argv)
+    __main__.main()
+    assert json.loads(output.read_text())["total"] == expected
+
+
+def test_engine_count_batch_matches_single_calls():
+    texts = [
+        "Lorem ipsum dolor sit amet, consectetur adipiscing elit.",
+        "",
+        "Nulla facilisi. Sed sit amet nulla auctor, vestibulum magna sed.",
+        "Cras ultricies ligula sed magna dictum porta. " * 50,
+        "def main() -> None:\n    print('hello')\n",
+    ]
+    engine = tokenizer.TokenizerEngine("gpt-4o", small_text_chars=256)
+    expected = [tokenizer.calculate_text_tokens(text, "gpt-4o") for text in texts]
+    assert engine.count_batch(texts) == expected
+    assert [engine.count(text) for text in texts] == expected
+
+
+def test_special_token_text_is_counted_as_text():
+    text = "a prompt ending in <|endoftext|> and <|fim_prefix|>"
+    expected = len(tokenizer.get_encoding("gpt-4").encode_ordinary(text))
+    assert tokenizer.calculate_text_tokens(text, "gpt-4") == expected
+    engine = tokenizer.TokenizerEngine("gpt-4", small_text_chars=8)
+    assert engine.count(text) == expected
+    assert engine.count_batch([text, text[:8], text]) == [
+        expected,
+        engine.count(text[:8]),
+        expected,
+    ]
+    assert engine.count_chunks([text[:20], text[20:]]) == expected
+
+
+def _mixed_text() -> str:
+    import random
+
+    rng = random.Random(9)
+    words = ["token", "Ünïcødé", "naïve", "12345", "x", "HTTPServer", "it's", "日本語"]
+    marks = [" ", "  ", "\n", "\n\n", "\t", "\r\n", ";\n", " // ", "/", "'", "\n    "]
+    return "".join(rng.choice(words) + rng.choice(marks) for _ in range(20_000))
+
+
+def test_safe_split_only_cuts_between_pieces():
+    assert tokenizer.safe_split("no boundary") == 2
+    assert tokenizer.safe_split("first line\nsecond line") == 11
+    assert tokenizer.safe_split("nothingtocut") == 0
+    assert tokenizer.safe_split("a\n\nb") == 0
+    assert tokenizer.safe_split("a  b") == 0
+
+
+def test_engine_count_chunks_matches_whole_text():
+    text = _mixed_text()
+    chunks = [text[i : i + 997] for i in range(0, len(text), 997)]
+    for model_name in ("gpt-4o", "gpt-4"):
+        engine = tokenizer.TokenizerEngine(model_name)
+        assert engine.count_chunks(chunks) == engine.count(text)
+
+
+def test_engine_count_chunks_forced_splits_are_bounded():
+    text = "QUJDRA" * 10_000
+    chunks = [text[i : i + 1000] for i in range(0, len(text), 1000)]
+    engine = tokenizer.TokenizerEngine("gpt-4o")
+    forced = len(text) // 2000
+    assert (
+        abs(engine.count_chunks(chunks, max_carry=2000) - engine.count(text))
+        <= 2 * forced
+    )
+
+
+def test_calculate_image_tokens_batch():
+    sizes = [(1024, 1024), (2048, 4096), (1024, 1024), (4096, 2048)]
+    assert tokenizer.calculate_image_tokens_batch(sizes) == [765, 1105, 765, 1105]
+    assert tokenizer.calculate_image_tokens_batch([]) == []
+
+
+def test_engines_for_shares_encodings():
+    engines, positions = tokenizer.engines_for(
+        ["gpt-4o", "gpt-4", "gpt-3.5-turbo", "o1"]
+    )
+    assert [engine.encoding_name for engine in engines] == ["o200k_base", "cl100k_base"]
+    assert positions == {"gpt-4o": 0, "gpt-4": 1, "gpt-3.5-turbo": 1, "o1": 0}
+
+    text = _mixed_text()
+    chunks = [text[i : i + 997] for i in range(0, len(text), 997)]
+    assert tokenizer.count_chunks(engines, chunks) == [
+        engine.count(text) for engine in engines
+    ]
@@ -0,0 +1,91 @@
+import os
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from ddt import walker
+
+
+def make_tree(root: Path) -> None:
+    (root / "src").mkdir()
+    (root / ".git").mkdir()
+    (root / "node_modules").mkdir()
+    _ = (root / "Makefile").write_text("all:\n")
+    _ = (root / "src" / "main.py").write_text("print('hi')\n")
+    _ = (root / ".git" / "HEAD").write_text("ref: refs/heads/main\n")
+    _ = (root / "node_modules" / "index.js").write_text("module.exports = 1;\n")
+
+
+def test_walk_yields_every_file_in_name_order(tmp_path: Path):
+    make_tree(tmp_path)
+    files = [entry.path for entry in walker.walk(tmp_path)]
+    assert files == [
+        tmp_path / ".git" / "HEAD",
+        tmp_path / "Makefile",
+        tmp_path / "node_modules" / "index.js",
+        tmp_path / "src" / "main.py",
+    ]
+
+
+def test_walk_prunes_directories(tmp_path: Path):
+    make_tree(tmp_path)
+    opened: list[Path] = []
+
+    def skip_dir(directory: Path) -> bool:
+        opened.append(directory)
+        return directory.name.startswith(".") or directory.name == "node_modules"
+
+    files = [entry.path for entry in walker.walk(tmp_path, skip_dir)]
+    assert files == [tmp_path / "Makefile", tmp_path / "src" / "main.py"]
+    assert sorted(opened) == sorted(
+        [tmp_path / ".git", tmp_path / "node_modules", tmp_path / "src"]
+    )
+
+
+def test_walk_does_not_follow_symlinked_directories(tmp_path: Path):
+    make_tree(tmp_path)
+    os.symlink(tmp_path / "src", tmp_path / "linked")
+    os.symlink(tmp_path / "Makefile", tmp_path / "linked.mk")
+    entries = {entry.path: entry for entry in walker.walk(tmp_path)}
+    assert tmp_path / "linked" not in entries
+    assert entries[tmp_path / "linked.mk"].is_symlink
+    assert not entries[tmp_path / "Makefile"].is_symlink
+
+
+def test_walk_entry_stat(tmp_path: Path):
+    make_tree(tmp_path)
+    entries = {entry.path: entry for entry in walker.walk(tmp_path)}
+    assert entries[tmp_path / "Makefile"].size == len("all:\n")
+    unknown = walker.WalkEntry(tmp_path / "missing")
+    assert unknown.size == 0
+    assert unknown.is_symlink is None
+
+
+def test_ahead_runs_the_walk_in_a_thread(tmp_path: Path):
+    make_tree(tmp_path)
+    walked = threading.Event()
+
+    def walk() -> Iterator[walker.WalkEntry]:
+        yield from walker.walk(tmp_path)
+        walked.set()
+
+    entries = walker.ahead(walk())
+    first = next(entries)
+    # the rest of the walk doesn't wait for the next entry to be asked for.
+    assert walked.wait(5)
+    assert [first.path, *(entry.path for entry in entries)] == [
+        entry.path for entry in walker.walk(tmp_path)
+    ]
+
+
+def test_ahead_raises_the_walk_error():
+    def walk() -> Iterator[int]:
+        yield 1
+        raise OSError("gone")
+
+    entries = walker.ahead(walk())
+    assert next(entries) == 1
+    with pytest.raises(OSError, match="gone"):
+        _ = next(entries)
@@ -0,0 +1,80 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+from ddt import watch
+
+
+def wait_for(
+    watcher: watch.InotifyWatcher | watch.PollingWatcher, path: Path
+) -> set[Path]:
+    changed: set[Path] = set()
+    for _ in range(20):
+        changed |= watcher.wait(timeout=0.5)
+        if path in changed:
+            break
+    return changed
+
+
+@pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="inotify is Linux only"
+)
+def test_inotify_watcher(tmp_path: Path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / ".hidden").mkdir()
+    _ = (tmp_path / "src" / "main.py").write_text("print('hi')\n")
+    skipped = {".hidden"}
+    watcher = watch.InotifyWatcher(
+        tmp_path, lambda directory: directory.name in skipped
+    )
+    try:
+        assert watcher.wait(timeout=0) == set()
+
+        _ = (tmp_path / "src" / "main.py").write_text("print('hello')\n")
+        assert wait_for(watcher, tmp_path / "src" / "main.py") == {
+            tmp_path / "src" / "main.py"
+        }
+
+        # new directories are reported, and watched from then on.
+        (tmp_path / "new").mkdir()
+        assert tmp_path / "new" in wait_for(watcher, tmp_path / "new")
+        _ = (tmp_path / "new" / "added.py").write_text("x = 1\n")
+        assert tmp_path / "new" / "added.py" in wait_for(
+            watcher, tmp_path / "new" / "added.py"
+        )
+
+        _ = (tmp_path / "src").rename(tmp_path / "moved")
+        changed = wait_for(watcher, tmp_path / "moved")
+        assert {tmp_path / "src", tmp_path / "moved"} <= changed
+        _ = (tmp_path / "moved" / "main.py").write_text("print('moved')\n")
+        assert tmp_path / "moved" / "main.py" in wait_for(
+            watcher, tmp_path / "moved" / "main.py"
+        )
+
+        # skipped directories are never watched.
+        _ = (tmp_path / ".hidden" / "secret.py").write_text("y = 2\n")
+        assert watcher.wait(timeout=0.2) == set()
+
+        # until they stop being skipped, e.g. after a .gitignore edit.
+        skipped.clear()
+        watcher.watch_tree(tmp_path)
+        _ = (tmp_path / ".hidden" / "secret.py").write_text("y = 3\n")
+        assert tmp_path / ".hidden" / "secret.py" in wait_for(
+            watcher, tmp_path / ".hidden" / "secret.py"
+        )
+    finally:
+        watcher.close()
+
+
+def test_polling_watcher(tmp_path: Path):
+    _ = (tmp_path / "main.py").write_text("print('hi')\n")
+    _ = (tmp_path / "gone.py").write_text("x = 1\n")
+    watcher = watch.PollingWatcher(tmp_path, interval=0.01)
+    assert watcher.wait(timeout=0.05) == set()
+
+    _ = (tmp_path / "main.py").write_text("print('hello, world')\n")
+    (tmp_path / "gone.py").unlink()
+    _ = (tmp_path / "new.py").write_text("y = 2\n")
+    changed = wait_for(watcher, tmp_path / "new.py")
+    assert changed == {tmp_path / "main.py", tmp_path / "gone.py", tmp_path / "new.py"}